@@ -3,19 +3,47 @@ import traceback
 import re
 import _pickle as cPickle
 import gzip
+import time
 import threading
-import copy
 import warnings
 from typing import Dict, Any
 import psutil
 import gc
+import os
 import streamlit as st
 
 ## For Evals
 from evaluator.eval_imports import import_namespace
+from gtfs_agent.feed_store import load_feed_store
+from gtfs_agent.feed_view import copy_on_write_view
+from evaluator.sandbox import (
+    get_sandbox_pool,
+    format_error_info,
+    ExecutionTimeoutError,
+    ResourceLimitError,
+    ResourceMonitor,
+    POLL_INTERVAL_SECONDS,
+)
+from utils.search_index import warm_search_indexes
+from evaluator.result_cache import (
+    ResultCache,
+    artifact_content_hash,
+    depends_on_current_time,
+    result_cache_key,
+)
 
 # Custom Imports
-from utils.constants import TIMEOUT_SECONDS
+from utils.constants import (
+    TIMEOUT_SECONDS,
+    SANDBOX_BACKEND,
+    SANDBOX_WORKERS,
+    MAX_EXECUTION_MEMORY_MB,
+    MAX_EXECUTION_CPU_SECONDS,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_CURRENT_TIME_TTL_SECONDS,
+)
 from prompts.generate_prompt import generate_system_prompt
 
 warnings.filterwarnings("ignore")
@@ -26,25 +54,29 @@ def load_zipped_pickle(filename: str) -> Any:
         return cPickle.load(f)
 
 
+@st.cache_resource(ttl=3600, show_spinner="Loading GTFS feed...")
+def load_cached_feed_store(directory: str) -> Any:
+    # Tables stay memory-mapped until generated code first touches them
+    return load_feed_store(directory, lazy=True)
+
+
+class SandboxExecutionError(Exception):
+    """Generated code raised an error; carries the formatted error and resource usage."""
+
+    def __init__(self, error_message: str, usage: Dict[str, float] = None):
+        super().__init__(error_message)
+        self.error_message = error_message
+        self.usage = usage
+
+
 class PropagatingThread(threading.Thread):
     def run(self):
         self.exc = None
         self.ret = None
         try:
-            # Set CPU affinity to use only 80% of available cores
-            process = psutil.Process()
-            num_cores = psutil.cpu_count()
-            cores_to_use = max(1, int(num_cores * 0.8))  # Use 80% of cores, minimum 1
-            # On Windows/Linux, use the first N cores
-            available_cores = list(range(cores_to_use))
-            process.cpu_affinity(available_cores)
-            
             self.ret = self._target(*self._args, **self._kwargs)
         except BaseException as e:
             self.exc = e
-        finally:
-            # Reset CPU affinity to use all cores
-            process.cpu_affinity(list(range(psutil.cpu_count())))
 
     def join(self, timeout=None):
         super().join(timeout)
@@ -63,6 +95,17 @@ class GTFS_Eval:
         self.allow_viz = None
         # Initialize loader dictionary with lowercase keys and pickle file locations
         self.loaders = {key.lower(): value["pickle_loc"] for key, value in self.file_mapping.items()}
+        # Columnar feed stores, preferred over pickles when available
+        self.stores = {
+            key.lower(): value["store_loc"]
+            for key, value in self.file_mapping.items()
+            if value.get("store_loc")
+        }
+        # Artifact the current feed was loaded from, used to address cached results
+        self.feed_artifact = None
+        self.result_cache = (
+            ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES) if RESULT_CACHE_ENABLED else None
+        )
 
 
     def __getstate__(self):
@@ -80,6 +123,11 @@ class GTFS_Eval:
             # Force garbage collection before loading new feed
             gc.collect()
             self.gtfs = GTFS
+        store_loc = self.stores.get(GTFS.lower())
+        if store_loc and os.path.isdir(store_loc):
+            self.feed_artifact = store_loc
+            return load_cached_feed_store(store_loc)
+        self.feed_artifact = current_loader
         return load_zipped_pickle(current_loader)
 
     def get_system_prompt(self, GTFS, distance_unit, allow_viz):
@@ -90,6 +138,7 @@ class GTFS_Eval:
             or self.allow_viz != allow_viz
         ):
             self.current_loader = self.load_current_feed(GTFS)
+            warm_search_indexes(self.current_loader.feed)
             self.distance_unit = distance_unit
             self.allow_viz = allow_viz
             # Generate the system prompt
@@ -110,41 +159,55 @@ class GTFS_Eval:
                 "eval_success": False,
                 "error_message": None,
                 "only_text": True,
+                "resource_usage": None,
+                "cache_hit": False,
             }
 
         code = executable_code[0]
-        nm = {
-            **globals(),
-            **import_namespace,
-            "feed": copy.deepcopy(self.current_loader.feed),
-        }  # Deep copy of feed
 
-        try:
+        cache_key = self._result_cache_key(code)
+        if cache_key is not None:
+            cached_output = self.result_cache.get(cache_key)
+            if cached_output is not None:
+                return {**cached_output, "cache_hit": True}
 
-            def execute_code():
-                global execution_result
-                exec(code, nm)
-                execution_result = nm.get("result")
-                # Force garbage collection after execution
-                gc.collect()
+        output = self._run_code(code, timeout_seconds)
+        # Only successful runs are cached; failures may be transient (timeouts, crashes)
+        if cache_key is not None and output["eval_success"]:
+            ttl = RESULT_CACHE_CURRENT_TIME_TTL_SECONDS if depends_on_current_time(code) else None
+            self.result_cache.put(cache_key, output, ttl=ttl)
+        return {**output, "cache_hit": False}
 
-            thread = PropagatingThread(target=execute_code)
-            thread.daemon = True
-            thread.start()
-            thread.join(timeout=timeout_seconds)
-            # Keep gc.collect() here to ensure cleanup even if execute_code() times out
-            gc.collect()
-            if thread.is_alive():
-                raise TimeoutError(f"Code execution timed out after {timeout_seconds} seconds")
+    def _result_cache_key(self, code: str):
+        """
+        Key of the cached result of `code` on the current feed, or None if results
+        cannot be cached.
+        """
+        if self.result_cache is None or self.feed_artifact is None:
+            return None
+        feed_hash = artifact_content_hash(self.feed_artifact)
+        if feed_hash is None:
+            return None
+        return result_cache_key(feed_hash, code)
+
+    def _run_code(self, code: str, timeout_seconds: int) -> Dict[str, Any]:
+        try:
+            sandbox = self._get_sandbox_pool()
+            if sandbox is not None:
+                execution_result, usage = self._execute_in_sandbox(sandbox, code, timeout_seconds)
+            else:
+                execution_result, usage = self._execute_in_thread(code, timeout_seconds)
             if execution_result is None:
-                raise Exception(
-                    "Code execution did not return a result. Please ensure the `result` variable is assigned"
+                raise SandboxExecutionError(
+                    "Code execution did not return a result. Please ensure the `result` variable is assigned",
+                    usage,
                 )
             return {
                 "code_output": execution_result,
                 "eval_success": True,
                 "error_message": None,
                 "only_text": False,
+                "resource_usage": usage,
             }
 
         except TimeoutError as te:
@@ -154,6 +217,26 @@ class GTFS_Eval:
                 "eval_success": False,
                 "error_message": f"TimeoutError: {str(te)}",
                 "only_text": False,
+                "resource_usage": getattr(te, "usage", None),
+            }
+
+        except ResourceLimitError as rle:
+            print(f"ResourceLimitError: {str(rle)}")
+            return {
+                "code_output": None,
+                "eval_success": False,
+                "error_message": f"ResourceLimitError: {str(rle)}",
+                "only_text": False,
+                "resource_usage": rle.usage,
+            }
+
+        except SandboxExecutionError as se:
+            return {
+                "code_output": None,
+                "eval_success": False,
+                "error_message": se.error_message,
+                "only_text": False,
+                "resource_usage": se.usage,
             }
 
         except Exception as e:
@@ -163,40 +246,81 @@ class GTFS_Eval:
                 "eval_success": False,
                 "error_message": error_message,
                 "only_text": False,
+                "resource_usage": None,
             }
 
-    def _get_detailed_error_info(self, error: Exception, code: str) -> str:
+    def _get_sandbox_pool(self):
         """
-        Get detailed error information including the full traceback and relevant code snippet.
+        Get the pre-forked worker pool for the current feed, or None to run in a thread.
         """
-        exc_type, exc_value, exc_traceback = sys.exc_info()
-        tb = traceback.extract_tb(exc_traceback)
+        if SANDBOX_BACKEND != "process":
+            return None
+        return get_sandbox_pool(
+            self.gtfs.lower(),
+            self.current_loader.feed,
+            {**globals(), **import_namespace},
+            SANDBOX_WORKERS,
+        )
 
-        # Find the last frame that refers to our code
-        relevant_frame = next(
-            (frame for frame in reversed(tb) if frame.filename == "<string>"), None
+    def _execute_in_sandbox(self, sandbox, code: str, timeout_seconds: int):
+        response = sandbox.run(
+            code,
+            timeout_seconds,
+            max_memory_mb=MAX_EXECUTION_MEMORY_MB,
+            max_cpu_seconds=MAX_EXECUTION_CPU_SECONDS,
         )
+        if response["status"] == "error":
+            raise SandboxExecutionError(response["error_message"], response["usage"])
+        return response["result"], response["usage"]
 
-        if relevant_frame:
-            line_no = relevant_frame.lineno
-            code_lines = code.split("\n")
-            start_line = max(0, line_no - 3)
-            end_line = min(len(code_lines), line_no + 2)
-            relevant_code = "\n".join(
-                f"{i+1}: {line}"
-                for i, line in enumerate(code_lines[start_line:end_line])
-            )
-        else:
-            relevant_code = "Unable to locate relevant code snippet"
+    def _execute_in_thread(self, code: str, timeout_seconds: int):
+        """
+        Fallback where fork is unavailable. Usage is reported, but a thread cannot be
+        killed, so the memory and CPU limits are only enforced by the process sandbox.
+        """
+        nm = {
+            **globals(),
+            **import_namespace,
+            # Copy-on-write view so generated code cannot mutate the cached feed
+            "feed": copy_on_write_view(self.current_loader.feed),
+        }
+        cpu_time = {}
 
-        error_info = [
-            f"Error Type: {exc_type.__name__}",
-            f"Error Message: {str(error)}",
-            "Relevant Code:",
-            relevant_code + "\n",
-        ]
+        def execute_code():
+            start = time.thread_time()
+            try:
+                exec(code, nm)
+                return nm.get("result")
+            finally:
+                cpu_time["cpu_time_s"] = time.thread_time() - start
+                # Force garbage collection after execution
+                gc.collect()
 
-        return "\n".join(error_info)
+        monitor = ResourceMonitor()
+        thread = PropagatingThread(target=execute_code)
+        thread.daemon = True
+        thread.start()
+        deadline = monitor.start_wall + timeout_seconds
+        while thread.is_alive() and time.monotonic() < deadline:
+            thread.join(timeout=POLL_INTERVAL_SECONDS)
+            monitor.sample()
+        # Keep gc.collect() here to ensure cleanup even if execute_code() times out
+        gc.collect()
+        if thread.is_alive():
+            raise ExecutionTimeoutError(
+                f"Code execution timed out after {timeout_seconds} seconds", monitor.usage()
+            )
+        usage = monitor.usage(**cpu_time)
+        try:
+            return thread.join(), usage
+        except Exception as e:
+            raise SandboxExecutionError(format_error_info(e, code), usage)
+
+    def _get_detailed_error_info(self, error: Exception, code: str) -> str:
+        """
+        Get detailed error information including the full traceback and relevant code snippet.
+        """
+        return format_error_info(error, code)
 
     def reset(self):
         """
@@ -206,6 +330,7 @@ class GTFS_Eval:
         self.gtfs = None
         self.system_prompt = None
         self.distance_unit = None
+        self.feed_artifact = None
         # Force garbage collection after reset
         gc.collect()
         print("GTFS_Eval instance has been reset.")
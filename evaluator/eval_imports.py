@@ -19,13 +19,20 @@ from tqdm import tqdm
 from stqdm import stqdm
 from utils.find_stops import (
     get_geo_location,
+    geocode_batch,
     find_stops_by_full_name,
     find_stops_by_street,
     find_stops_by_intersection,
     find_nearby_stops,
+    find_nearby_stops_batch,
     find_stops_by_address,
     find_route,
+    resolve_routes,
 )
+from gtfs_agent.service_calendar import active_service_ids, active_trips, service_dates
+from gtfs_agent.departure_index import next_departures
+from gtfs_agent.headways import route_headways
+from gtfs_agent.stop_patterns import route_stops, scheduled_travel_time
 
 # Create a dictionary for namespace with imported modules
 import_namespace = {
@@ -50,12 +57,22 @@ import_namespace = {
     "tqdm": tqdm,
     "stqdm": stqdm,
     "get_geo_location": get_geo_location,
+    "geocode_batch": geocode_batch,
     "find_stops_by_full_name": find_stops_by_full_name,
     "find_stops_by_street": find_stops_by_street,
     "find_stops_by_intersection": find_stops_by_intersection,
     "find_nearby_stops": find_nearby_stops,
+    "find_nearby_stops_batch": find_nearby_stops_batch,
     "find_stops_by_address": find_stops_by_address,
     "find_route": find_route,
+    "resolve_routes": resolve_routes,
+    "active_service_ids": active_service_ids,
+    "active_trips": active_trips,
+    "service_dates": service_dates,
+    "next_departures": next_departures,
+    "route_headways": route_headways,
+    "route_stops": route_stops,
+    "scheduled_travel_time": scheduled_travel_time,
     "st": st,
     "result": None,
 }
@@ -0,0 +1,197 @@
+import os
+import re
+import ast
+import time
+import pickle
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+# Code calling any of these depends on the current date/time, so its result is
+# only reused for a short time
+CURRENT_TIME_PATTERN = re.compile(
+    r"\b(?:datetime\s*\.\s*(?:now|today|utcnow)"
+    r"|date\s*\.\s*today"
+    r"|get_current_time"
+    r"|time\s*\.\s*(?:time|localtime|gmtime)"
+    r"|Timestamp\s*\.\s*(?:now|today)"
+    r"|to_datetime\(\s*['\"](?:now|today)['\"])"
+)
+ENTRY_EXTENSION = ".pkl"
+
+
+def depends_on_current_time(code: str) -> bool:
+    return CURRENT_TIME_PATTERN.search(code) is not None
+
+
+def normalize_code(code: str) -> str:
+    """
+    Normalize code so formatting-only differences (comments, blank lines, spacing,
+    quote style) map to the same cache entry. Code that does not parse is only
+    stripped of surrounding whitespace.
+    """
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return code.strip()
+
+
+def _path_signature(path: str):
+    paths = [path]
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(root, name) for root, _, files in os.walk(path) for name in files
+        )
+    return tuple((p, os.path.getsize(p), os.path.getmtime(p)) for p in paths)
+
+
+@lru_cache(maxsize=32)
+def _hash_files(signature) -> str:
+    hasher = hashlib.sha256()
+    for path, _, _ in signature:
+        hasher.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def artifact_content_hash(path: str) -> Optional[str]:
+    """
+    SHA-256 of a feed artifact: a pickle file or every file of a feed store directory.
+
+    Hashes are memoized on the files' sizes and modification times, so the artifact is
+    only read again after it was rebuilt. Returns None if the artifact cannot be read.
+    """
+    try:
+        return _hash_files(_path_signature(path))
+    except OSError:
+        return None
+
+
+def result_cache_key(feed_hash: str, code: str) -> str:
+    """
+    Build the cache key for running `code` against the feed with content `feed_hash`.
+    """
+    parts = [
+        feed_hash,
+        hashlib.sha256(normalize_code(code).encode()).hexdigest(),
+        "current-time" if depends_on_current_time(code) else "static",
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk cache of evaluation outputs, one pickle file per entry.
+
+    Entries are evicted least-recently-used first once the directory grows beyond
+    `max_bytes`; reads refresh an entry's modification time, which serves as its
+    recency. Entries may carry a TTL after which they are treated as missing. Writes
+    go through a temporary file and an atomic rename, so concurrent processes sharing
+    the directory never read partial entries.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{ENTRY_EXTENSION}")
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_EXTENSION):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((name, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+        if entry["ttl"] is not None and time.time() - entry["created"] > entry["ttl"]:
+            self._total_bytes -= self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry["value"]
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        """
+        Store `value` under `key`. Returns False if the value cannot be pickled or is
+        larger than the whole cache.
+        """
+        entry = {"created": time.time(), "ttl": ttl, "value": value}
+        try:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+        if len(data) > self.max_bytes:
+            return False
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        # Overwriting an entry replaces its bytes rather than adding to them
+        try:
+            replaced_bytes = os.stat(path).st_size
+        except OSError:
+            replaced_bytes = 0
+        os.replace(tmp_path, path)
+        self._total_bytes += len(data) - replaced_bytes
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+        return True
+
+    def _remove(self, path: str) -> int:
+        """
+        Delete an entry file. Returns its size, or 0 if it was already gone.
+        """
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    def _evict(self):
+        # Rescan: other processes may have added or evicted entries
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for name, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(os.path.join(self.directory, name))
+            total -= size
+        self._total_bytes = total
+
+    def clear(self):
+        for name, _, _ in self._entries():
+            self._remove(os.path.join(self.directory, name))
+        self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries()),
+            "bytes": self._total_bytes,
+        }
@@ -0,0 +1,398 @@
+import sys
+import gc
+import time
+import queue
+import threading
+import traceback
+import multiprocessing as mp
+import psutil
+from typing import Any, Dict, Optional, Tuple
+from gtfs_agent.feed_view import copy_on_write_view
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# How often running code is checked against its resource limits
+POLL_INTERVAL_SECONDS = 0.05
+# Pools unused for this long are shut down, e.g. pools of feeds that were reloaded
+POOL_IDLE_SECONDS = 15 * 60
+MB = 1024**2
+
+
+class ExecutionTimeoutError(TimeoutError):
+    """Code exceeded its wall-clock limit. Carries the resource usage up to the kill."""
+
+    def __init__(self, message: str, usage: Optional[Dict[str, float]] = None):
+        super().__init__(message)
+        self.usage = usage
+
+
+class ResourceLimitError(Exception):
+    """Code exceeded its memory or CPU-time limit and was killed."""
+
+    def __init__(self, message: str, usage: Optional[Dict[str, float]] = None):
+        super().__init__(message)
+        self.usage = usage
+
+
+class ResourceMonitor:
+    """
+    Track wall time, CPU time and peak memory growth of a process while code runs.
+
+    Memory is measured as RSS growth over the RSS at the start of the run, so pages
+    shared with the parent (e.g. the feed) are not counted against the code.
+    """
+
+    def __init__(self, pid: Optional[int] = None):
+        self.process = psutil.Process(pid)
+        self.start_wall = time.monotonic()
+        self.base_rss = self.process.memory_info().rss
+        self.base_cpu = self._cpu_seconds()
+        self.peak_memory = 0
+
+    def _cpu_seconds(self) -> float:
+        cpu_times = self.process.cpu_times()
+        return cpu_times.user + cpu_times.system
+
+    def sample(self):
+        """
+        Returns:
+            tuple: (current memory growth in MB, CPU seconds used so far)
+        """
+        try:
+            memory = max(0, self.process.memory_info().rss - self.base_rss)
+            cpu = self._cpu_seconds() - self.base_cpu
+        except psutil.Error:
+            return self.peak_memory / MB, 0.0
+        self.peak_memory = max(self.peak_memory, memory)
+        return memory / MB, cpu
+
+    def usage(self, cpu_time_s: Optional[float] = None, peak_memory_mb: Optional[float] = None):
+        sampled_memory, sampled_cpu = self.sample()
+        return {
+            "wall_time_s": round(time.monotonic() - self.start_wall, 3),
+            "cpu_time_s": round(sampled_cpu if cpu_time_s is None else cpu_time_s, 3),
+            "peak_memory_mb": round(max(self.peak_memory / MB, peak_memory_mb or 0.0), 1),
+        }
+
+
+def _max_rss_bytes() -> int:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def fork_available() -> bool:
+    return "fork" in mp.get_all_start_methods()
+
+
+def format_error_info(error: Exception, code: str) -> str:
+    """
+    Get detailed error information including the full traceback and relevant code snippet.
+    Must be called from within the `except` block handling `error`.
+    """
+    exc_type, exc_value, exc_traceback = sys.exc_info()
+    tb = traceback.extract_tb(exc_traceback)
+
+    # Find the last frame that refers to our code
+    relevant_frame = next(
+        (frame for frame in reversed(tb) if frame.filename == "<string>"), None
+    )
+
+    if relevant_frame:
+        line_no = relevant_frame.lineno
+        code_lines = code.split("\n")
+        start_line = max(0, line_no - 3)
+        end_line = min(len(code_lines), line_no + 2)
+        relevant_code = "\n".join(
+            f"{i+1}: {line}"
+            for i, line in enumerate(code_lines[start_line:end_line])
+        )
+    else:
+        relevant_code = "Unable to locate relevant code snippet"
+
+    error_info = [
+        f"Error Type: {exc_type.__name__}",
+        f"Error Message: {str(error)}",
+        "Relevant Code:",
+        relevant_code + "\n",
+    ]
+
+    return "\n".join(error_info)
+
+
+def execute_in_namespace(code: str, feed, namespace: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Execute generated code against a protected view of `feed`.
+
+    Returns:
+        dict: {"status": "ok", "result": ...} or {"status": "error", "error_message": ...},
+              plus "usage" with the CPU time and peak memory growth of the run where
+              the platform can measure them.
+    """
+    nm = {}
+    usage = {}
+    if resource is not None:
+        start_cpu = resource.getrusage(resource.RUSAGE_SELF)
+        start_rss = psutil.Process().memory_info().rss
+        start_max_rss = _max_rss_bytes()
+    try:
+        nm = {**namespace, "feed": copy_on_write_view(feed)}
+        exec(code, nm)
+        response = {"status": "ok", "result": nm.get("result")}
+    except Exception as e:
+        response = {"status": "error", "error_message": format_error_info(e, code)}
+    finally:
+        del nm
+        # Only the youngest generation: a full collection would take tens of ms and
+        # touch every object of the feed, unsharing the pages a worker shares with
+        # its parent
+        gc.collect(0)
+    if resource is not None:
+        end_cpu = resource.getrusage(resource.RUSAGE_SELF)
+        usage["cpu_time_s"] = (end_cpu.ru_utime - start_cpu.ru_utime) + (
+            end_cpu.ru_stime - start_cpu.ru_stime
+        )
+        # Only a new lifetime high of the worker tells us this run's peak
+        end_max_rss = _max_rss_bytes()
+        if end_max_rss > start_max_rss:
+            usage["peak_memory_mb"] = max(0, end_max_rss - start_rss) / MB
+    response["usage"] = usage
+    return response
+
+
+def _worker_main(conn, feed, namespace):
+    """
+    Sandbox worker loop: execute each received code string and send back the outcome.
+    The feed was inherited from the parent at fork time and is shared copy-on-write.
+    """
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            break
+        if code is None:
+            break
+        response = execute_in_namespace(code, feed, namespace)
+        try:
+            conn.send(response)
+        except Exception as e:
+            conn.send(
+                {
+                    "status": "error",
+                    "error_message": f"Error Type: {type(e).__name__}\n"
+                    f"Error Message: The `result` could not be returned from the sandbox: {e}",
+                }
+            )
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+
+class SandboxPool:
+    """
+    Pool of pre-forked worker processes that execute generated code against a feed.
+
+    Workers are forked after the feed is loaded, so they start warm and share the
+    feed's memory with the parent copy-on-write. Each execution runs in a separate
+    process: timed-out code is actually killed (and its worker replaced), heavy
+    queries do not block the app process, and concurrent sessions run in parallel.
+    """
+
+    def __init__(self, feed, namespace: Dict[str, Any], workers: int = 2):
+        self.feed = feed
+        self.namespace = namespace
+        self.workers = workers
+        self._context = mp.get_context("fork")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._busy = 0
+        self.last_used = time.monotonic()
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.feed, self.namespace),
+            daemon=True,
+        )
+        # Frozen objects are never traversed by the collector, so the child's
+        # collections leave the feed's pages shared with the parent
+        gc.freeze()
+        try:
+            process.start()
+        finally:
+            gc.unfreeze()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        with self._lock:
+            self._all.add(worker)
+        return worker
+
+    def _kill(self, worker: _Worker):
+        with self._lock:
+            self._all.discard(worker)
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+
+    def run(
+        self,
+        code: str,
+        timeout_seconds: float,
+        max_memory_mb: Optional[float] = None,
+        max_cpu_seconds: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute code in an idle worker, waiting for one to become free if needed.
+
+        While the code runs, the worker's memory growth and CPU time are sampled every
+        POLL_INTERVAL_SECONDS. Any limit violation kills the worker and a fresh fork
+        replaces it.
+
+        Returns:
+            dict: The worker response with a "usage" dict holding `wall_time_s`,
+                  `cpu_time_s` and `peak_memory_mb` for the run.
+
+        Raises:
+            ExecutionTimeoutError: If execution exceeds `timeout_seconds`.
+            ResourceLimitError: If execution exceeds `max_memory_mb` or `max_cpu_seconds`.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The sandbox pool was shut down")
+            self._busy += 1
+            self.last_used = time.monotonic()
+        try:
+            worker = self._idle.get()
+        except BaseException:
+            self._release()
+            raise
+        try:
+            monitor = ResourceMonitor(worker.process.pid)
+            worker.conn.send(code)
+            while not worker.conn.poll(POLL_INTERVAL_SECONDS):
+                memory_mb, cpu_seconds = monitor.sample()
+                limit_error = None
+                if time.monotonic() - monitor.start_wall >= timeout_seconds:
+                    limit_error = ExecutionTimeoutError(
+                        f"Code execution timed out after {timeout_seconds} seconds"
+                    )
+                elif max_memory_mb is not None and memory_mb > max_memory_mb:
+                    limit_error = ResourceLimitError(
+                        f"Code execution exceeded the memory limit of {max_memory_mb} MB"
+                    )
+                elif max_cpu_seconds is not None and cpu_seconds > max_cpu_seconds:
+                    limit_error = ResourceLimitError(
+                        f"Code execution exceeded the CPU time limit of {max_cpu_seconds} seconds"
+                    )
+                if limit_error is not None:
+                    limit_error.usage = monitor.usage()
+                    self._kill(worker)
+                    worker = self._spawn()
+                    raise limit_error
+            try:
+                response = worker.conn.recv()
+                response["usage"] = monitor.usage(**response.get("usage", {}))
+                return response
+            except (EOFError, OSError):
+                worker.process.join(timeout=5)
+                exitcode = worker.process.exitcode
+                self._kill(worker)
+                worker = self._spawn()
+                return {
+                    "status": "error",
+                    "error_message": "Error Type: WorkerCrashed\n"
+                    f"Error Message: The sandbox process exited unexpectedly (exit code {exitcode})",
+                    "usage": monitor.usage(),
+                }
+        finally:
+            self._idle.put(worker)
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._busy -= 1
+            self.last_used = time.monotonic()
+            drained = self._closed and self._busy == 0
+        # The last run of a shut down pool stops the workers left behind
+        if drained:
+            self.shutdown()
+
+    def idle_seconds(self) -> Optional[float]:
+        """
+        Seconds since the pool last ran code, or None while code is running.
+        """
+        with self._lock:
+            return None if self._busy else time.monotonic() - self.last_used
+
+    def _stop(self, worker: _Worker):
+        try:
+            worker.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._kill(worker)
+
+    def shutdown(self):
+        """
+        Stop the pool's workers. Runs in flight, and runs already waiting for a worker,
+        finish first; the workers are stopped once the last of them returns.
+        """
+        with self._lock:
+            self._closed = True
+            if self._busy:
+                return
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._stop(worker)
+
+
+_POOLS: Dict[Tuple[str, int], SandboxPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _reap_idle_pools(idle_seconds: float):
+    # Callers hold _POOLS_LOCK
+    for pool_key, pool in list(_POOLS.items()):
+        idle = pool.idle_seconds()
+        if idle is not None and idle >= idle_seconds:
+            pool.shutdown()
+            del _POOLS[pool_key]
+
+
+def get_sandbox_pool(
+    key: str, feed, namespace: Dict[str, Any], workers: int = 2
+) -> Optional[SandboxPool]:
+    """
+    Get the shared sandbox pool for a feed, creating it on first use.
+
+    Pools are shared by every session using the same feed object. A reloaded feed
+    gets a pool of its own, so sessions still holding the previous feed keep theirs.
+    Pools that have not run code for POOL_IDLE_SECONDS are shut down.
+    Returns None where fork is unavailable (e.g. Windows).
+    """
+    if not fork_available():
+        return None
+    with _POOLS_LOCK:
+        _reap_idle_pools(POOL_IDLE_SECONDS)
+        # The pool keeps its feed alive, so its id cannot be reused by another object
+        pool_key = (key, id(feed))
+        pool = _POOLS.get(pool_key)
+        if pool is None:
+            pool = SandboxPool(feed, namespace, workers)
+            _POOLS[pool_key] = pool
+        pool.last_used = time.monotonic()
+        return pool
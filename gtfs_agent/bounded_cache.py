@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+def default_sizeof(value: Any) -> int:
+    """Approximate in-memory size of a cached value in bytes."""
+    if value is None:
+        return 0
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return 64
+
+
+class BoundedLRUCache:
+    """
+    In-memory LRU cache bounded by both item count and approximate byte size.
+
+    Keeps hit/miss/eviction counters so callers can report cache effectiveness.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 100_000,
+        max_bytes: int = 256 * 1024**2,
+        sizeof: Callable[[Any], int] = default_sizeof,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.current_bytes = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key][0]
+        self.misses += 1
+        return default
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        if key in self._data:
+            self.current_bytes -= self._data.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._data[key] = (value, size)
+        self.current_bytes += size
+        while len(self._data) > self.max_items or self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._data.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "items": len(self._data),
+            "bytes": self.current_bytes,
+        }
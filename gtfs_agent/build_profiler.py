@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import datetime
+import psutil
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+MB = 2**20
+
+
+def _rss() -> int:
+    return psutil.Process().memory_info().rss
+
+
+def _reset_peak_rss() -> bool:
+    # Linux resets the process's peak RSS (VmHWM) to its current RSS on "5"
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class BuildProfiler:
+    """
+    Records the wall time, CPU time, peak RSS and row counts of named build stages.
+
+    Stages nest: a stage's peak includes the peaks of the stages run inside it. Peak
+    RSS is exact per stage on Linux, where the kernel's high-water mark can be reset;
+    elsewhere it is the larger of the RSS at the start and end of the stage.
+    """
+
+    def __init__(self):
+        self.stages: List[dict] = []
+        self._open: List[dict] = []
+        self._peak_resettable = _reset_peak_rss()
+        self.started_at = datetime.datetime.now().isoformat(timespec="seconds")
+
+    def _carry_peak(self, peak: int = 0):
+        # The kernel's mark is reset at the start of every stage, so the peak seen so
+        # far is carried into all open stages first
+        if self._peak_resettable:
+            peak = max(peak, _peak_rss() or 0)
+        for record in self._open:
+            record["_peak"] = max(record["_peak"], peak)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profile the block as stage `name`. The yielded record can be given a row
+        count, e.g. `record["rows"] = len(df)`.
+
+        Example:
+            with profiler.stage("parse_times") as record:
+                ...
+                record["rows"] = len(feed.stop_times)
+        """
+        self._carry_peak()
+        rss_start = _rss()
+        record = {"name": name, "depth": len(self._open), "rows": None, "_peak": rss_start}
+        self.stages.append(record)
+        self._open.append(record)
+        if self._peak_resettable:
+            _reset_peak_rss()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = repr(e)
+            raise
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+            record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+            rss_end = _rss()
+            self._carry_peak(rss_end)
+            self._open.pop()
+            record["rss_start_mb"] = round(rss_start / MB, 1)
+            record["rss_end_mb"] = round(rss_end / MB, 1)
+            record["peak_rss_mb"] = round(record.pop("_peak") / MB, 1)
+
+    def report(self, **info) -> Dict:
+        """
+        The profile as a JSON-serializable dict, with `info` (e.g. the agency) on top.
+        """
+        return {**info, "started_at": self.started_at, "stages": self.stages}
+
+    def save(self, path: str, **info) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(**info), f, indent=2)
+        return path
@@ -0,0 +1,170 @@
+import datetime
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+from gtfs_agent.feed_view import derived_tables
+from gtfs_agent.service_calendar import active_service_ids, to_date
+from utils.search_index import cached_index
+
+SECONDS_PER_DAY = 24 * 3600
+# Trip attributes copied next to each departure so answers need no join with trips
+TRIP_COLUMNS = ["route_id", "service_id", "direction_id", "trip_headsign"]
+
+
+def to_seconds(value) -> float:
+    """
+    Coerce a time of day given as seconds since midnight, an "HH:MM[:SS]" string, a
+    datetime.time or a datetime to seconds since midnight.
+    """
+    if isinstance(value, datetime.datetime):
+        value = value.time()
+    if isinstance(value, datetime.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, str):
+        parts = [float(part) for part in value.strip().split(":")]
+        parts += [0.0] * (3 - len(parts))
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return float(value)
+
+
+def build_stop_departures(feed) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Build the departure index of a feed: stop_times sorted by stop and departure time
+    (CSR layout) with the trip's route, service and direction, plus per-stop offsets.
+
+    Returns:
+        tuple: (departures, offsets). `departures` has one row per timed stop_times row;
+               `offsets` maps each `stop_id` to the `start` and `end` rows of its
+               departures. None if the feed has no stop_times or trips.
+    """
+    stop_times = getattr(feed, "stop_times", None)
+    trips = getattr(feed, "trips", None)
+    if not isinstance(stop_times, pd.DataFrame) or not isinstance(trips, pd.DataFrame):
+        return None
+
+    departures = stop_times[["stop_id", "departure_time", "trip_id", "stop_sequence"]]
+    departures = departures[departures["departure_time"].notna()]
+    trip_columns = ["trip_id"] + [column for column in TRIP_COLUMNS if column in trips.columns]
+    departures = departures.merge(trips[trip_columns], on="trip_id", how="left")
+    # Categorical service_ids let lookups test service activity on integer codes
+    departures["service_id"] = departures["service_id"].astype("category")
+    departures = departures.sort_values(["stop_id", "departure_time"], kind="stable")
+    departures = departures.reset_index(drop=True)
+
+    stop_ids = departures["stop_id"].to_numpy()
+    starts = np.flatnonzero(np.r_[len(stop_ids) > 0, stop_ids[1:] != stop_ids[:-1]])
+    offsets = pd.DataFrame(
+        {
+            "stop_id": departures["stop_id"].iloc[starts].to_numpy(),
+            "start": starts,
+            "end": np.r_[starts[1:], len(departures)].astype(np.int64),
+        }
+    )
+    return departures, offsets
+
+
+class DepartureIndex:
+    """
+    Per-stop lookup into the stop-sorted departures table: each stop's departures are
+    a contiguous, time-sorted slice found by binary search.
+    """
+
+    def __init__(self, stop_ids: pd.Series, starts: pd.Series, ends: pd.Series):
+        self.ranges: Dict[str, Tuple[int, int]] = dict(
+            zip(stop_ids.astype(str), zip(starts.tolist(), ends.tolist()))
+        )
+
+    def positions(self, times: np.ndarray, stop_id, start_time: float, end_time: float):
+        """
+        Rows of the departures table at `stop_id` with `start_time <= departure_time <=
+        end_time`.
+        """
+        start, end = self.ranges.get(str(stop_id), (0, 0))
+        stop_times = times[start:end]
+        lo = np.searchsorted(stop_times, start_time, side="left")
+        hi = np.searchsorted(stop_times, end_time, side="right")
+        return np.arange(start + lo, start + hi)
+
+
+def get_stop_departures(feed) -> Tuple[pd.DataFrame, DepartureIndex]:
+    """
+    The departures table of a feed and its per-stop index. Feeds processed before the
+    departure index was part of the build have it computed once, on first use.
+    """
+    tables = derived_tables(
+        feed, ["stop_departures", "stop_departure_offsets"], build_stop_departures
+    )
+    departures, offsets = tables["stop_departures"], tables["stop_departure_offsets"]
+    index = cached_index("stop_departures", offsets, ["stop_id", "start", "end"], DepartureIndex)
+    return departures, index
+
+
+def next_departures(
+    feed, stop_ids, date, start_time=0, end_time=None, n: Optional[int] = 5
+) -> pd.DataFrame:
+    """
+    Find the next departures from one or more stops on a date.
+
+    Trips of the previous service day running past midnight (departure times of 24:00:00
+    and later) are included.
+
+    Args:
+        feed: The GTFS feed.
+        stop_ids (str or list): The stop_id, or all stop_ids of a station.
+        date: The date, as a datetime.date, datetime or "YYYYMMDD" string.
+        start_time: Earliest departure, as seconds since midnight, "HH:MM:SS" or
+                    datetime.time. Defaults to the start of the day.
+        end_time: Latest departure in the same formats, or None for no limit.
+        n (int, optional): Maximum number of departures to return, or None for all.
+
+    Returns:
+        pd.DataFrame: Departures sorted by time, with `departure_time` in seconds since
+                      midnight of `date` and the trip's `service_date`.
+    """
+    if isinstance(stop_ids, str) or np.isscalar(stop_ids):
+        stop_ids = [stop_ids]
+    departures, index = get_stop_departures(feed)
+    times = departures["departure_time"].to_numpy()
+    date = to_date(date)
+    start_time = to_seconds(start_time)
+    end_time = np.inf if end_time is None else to_seconds(end_time)
+
+    service_ids = departures["service_id"]
+    if not isinstance(service_ids.dtype, pd.CategoricalDtype):
+        service_ids = service_ids.astype("category")
+    categories = service_ids.cat.categories.astype(str)
+    codes = service_ids.cat.codes.to_numpy()
+
+    service_days = [date, date - datetime.timedelta(days=1)]
+    positions, shifts, active = [], [], []
+    for day, service_date in enumerate(service_days):
+        shift = day * SECONDS_PER_DAY
+        day_positions = np.concatenate(
+            [
+                index.positions(times, stop_id, start_time + shift, end_time + shift)
+                for stop_id in stop_ids
+            ]
+        ).astype(np.int64)
+        if len(day_positions):
+            # One flag per category, plus False for a missing service_id (code -1)
+            services = set(active_service_ids(feed, service_date))
+            category_active = np.array([category in services for category in categories] + [False])
+            active.append(category_active[codes[day_positions]])
+        else:
+            active.append(np.zeros(0, dtype=bool))
+        positions.append(day_positions)
+        shifts.append(np.full(len(day_positions), day))
+
+    positions = np.concatenate(positions)
+    days = np.concatenate(shifts)
+    active = np.concatenate(active)
+    positions, days = positions[active], days[active]
+    local_times = times[positions] - days * SECONDS_PER_DAY
+    order = np.argsort(local_times, kind="stable")
+    if n is not None:
+        order = order[:n]
+
+    result = departures.iloc[positions[order]].reset_index(drop=True)
+    result["departure_time"] = local_times[order].astype(times.dtype)
+    result["service_date"] = [service_days[day] for day in days[order]]
+    return result
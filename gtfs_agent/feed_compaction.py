@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Tuple
+from gtfs_agent.feed_view import feed_tables
+
+# Id columns per id domain
+ID_DOMAINS = {
+    "stop_id": ["stop_id", "parent_station", "from_stop_id", "to_stop_id"],
+    "trip_id": ["trip_id", "from_trip_id", "to_trip_id"],
+    "route_id": ["route_id", "from_route_id", "to_route_id"],
+    "service_id": ["service_id"],
+    "shape_id": ["shape_id"],
+}
+ID_COLUMNS = {column for columns in ID_DOMAINS.values() for column in columns}
+# Tables large enough for categorical ids to pay off. Each uses the sorted ids it holds
+# as its categories; ids of all other tables are plain strings, so generated code that
+# counts, concatenates or assigns ids there sees ordinary pandas behaviour
+CATEGORICAL_ID_TABLES = ["stop_times", "stop_departures", "route_headways"]
+# Times in seconds since midnight; they become int32 unless they have blanks
+TIME_COLUMNS = [
+    "arrival_time",
+    "departure_time",
+    "start_time",
+    "end_time",
+    "first_departure",
+    "last_departure",
+]
+# Orderings within a trip, shape or pattern; int16 when they fit
+SEQUENCE_COLUMNS = ["stop_sequence", "shape_pt_sequence", "stop_index", "segment_index"]
+# Shape points and distances along them are fine at float32 (about 1 m); stop
+# coordinates keep float64 for nearest-stop and walking distance queries
+FLOAT32_COLUMNS = ["shape_pt_lat", "shape_pt_lon", "shape_dist_traveled"]
+
+
+def _is_id_column(series: pd.Series) -> bool:
+    # Ids are strings; numeric columns (e.g. an all-blank parent_station) are left alone
+    return (
+        series.dtype == object
+        or pd.api.types.is_string_dtype(series.dtype)
+        or isinstance(series.dtype, pd.CategoricalDtype)
+    )
+
+
+def _as_category(series: pd.Series) -> pd.Series:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        codes = series.cat.codes.to_numpy()
+        used = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        if used.all() and categories.is_monotonic_increasing:
+            return series
+        series = series.cat.remove_unused_categories()
+        return series.cat.reorder_categories(series.cat.categories.sort_values())
+    categories = pd.Index(series.dropna().unique()).astype(str).sort_values()
+    return series.astype(pd.CategoricalDtype(categories))
+
+
+def _as_string(series: pd.Series) -> pd.Series:
+    # Streamed tables arrive with categorical ids
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(str)
+    return series
+
+
+def _astype(series: pd.Series, dtype) -> pd.Series:
+    # Unchanged columns are returned as is, so compacting twice is a no-op
+    return series if series.dtype == dtype else series.astype(dtype)
+
+
+def _smallest_int(series: pd.Series, dtypes) -> pd.Series:
+    if series.empty:
+        return _astype(series, dtypes[-1])
+    low, high = series.min(), series.max()
+    for dtype in dtypes:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return _astype(series, dtype)
+    return series
+
+
+def _compact_numbers(column: str, series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series.dtype) or not pd.api.types.is_numeric_dtype(series.dtype):
+        return series
+    if column in FLOAT32_COLUMNS:
+        return _astype(series, np.float32)
+    if column in TIME_COLUMNS:
+        # Blank times (non-timepoints) need NaN, so those columns stay float32
+        if pd.api.types.is_float_dtype(series.dtype):
+            if series.isna().any() or not (series == np.round(series)).all():
+                return _astype(series, np.float32)
+        return _smallest_int(series, [np.int32])
+    # Nullable integer columns keep their extension dtype
+    if not pd.api.types.is_integer_dtype(series.dtype) or not isinstance(series.dtype, np.dtype):
+        return series
+    if column in SEQUENCE_COLUMNS:
+        return _smallest_int(series, [np.int16, np.int32])
+    return _smallest_int(series, [np.int32])
+
+
+def table_memory(df: pd.DataFrame) -> int:
+    """
+    In-RAM size of a table in bytes, including the strings of object columns.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def compact_table(df: pd.DataFrame, categorical_ids: bool = False) -> pd.DataFrame:
+    """
+    Convert the columns of one table to compact dtypes.
+
+    Args:
+        df (pd.DataFrame): The table.
+        categorical_ids (bool): Make the id columns categoricals of the table's own ids;
+                                otherwise they are kept as strings.
+
+    Returns:
+        pd.DataFrame: The table with int32 times, int16/int32 sequences, float32 shape
+                      coordinates and, if requested, categorical ids.
+    """
+    columns = {}
+    for column in df.columns:
+        original = df[column]
+        if column in ID_COLUMNS:
+            series = original
+            if _is_id_column(original):
+                series = _as_category(original) if categorical_ids else _as_string(original)
+        else:
+            series = _compact_numbers(column, original)
+        if series is not original:
+            columns[column] = series
+    if not columns:
+        return df
+    return df.assign(**columns)
+
+
+def compact_feed(feed) -> Dict[str, Tuple[int, int]]:
+    """
+    Compact every table of a feed in place (see compact_table); the id columns of
+    CATEGORICAL_ID_TABLES become categoricals. Running it again, e.g. after more
+    tables were loaded, only converts what is not compact yet.
+
+    Returns:
+        dict: Maps each table whose memory went down to its bytes before and after.
+    """
+    report = {}
+    for name, df in feed_tables(feed).items():
+        compacted = compact_table(df, name in CATEGORICAL_ID_TABLES)
+        if compacted is df:
+            continue
+        setattr(feed, name, compacted)
+        before, after = table_memory(df), table_memory(compacted)
+        if after < before:
+            report[name] = (before, after)
+    return report
+
+
+def format_memory_report(report: Dict[str, Tuple[int, int]]) -> str:
+    """
+    Format the output of compact_feed as one line per table plus a total.
+    """
+    lines = []
+    for name, (before, after) in sorted(report.items(), key=lambda item: -item[1][0]):
+        lines.append(f"  {name}: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+    before = sum(before for before, _ in report.values())
+    after = sum(after for _, after in report.values())
+    ratio = before / after if after else 1.0
+    lines.append(f"  total: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB ({ratio:.1f}x)")
+    return "\n".join(lines)
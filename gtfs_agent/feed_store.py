@@ -0,0 +1,253 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import gtfs_kit as gk
+from typing import Dict, Optional
+from gtfs_agent.gtfs_loader import GTFSLoader, LOADER_VERSION
+from gtfs_agent.feed_view import feed_tables, protect_value
+
+# Version of the on-disk layout written by save_feed_store
+STORE_FORMAT_VERSION = 1
+METADATA_FILENAME = "feed_meta.json"
+TABLE_EXTENSION = ".arrow"
+
+# Loader attributes persisted in the metadata sidecar
+LOADER_ATTRIBUTES = ["gtfs", "gtfs_path", "file_list", "distance_unit", "distance_method"]
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _to_arrow(df: pd.DataFrame):
+    """
+    Convert a DataFrame to an Arrow table. Object columns with mixed types that Arrow
+    cannot represent are stored as JSON encoded values and reported back, so that
+    arrow_to_pandas can restore them.
+    """
+    json_columns = []
+    try:
+        return pa.Table.from_pandas(df), json_columns
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        df = df.copy()
+        for column in df.columns[df.dtypes == object]:
+            try:
+                pa.array(df[column], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                encoded = df[column].map(
+                    lambda value: json.dumps(value, default=_json_value), na_action="ignore"
+                )
+                df[column] = encoded.where(df[column].notna(), None).astype(object)
+                json_columns.append(column)
+        return pa.Table.from_pandas(df), json_columns
+
+
+def save_feed_store(loader: GTFSLoader, directory: str) -> str:
+    """
+    Persist a loaded feed as one Arrow IPC file per table plus a JSON metadata sidecar.
+
+    Tables are written uncompressed so they can be memory-mapped when read back. The
+    store is written to a temporary directory first and then swapped in, so readers
+    never see a half-written store.
+
+    Args:
+        loader (GTFSLoader): Loader whose feed has been loaded.
+        directory (str): Destination directory for the store.
+
+    Returns:
+        str: The store directory.
+    """
+    tmp_directory = f"{directory}.tmp"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    tables_meta = {}
+    for name, df in feed_tables(loader.feed).items():
+        table, json_columns = _to_arrow(df)
+        filename = f"{name}{TABLE_EXTENSION}"
+        with pa.OSFile(os.path.join(tmp_directory, filename), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        tables_meta[name] = {
+            "file": filename,
+            "rows": len(df),
+            "columns": list(map(str, df.columns)),
+            "json_columns": list(map(str, json_columns)),
+        }
+
+    metadata = {
+        "format_version": STORE_FORMAT_VERSION,
+        "loader_version": LOADER_VERSION,
+        "dist_units": loader.feed.dist_units,
+        **{attr: getattr(loader, attr, None) for attr in LOADER_ATTRIBUTES},
+        "tables": tables_meta,
+    }
+    with open(os.path.join(tmp_directory, METADATA_FILENAME), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+    return directory
+
+
+def read_store_metadata(directory: str) -> dict:
+    with open(os.path.join(directory, METADATA_FILENAME), "r") as f:
+        metadata = json.load(f)
+    if metadata.get("format_version") != STORE_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported feed store format {metadata.get('format_version')} in {directory}"
+        )
+    return metadata
+
+
+def open_store_table(directory: str, table_meta: dict) -> pa.Table:
+    """
+    Open one table of a feed store as a memory-mapped Arrow table without copying it.
+    """
+    source = pa.memory_map(os.path.join(directory, table_meta["file"]), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def arrow_to_pandas(table: pa.Table, table_meta: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Convert a stored Arrow table to pandas. Blocks are not consolidated, so numeric
+    columns without nulls stay zero-copy views of the memory map. Mixed-type columns
+    that _to_arrow stored as JSON (`json_columns` of `table_meta`) are decoded back to
+    object columns; stores written before that kept them as plain strings
+    (`stringified_columns`), which come back as object columns of strings.
+    """
+    df = table.to_pandas(split_blocks=True)
+    # Columns that were entirely empty come back as None; restore pandas' NaN
+    for field in table.schema:
+        if pa.types.is_null(field.type) and field.name in df.columns:
+            df[field.name] = pd.Series(np.nan, index=df.index, dtype=object)
+    table_meta = table_meta or {}
+    for column in table_meta.get("json_columns", []):
+        if column in df.columns:
+            values = [np.nan if pd.isna(value) else json.loads(value) for value in df[column]]
+            df[column] = pd.Series(values, index=df.index, dtype=object)
+    for column in table_meta.get("stringified_columns", []):
+        if column in df.columns:
+            df[column] = df[column].astype(object)
+    return df
+
+
+def read_store_table(directory: str, table_meta: dict) -> pd.DataFrame:
+    """
+    Read one table of a feed store into pandas through a memory map.
+    """
+    return arrow_to_pandas(open_store_table(directory, table_meta), table_meta)
+
+
+def build_feed(dist_units: str, tables: Dict[str, pd.DataFrame]):
+    """
+    Reconstruct a gtfs_kit Feed from its tables, dropping tables that were not stored.
+    """
+    feed = gk.Feed(dist_units=dist_units)
+    for name, df in tables.items():
+        setattr(feed, name, df)
+    for attr in list(vars(feed)):
+        if not attr.startswith("_") and getattr(feed, attr) is None:
+            delattr(feed, attr)
+    return feed
+
+
+class LazyFeed(gk.Feed):
+    """
+    A gtfs_kit Feed backed by a feed store whose tables are materialized on first access.
+
+    Until a table such as `feed.stop_times` is used, it stays a memory-mapped Arrow file
+    on disk and costs no resident memory. Once accessed it is converted to pandas and
+    kept as a regular attribute, so it behaves exactly like a table of a loaded Feed.
+    Tables missing from the store raise AttributeError, matching GTFSLoader feeds whose
+    empty tables were removed.
+    """
+
+    def __init__(self, directory: str, metadata: dict):
+        # Feed.__init__ is not called: it would set every GTFS table to None
+        self._store_directory = directory
+        self._store_tables = metadata["tables"]
+        self._dist_units = metadata["dist_units"]
+
+    def _table_for(self, name: str):
+        tables = self.__dict__.get("_store_tables", {})
+        # Property backed tables (trips, calendar, ...) are read through `_name`
+        # and their indexed variants through `_name_i`
+        candidates = [name]
+        if name.startswith("_"):
+            candidates.append(name[1:])
+            if name.endswith("_i"):
+                candidates.append(name[1:-2])
+        for candidate in candidates:
+            if candidate in tables:
+                return candidate
+        return None
+
+    def __getattr__(self, name):
+        table_name = self._table_for(name) if not name.startswith("__") else None
+        if table_name is None or table_name in self.__dict__ or f"_{table_name}" in self.__dict__:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        parent = self.__dict__.get("_view_parent")
+        if parent is not None:
+            # Views (see feed_view.copy_on_write_view) share the parent's materialized table
+            table = protect_value(getattr(parent, table_name))
+        else:
+            table = read_store_table(self._store_directory, self._store_tables[table_name])
+        setattr(self, table_name, table)
+        return getattr(self, name)
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self.__dict__.get("_store_tables", {})))
+
+    def is_materialized(self, name: str) -> bool:
+        return name in self.__dict__ or f"_{name}" in self.__dict__
+
+    def materialized_tables(self):
+        return [name for name in self._store_tables if self.is_materialized(name)]
+
+    def table_preview(self, name: str, n: int = 5) -> pd.DataFrame:
+        """
+        First `n` rows of a table, read from the memory map if the table is not
+        materialized yet.
+        """
+        if self.is_materialized(name):
+            return getattr(self, name).head(n)
+        if name not in self._store_tables:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        table_meta = self._store_tables[name]
+        table = open_store_table(self._store_directory, table_meta)
+        return arrow_to_pandas(table.slice(0, n), table_meta)
+
+
+def load_feed_store(directory: str, lazy: bool = False) -> GTFSLoader:
+    """
+    Load a feed store written by save_feed_store back into a GTFSLoader.
+
+    Args:
+        directory (str): The feed store directory.
+        lazy (bool): If True, return a LazyFeed whose tables are only read into
+                     pandas when first accessed.
+
+    Returns:
+        GTFSLoader: A loader with its `feed` reconstructed from the stored tables.
+    """
+    metadata = read_store_metadata(directory)
+    if lazy:
+        feed = LazyFeed(directory, metadata)
+    else:
+        tables = {
+            name: read_store_table(directory, table_meta)
+            for name, table_meta in metadata["tables"].items()
+        }
+        feed = build_feed(metadata["dist_units"], tables)
+
+    loader = GTFSLoader.__new__(GTFSLoader)
+    loader.__setstate__(
+        {**{attr: metadata.get(attr) for attr in LOADER_ATTRIBUTES}, "feed": feed}
+    )
+    return loader
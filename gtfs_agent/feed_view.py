@@ -0,0 +1,121 @@
+import os
+import copy
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+
+_DERIVED_LOCK = threading.Lock()
+
+
+def _reset_derived_lock():
+    # A fork while another thread builds would leave the child's lock held forever
+    global _DERIVED_LOCK
+    _DERIVED_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_derived_lock)
+
+
+def copy_on_write_enabled() -> bool:
+    """
+    Whether pandas copy-on-write is active (always on from pandas 3.0).
+    """
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except KeyError:
+        return False
+
+
+def feed_tables(feed) -> Dict[str, pd.DataFrame]:
+    """
+    Collect the public DataFrame attributes (GTFS tables) of a feed.
+    """
+    tables = {}
+    for attr in dir(feed):
+        if attr.startswith("_"):
+            continue
+        value = getattr(feed, attr, None)
+        if isinstance(value, pd.DataFrame):
+            tables[attr] = value
+    return tables
+
+
+def protect_value(value):
+    """
+    Return a copy of a feed attribute that generated code may freely modify.
+
+    With copy-on-write, DataFrames are shallow copies that only copy a column's
+    data when it is written to, so protecting a table is O(columns) rather than
+    O(rows). Without copy-on-write the table has to be copied up front.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not copy_on_write_enabled())
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, (dict, list, set)):
+        return copy.copy(value)
+    return value
+
+
+def copy_on_write_view(feed):
+    """
+    Create a feed that shares the data of `feed` but protects it from mutation.
+
+    The view is an instance of the same Feed class, so it is a drop-in replacement
+    for `copy.deepcopy(feed)`: replacing, adding or deleting tables and writing into
+    tables only affects the view. Lazy feeds materialize tables in the original
+    feed, so a table is only converted to pandas once across all views.
+    """
+    view = type(feed).__new__(type(feed))
+    view.__dict__.update({key: protect_value(value) for key, value in vars(feed).items()})
+    view.__dict__["_view_parent"] = feed
+    return view
+
+
+def derived_tables(
+    feed, names: List[str], build: Callable
+) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Get tables derived from a feed at build time, such as the service-day bitmap.
+
+    Feeds processed before a table was part of the build do not have it. For those,
+    `build(feed)` runs once, and the result is kept on the feed. If `feed` is a
+    copy-on-write view, the result is kept on the view's parent, so later calls and
+    views reuse it.
+
+    Args:
+        feed: The GTFS feed or a view of it.
+        names (list): The attribute names of the tables.
+        build (callable): Builds the tables from a feed. It returns a DataFrame for a
+                          single name, a tuple in `names` order, a dict, or None.
+
+    Returns:
+        dict: Maps each name to its table. None if `build` returned None.
+    """
+    tables = {name: getattr(feed, name, None) for name in names}
+    if all(isinstance(table, pd.DataFrame) for table in tables.values()):
+        return tables
+
+    source = feed.__dict__.get("_view_parent", feed)
+    with _DERIVED_LOCK:
+        tables = {name: getattr(source, name, None) for name in names}
+        if not all(isinstance(table, pd.DataFrame) for table in tables.values()):
+            built = build(source)
+            if built is None:
+                return None
+            if isinstance(built, pd.DataFrame):
+                built = (built,)
+            tables = dict(built) if isinstance(built, dict) else dict(zip(names, built))
+            for name in names:
+                setattr(source, name, tables[name])
+    if source is not feed:
+        tables = {name: protect_value(table) for name, table in tables.items()}
+        for name, table in tables.items():
+            setattr(feed, name, table)
+    return tables
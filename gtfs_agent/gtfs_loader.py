@@ -1,125 +1,368 @@
 import gtfs_kit as gk
 import pandas as pd
 import numpy as np
-import zipfile
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import csv
 import datetime
 import traceback
-from typing import Optional, Any
+from typing import Optional, Any, List
 from functools import lru_cache
-from utils.helper import list_files_in_zip
-from geopy.distance import geodesic
-from shapely.geometry import Point
-from scipy.spatial import cKDTree
+from gtfs_kit import constants as gk_constants
+from gtfs_kit import cleaners as gk_cleaners
+from gtfs_agent.geo_distance import cumulative_shape_distances
+from gtfs_agent.stop_snapping import snap_stop_times, SnapCache
+from gtfs_agent.service_calendar import build_service_days
+from gtfs_agent.departure_index import build_stop_departures
+from gtfs_agent.headways import build_route_headways
+from gtfs_agent.stop_patterns import build_stop_patterns
+from gtfs_agent.feed_compaction import ID_COLUMNS, compact_feed, format_memory_report
+from gtfs_agent.zip_reader import GTFSZip
+from gtfs_agent.build_profiler import BuildProfiler
+from gtfs_agent.feed_view import feed_tables
+
+# Bump whenever feed processing changes so incremental builds reprocess every feed
+LOADER_VERSION = "13"
 
 DATE_FORMAT = "%Y%m%d"
 DATE_FORMAT_ALT = "%Y-%m-%d"
-
-
-@lru_cache(maxsize=None)
-def process_stop_sequence(stops, shape_coords, k_neighbors=3):
-    geo_const = 6371000 * np.pi / 180
-    tree = cKDTree(data=shape_coords)
-
-    if len(stops) <= 1:
-        return None
-
-    neighbors = k_neighbors
-    while True:
-        np_dist, np_inds = tree.query(stops, workers=-1, k=neighbors)
-        np_dist = np_dist * geo_const
-        prev_point = min(np_inds[0])
-        points = [prev_point]
-
-        for i, nps in enumerate(np_inds[1:]):
-            condition = (nps > prev_point) & (nps < max(np_inds[i + 1]))
-            points_valid = nps[condition]
-            if len(points_valid) > 0:
-                points_score = (np.power(points_valid - prev_point, 3)) * np.power(
-                    np_dist[i + 1, condition], 1
-                )
-                prev_point = nps[condition][np.argmin(points_score)]
-                points.append(prev_point)
-            else:
-                if neighbors < len(stops):
-                    neighbors = min(neighbors + 2, len(stops))
-                    break
-                else:
-                    return None
-
-        if len(points) == len(stops):
-            return points
-
-
-def nearest_points(
-    stop_df: pd.DataFrame, shape_points: pd.DataFrame, k_neighbors: int = 3
-) -> pd.DataFrame:
-    stop_df = stop_df.copy()
-    stop_df["snap_start_id"] = -1
-
-    shape_coords = np.array([point.coords[0] for point in shape_points]).reshape(-1, 2)
-
-    failed_trips = []
-    total_trips = 0
-    defective_trips = 0
-
-    for name, group in stop_df.groupby("trip_id"):
-        total_trips += 1
-        stops = tuple(x.coords[0] for x in group["geometry"])
-
-        points = process_stop_sequence(
-            stops, tuple(map(tuple, shape_coords)), k_neighbors
-        )
-
-        if points is None:
-            failed_trips.append(name)
-            defective_trips += 1
-            print(f"Excluding Trip: {name} due to processing failure")
-        else:
-            stop_df.loc[stop_df.trip_id == name, "snap_start_id"] = points
-
-    if defective_trips > 0:
-        percent_defective = (defective_trips / total_trips) * 100
-        print(f"Total defective trips: {defective_trips}")
-        print(f"Percentage defective trips: {percent_defective:.2f}%")
-
-    stop_df = stop_df[~stop_df.trip_id.isin(failed_trips)].reset_index(drop=True)
-    return stop_df
+# GTFS times are "H:MM:SS" or "HH:MM:SS" (hours past 24 for trips after midnight); they
+# are left-padded to "HHH:MM:SS" and parsed from their bytes
+TIME_WIDTH = 9
+TIME_DIGITS = [0, 1, 2, 4, 5, 7, 8]
+TIME_COLONS = [3, 6]
+
+# Zip members larger than this (uncompressed) are streamed in chunks instead of being
+# read whole, so peak memory is bounded by the chunk size rather than the table size
+STREAM_THRESHOLD_BYTES = 64 * 2**20
+STREAM_CHUNK_BYTES = 16 * 2**20
+# Columns parsed while streaming, as _parse_times_and_dates would do afterwards
+STREAMED_TIME_COLUMNS = {"stop_times": ["arrival_time", "departure_time"]}
+ARROW_TYPES = {"str": pa.string(), "int": pa.int32(), "float": pa.float64()}
+# pd.read_csv's default missing-value markers, so streamed and whole reads agree
+NULL_VALUES = (
+    "|#N/A|#N/A N/A|#NA|-1.#IND|-1.#QNAN|-NaN|-nan|1.#IND|1.#QNAN|<NA>|N/A|NA|NULL|NaN|None|"
+    "n/a|nan|null"
+).split("|")
+# The characters Python's str.strip and re's \s treat as whitespace, in RE2 syntax
+WHITESPACE_RUN = r"[\s\v\p{Z}\x{85}\x{1c}-\x{1f}]+"
+
+
+def _as_text(series: pd.Series) -> pa.Array:
+    """
+    The values of a column as trimmed Arrow strings, with missing values as nulls.
+    Non-string values (e.g. numbers or dates) are converted with str().
+    """
+    try:
+        text = pa.array(series, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        text = pa.array(series.map(str, na_action="ignore"), type=pa.string(), from_pandas=True)
+    if isinstance(text, pa.ChunkedArray):
+        text = text.combine_chunks()
+    return pc.utf8_trim_whitespace(text)
+
+
+def _fixed_width_seconds(text: pa.Array):
+    """
+    Seconds since midnight of "HHH:MM:SS" strings, read as an (n, 9) byte matrix.
+
+    Returns:
+        tuple: (int32 seconds, mask of the values that were well-formed)
+    """
+    offsets = np.frombuffer(text.buffers()[1], dtype=np.int32)[text.offset : text.offset + len(text) + 1]
+    data = np.frombuffer(text.buffers()[2], dtype=np.uint8)[offsets[0] : offsets[-1]]
+    data = data.reshape(-1, TIME_WIDTH)
+    digits = data.astype(np.int32) - ord("0")
+    valid = ((digits[:, TIME_DIGITS] >= 0) & (digits[:, TIME_DIGITS] <= 9)).all(axis=1)
+    valid &= (data[:, TIME_COLONS] == ord(":")).all(axis=1)
+    hours = digits[:, 0] * 100 + digits[:, 1] * 10 + digits[:, 2]
+    minutes = digits[:, 4] * 10 + digits[:, 5]
+    seconds = digits[:, 7] * 10 + digits[:, 8]
+    return hours * 3600 + minutes * 60 + seconds, valid
+
+
+def _parse_irregular_time(val: str) -> float:
+    # Plain seconds ("45296") or unpadded parts ("7:5:0"); anything else is missing
+    try:
+        return float(val)
+    except ValueError:
+        pass
+    try:
+        h, m, s = map(float, val.split(":"))
+    except ValueError:
+        return np.nan
+    return h * 3600 + m * 60 + s
+
+
+def parse_times(values) -> np.ndarray:
+    """
+    Parse GTFS times ("HH:MM:SS", hours may exceed 24) to seconds since midnight in
+    one vectorized pass. Blank and missing values become NaN; numbers (already parsed
+    times) are kept.
+
+    Returns:
+        np.ndarray: float32 seconds, exact for every time of day.
+    """
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy(dtype=np.float32)
+
+    text = _as_text(series)
+    padded = pc.utf8_lpad(text, width=TIME_WIDTH, padding="0")
+    lengths = pc.fill_null(pc.binary_length(padded), 0).to_numpy(zero_copy_only=False)
+    fixed = lengths == TIME_WIDTH
+    result = np.full(len(series), np.nan, dtype=np.float32)
+    if fixed.any():
+        seconds, valid = _fixed_width_seconds(padded.filter(pa.array(fixed)))
+        positions = np.flatnonzero(fixed)
+        result[positions[valid]] = seconds[valid]
+        fixed[positions[~valid]] = False
+
+    # The rare values of any other shape are parsed one by one
+    blank = pc.fill_null(pc.equal(text, ""), True).to_numpy(zero_copy_only=False)
+    irregular = np.flatnonzero(~fixed & ~blank)
+    if len(irregular):
+        irregular_text = text.take(pa.array(irregular)).to_pylist()
+        result[irregular] = [_parse_irregular_time(val) for val in irregular_text]
+    return result
+
+
+def parse_dates(values) -> np.ndarray:
+    """
+    Parse GTFS dates ("YYYYMMDD", or "YYYY-MM-DD") to datetime.date objects with
+    vectorized Arrow kernels. Missing values become None.
+
+    Raises:
+        ValueError: If a value is not a date in either format.
+    """
+    series = pd.Series(values)
+    text = _as_text(series)
+    dates = pc.coalesce(
+        pc.strptime(text, format=DATE_FORMAT, unit="s", error_is_null=True),
+        pc.strptime(text, format=DATE_FORMAT_ALT, unit="s", error_is_null=True),
+    )
+    failed = pc.and_(pc.is_null(dates), pc.is_valid(text)).to_numpy(zero_copy_only=False)
+    if failed.any():
+        raise ValueError(f"Unable to parse date: {series[failed].iloc[0]}")
+    return pc.cast(dates, pa.date32()).to_pandas(date_as_object=True).to_numpy(dtype=object)
+
+
+def _reference_types(table_name: str) -> dict:
+    # Arrow types of the GTFS columns of a table, following gtfs_kit's reference
+    reference = gk_constants.GTFS_REF[gk_constants.GTFS_REF["table"] == table_name]
+    return {
+        column: ARROW_TYPES[dtype] for column, dtype in zip(reference["column"], reference["dtype"])
+    }
+
+
+def _clean_id_text(column: pa.Array) -> pa.Array:
+    # gtfs_kit's clean_ids: strip whitespace, then replace whitespace runs with "_"
+    return pc.replace_substring_regex(pc.utf8_trim_whitespace(column), WHITESPACE_RUN, "_")
+
+
+def _compact_chunk(table_name: str, batch: pa.RecordBatch, types: dict) -> pa.RecordBatch:
+    """
+    Clean, parse and compact one chunk of a streamed table like Feed.clean and
+    _parse_times_and_dates do for tables read whole: ids are cleaned and dictionary
+    encoded, and times are parsed to seconds.
+    """
+    time_columns = STREAMED_TIME_COLUMNS.get(table_name, [])
+    columns = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        if name in types and column.type != types[name] and not pa.types.is_null(column.type):
+            column = column.cast(types[name])
+        if name in time_columns:
+            column = pa.array(parse_times(column), type=pa.float32())
+        elif name.endswith("_id") and pa.types.is_string(column.type):
+            column = _clean_id_text(column)
+            if name in ID_COLUMNS:
+                column = column.dictionary_encode()
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def _read_header(source) -> List[str]:
+    # The stripped column names of a CSV file object, as pd.read_csv with
+    # encoding="utf-8-sig" and clean_column_names give them; the file is left unread
+    start = source.tell()
+    head = b""
+    while b"\n" not in head:
+        block = source.read(2**16)
+        if not block:
+            break
+        head += block
+    source.seek(start)
+    line = head.split(b"\n", 1)[0].decode("utf-8-sig")
+    return [name.strip() for name in next(csv.reader([line]), [])]
+
+
+def stream_table(source, table_name: str, chunk_bytes: int = STREAM_CHUNK_BYTES) -> pd.DataFrame:
+    """
+    Read a GTFS table from a CSV file object chunk by chunk with the Arrow CSV reader.
+
+    Only one raw chunk is in memory at a time: every chunk is cleaned and compacted
+    (see _compact_chunk) and appended to a columnar Arrow table, which is converted to
+    pandas at the end with categorical ids.
+
+    Args:
+        source: Binary file object of the CSV file, e.g. an open zip member.
+        table_name (str): The GTFS table, e.g. "stop_times".
+        chunk_bytes (int): Bytes of CSV parsed per chunk.
+
+    Returns:
+        pd.DataFrame: The table, with stripped column names.
+    """
+    # The header is read here so that padded names still get their reference types
+    names = _read_header(source)
+    types = {name: dtype for name, dtype in _reference_types(table_name).items() if name in names}
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=chunk_bytes, skip_rows=1, column_names=names),
+        convert_options=pacsv.ConvertOptions(
+            column_types=types, null_values=NULL_VALUES, strings_can_be_null=True
+        ),
+    )
+    batches = [_compact_chunk(table_name, batch, types) for batch in reader]
+    if not batches:
+        return pd.DataFrame(columns=names)
+    table = pa.Table.from_batches(batches).unify_dictionaries().combine_chunks()
+    del batches
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    # Dictionaries are in order of appearance; sorted categories sort like strings
+    columns = {}
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            categories = df[column].cat.categories
+            columns[column] = df[column].cat.reorder_categories(categories.sort_values())
+    return df.assign(**columns)
+
+
+def read_table(archive: GTFSZip, table_name: str, stream_threshold: int = STREAM_THRESHOLD_BYTES):
+    """
+    Read one table of a GTFS zip. Tables larger than `stream_threshold` bytes
+    uncompressed are read with stream_table, others whole with gtfs_kit's reference
+    dtypes.
+
+    Returns:
+        tuple: (pd.DataFrame with stripped column names, whether it was streamed)
+    """
+    size = archive.table_size(table_name)
+    if size > stream_threshold:
+        print(f"Streaming {table_name}.txt ({size / 2**20:.0f} MB)")
+        try:
+            with archive.open(table_name) as f:
+                return stream_table(f, table_name), True
+        except pa.ArrowInvalid as e:
+            # E.g. a non-integer value in an integer column
+            print(f"Could not stream {table_name}.txt ({e}), reading it whole")
+    with archive.open(table_name) as f:
+        df = pd.read_csv(f, dtype=gk_constants.DTYPE, encoding="utf-8-sig")
+    return gk_cleaners.clean_column_names(df), False
+
+
+def read_feed(archive: GTFSZip, dist_units: str, stream_threshold: int = STREAM_THRESHOLD_BYTES):
+    """
+    Read the GTFS tables of a zip into a Feed like gk.read_feed, without extracting
+    the archive (see read_table).
+
+    Returns:
+        tuple: (gk.Feed, names of the streamed tables)
+    """
+    feed_dict = {table: None for table in gk_constants.GTFS_REF["table"]}
+    streamed_tables = []
+    for table_name in archive.tables:
+        if table_name not in feed_dict or not archive.table_size(table_name):
+            continue
+        df, streamed = read_table(archive, table_name, stream_threshold)
+        if streamed:
+            streamed_tables.append(table_name)
+        if not df.empty:
+            feed_dict[table_name] = df
+    feed_dict["dist_units"] = dist_units
+    return gk.Feed(**feed_dict), streamed_tables
+
+
+def feed_rows(feed) -> int:
+    """
+    Total number of rows over the tables of a feed.
+    """
+    return sum(len(df) for df in feed_tables(feed).values())
 
 
 class GTFSLoader:
-    def __init__(self, gtfs, gtfs_path: str, distance_unit: str = "km"):
+    def __init__(
+        self,
+        gtfs,
+        gtfs_path: str,
+        distance_unit: str = "km",
+        distance_method: str = "haversine",
+        profiler: Optional[BuildProfiler] = None,
+    ):
         self.gtfs = gtfs
         self.gtfs_path = gtfs_path
         self.feed: Optional[gk.feed] = None
-        self.file_list = list_files_in_zip(gtfs_path)
-        self.zipfile = zipfile.ZipFile(gtfs_path)
+        # Opened once and shared by every table read of the build
+        self.archive = GTFSZip(gtfs_path)
+        self.file_list = self.archive.file_list
         self.distance_unit = distance_unit
+        self.distance_method = distance_method
+        # Times every build stage; see gtfs_agent.build_profiler
+        self.profiler = profiler or BuildProfiler()
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        if "zipfile" in state:
-            del state["zipfile"]
+        for attr in ["archive", "profiler"]:
+            state.pop(attr, None)
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        self.profiler = BuildProfiler()
 
     def load_feed(self):
         try:
-            feed = gk.read_feed(self.gtfs_path, dist_units=self.distance_unit)
-            feed = self._process_feed(feed)
+            with self.profiler.stage("read_feed") as record:
+                feed, streamed_tables = read_feed(
+                    self._open_archive(), self.distance_unit, STREAM_THRESHOLD_BYTES
+                )
+                record["rows"] = feed_rows(feed)
+            feed = self._process_feed(feed, streamed_tables)
             self.feed = feed
         except Exception as e:
             print(f"Error loading GTFS feed: {e}")
             print(traceback.format_exc())
+            self._close_archive()
             return False
         return True
 
-    def _process_feed(self, feed):
-        feed = self._append_distances(feed)
-        feed = feed.clean()
-        feed = self._parse_times_and_dates(feed)
-        feed = self._remove_empty_attributes(feed)
+    def _open_archive(self) -> GTFSZip:
+        # Loaders restored from a pickle or feed store reopen the zip on demand
+        if getattr(self, "archive", None) is None:
+            self.archive = GTFSZip(self.gtfs_path)
+        return self.archive
+
+    def _close_archive(self):
+        archive = self.__dict__.pop("archive", None)
+        if archive is not None:
+            archive.close()
+
+    def _process_feed(self, feed, streamed_tables: List[str] = ()):
+        stages = [
+            ("append_distances", self._append_distances),
+            ("clean", lambda feed: self._clean(feed, streamed_tables)),
+            ("parse_times_and_dates", self._parse_times_and_dates),
+            ("build_service_days", self._build_service_days),
+            ("build_departure_index", self._build_departure_index),
+            ("build_headways", self._build_headways),
+            ("build_stop_patterns", self._build_stop_patterns),
+            ("remove_empty_attributes", self._remove_empty_attributes),
+            ("compact_tables", self._compact_tables),
+        ]
+        for name, stage in stages:
+            with self.profiler.stage(name) as record:
+                feed = stage(feed)
+                record["rows"] = feed_rows(feed)
         return feed
 
     def _append_distances(self, feed):
@@ -136,97 +379,95 @@ class GTFSLoader:
         return feed
 
     def _calculate_shape_distances(self, feed):
-        print("Calculating shape distances")
-
-        results = []
-        for _, group in feed.shapes.groupby("shape_id"):
-            result = self._calculate_single_shape(group, self.distance_unit)
-            results.append(result)
-
-        # Combine the results
-        feed.shapes = pd.concat(results)
-
+        print(f"Calculating shape distances ({self.distance_method})")
+        feed.shapes = cumulative_shape_distances(
+            feed.shapes, self.distance_unit, self.distance_method
+        )
         return feed
 
-    def _calculate_single_shape(self, group, distance_unit):
-        cumulative_distance = 0
-        previous_point = None
-
-        for idx, row in group.iterrows():
-            current_point = (row["shape_pt_lat"], row["shape_pt_lon"])
-
-            if previous_point is not None:
-                distance = geodesic(previous_point, current_point).meters
-                if distance_unit == "km":
-                    distance /= 1000
-                elif distance_unit == "miles":
-                    distance *= 0.000621371
-                cumulative_distance += distance
-
-            group.at[idx, "shape_dist_traveled"] = cumulative_distance
-            previous_point = current_point
-
-        return group
-
     def _calculate_stop_distances(self, feed):
         print("Calculating stop distances")
-        stops = feed.stops
-        shapes = feed.shapes.sort_values(["shape_id", "shape_pt_sequence"])
-        stops["geometry"] = stops.apply(
-            lambda row: Point(row["stop_lon"], row["stop_lat"]), axis=1
+        # One cache per build, so nothing is kept alive across agencies
+        cache = SnapCache.for_feed(feed.stop_times, feed.trips, feed.shapes)
+        feed.stop_times["shape_dist_traveled"] = snap_stop_times(
+            feed.stop_times, feed.stops, feed.trips, feed.shapes, cache=cache
         )
-        # Create a GeoDataFrame with stop locations
-        stops_gdf = feed.stop_times.merge(stops[["stop_id", "geometry"]], on="stop_id")
-        stops_gdf = stops_gdf.merge(feed.trips[["trip_id", "shape_id"]], on="trip_id")
-        # Group by shape_id and apply nearest_points function
-        grouped = stops_gdf.groupby("shape_id")
-        results = []
-        for shape_id, group in grouped:
-            shape_id = shape_id.strip()
-            shape_points = shapes[shapes.shape_id == shape_id]
-            shape_geometry = shape_points.apply(
-                lambda x: Point(x["shape_pt_lon"], x["shape_pt_lat"]), axis=1
-            )
-            result = nearest_points(group, shape_geometry)
-            result["shape_dist_traveled"] = shape_points.iloc[result["snap_start_id"]][
-                "shape_dist_traveled"
-            ].values
-            results.append(result)
-
-        # Combine results
-        stop_gdf = pd.concat(results)
-
-        # Update feed.stop_times with calculated shape_dist_traveled
-        feed.stop_times = feed.stop_times.merge(
-            stop_gdf[["trip_id", "stop_sequence", "shape_dist_traveled"]],
-            on=["trip_id", "stop_sequence"],
-            how="left",
-        )
-
+        print(cache.report())
+        cache.clear()
         return feed
 
-    def _parse_times_and_dates(self, feed):
-        vparse_time = np.vectorize(self.parse_time)
-        vparse_date = np.vectorize(self.parse_date)
+    def _clean(self, feed, streamed_tables: List[str] = ()):
+        # Feed.clean, except that streamed tables were cleaned chunk by chunk (see
+        # _compact_chunk); leaving them out also keeps them out of the copies
+        streamed = {name: getattr(feed, name) for name in streamed_tables}
+        for name in streamed:
+            setattr(feed, name, None)
+        feed = gk_cleaners.clean_ids(feed)
+        feed = gk_cleaners.clean_times(feed)
+        # Streaming leaves route short names as they are; routes is small, so it rejoins here
+        if "routes" in streamed:
+            feed.routes = streamed.pop("routes")
+        feed = gk_cleaners.clean_route_short_names(feed)
+        for name, table in streamed.items():
+            setattr(feed, name, table)
+        return gk_cleaners.drop_zombies(feed)
 
-        feed.stop_times[["departure_time", "arrival_time"]] = feed.stop_times[
-            ["departure_time", "arrival_time"]
-        ].apply(vparse_time)
+    def _parse_times_and_dates(self, feed):
+        for column in ["departure_time", "arrival_time"]:
+            feed.stop_times[column] = parse_times(feed.stop_times[column])
 
         if hasattr(feed, "timeframes"):
-            feed.timeframes[["start_time", "end_time"]] = feed.timeframes[
-                ["start_time", "end_time"]
-            ].apply(vparse_time)
+            for column in ["start_time", "end_time"]:
+                feed.timeframes[column] = parse_times(feed.timeframes[column])
 
         for attr in ["calendar", "calendar_dates", "feed_info"]:
             if hasattr(feed, attr) and isinstance(getattr(feed, attr), pd.DataFrame):
                 df = getattr(feed, attr)
-                date_columns = [col for col in df.columns if "date" in col.lower()]
-                df[date_columns] = df[date_columns].apply(vparse_date)
+                for column in [col for col in df.columns if "date" in col.lower()]:
+                    df[column] = parse_dates(df[column])
                 setattr(feed, attr, df)
 
         return feed
 
+    def _build_service_days(self, feed):
+        # Date x service_id bitmap, so queries never re-derive active services
+        service_days = build_service_days(feed)
+        if service_days is not None:
+            feed.service_days = service_days
+        return feed
+
+    def _build_departure_index(self, feed):
+        # Stop-sorted departures with per-stop offsets for next-departure lookups
+        stop_departures = build_stop_departures(feed)
+        if stop_departures is not None:
+            feed.stop_departures, feed.stop_departure_offsets = stop_departures
+        return feed
+
+    def _build_headways(self, feed):
+        # Trip counts and headways per route, direction, stop, service and hour
+        route_headways = build_route_headways(feed)
+        if route_headways is not None:
+            feed.route_headways = route_headways
+        return feed
+
+    def _build_stop_patterns(self, feed):
+        # Deduplicated stop patterns and their segments (stop_patterns, pattern_stops,
+        # trip_patterns and segments tables)
+        tables = build_stop_patterns(feed)
+        for name, table in (tables or {}).items():
+            setattr(feed, name, table)
+        return feed
+
+    def _compact_tables(self, feed, reported_tables: Optional[List[str]] = None):
+        # Categorical ids, int32 times and smaller sequences and shape coordinates.
+        # Compacting again after more tables were loaded only reports the new tables
+        report = compact_feed(feed)
+        if reported_tables is not None:
+            report = {name: report[name] for name in reported_tables if name in report}
+        if report:
+            print(f"Compacted feed tables ({self.gtfs}):\n{format_memory_report(report)}")
+        return feed
+
     def _remove_empty_attributes(self, feed):
         for attr in dir(feed):
             if not attr.startswith("_"):
@@ -243,39 +484,30 @@ class GTFSLoader:
         if not self.feed and not self.load_feed():
             return
 
-        for table in self.file_list:
-            table_name = table.split(".")[0]
-            if not hasattr(self.feed, table_name):
-                try:
-                    with self.zipfile.open(f"{table_name}.txt", "r") as f:
-                        df = pd.read_csv(f, encoding="utf-8")
-                        setattr(self.feed, table_name, df)
-                except Exception as e:
-                    print(f"Could not load {table_name} due to {e}")
+        archive = self._open_archive()
+        extra_tables = []
+        try:
+            with self.profiler.stage("read_extra_tables") as record:
+                for table_name in archive.tables:
+                    if not hasattr(self.feed, table_name) and archive.table_size(table_name):
+                        try:
+                            df, _ = read_table(archive, table_name)
+                            setattr(self.feed, table_name, df)
+                            extra_tables.append(table_name)
+                        except Exception as e:
+                            print(f"Could not load {table_name} due to {e}")
+                record["rows"] = feed_rows(self.feed)
+        finally:
+            self._close_archive()
+
+        with self.profiler.stage("compact_all_tables") as record:
+            self._compact_tables(self.feed, extra_tables)
+            record["rows"] = feed_rows(self.feed)
 
         print(f"Loaded all tables: {self.gtfs}")
-        if hasattr(self, "zipfile"):
-            del self.zipfile
 
-    @lru_cache(maxsize=2**18)
     def parse_time(self, val: Any) -> np.float32:
-        if isinstance(val, (float, np.float32)) or pd.isna(val):
-            return val
-        if not val:
-            return np.nan
-        try:
-            return np.float32(val)
-        except ValueError:
-            h, m, s = map(float, str(val).strip().split(":"))
-            return np.float32(h * 3600 + m * 60 + s)
+        return parse_times([val])[0]
 
-    @lru_cache(maxsize=2**18)
     def parse_date(self, val: str) -> datetime.date:
-        if isinstance(val, datetime.date):
-            return val
-        for date_format in [DATE_FORMAT, DATE_FORMAT_ALT]:
-            try:
-                return datetime.datetime.strptime(val, date_format).date()
-            except ValueError:
-                continue
-        raise ValueError(f"Unable to parse date: {val}")
+        return parse_dates([val])[0]
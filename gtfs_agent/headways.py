@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+from gtfs_agent.feed_view import derived_tables
+from gtfs_agent.service_calendar import active_service_ids
+from gtfs_agent.departure_index import build_stop_departures
+
+# Time periods of the service day, matching the peak/off-peak terminology of the system
+# prompt. Departures after midnight (24:00:00 and later) belong to the service day the
+# trip started on, so they get their own period rather than the next day's early_morning.
+TIME_PERIODS = [
+    ("early_morning", 0, 6),
+    ("am_peak", 6, 9),
+    ("midday", 9, 15),
+    ("pm_peak", 15, 19),
+    ("night", 19, 24),
+    ("after_midnight", 24, 30),
+]
+PERIOD_NAMES = [name for name, _, _ in TIME_PERIODS]
+PERIOD_HOURS = {name: end - start for name, start, end in TIME_PERIODS}
+HEADWAY_KEYS = ["route_id", "direction_id", "stop_id", "service_id", "hour"]
+HEADWAY_COLUMNS = HEADWAY_KEYS + [
+    "time_period",
+    "trips",
+    "first_departure",
+    "last_departure",
+    "headway_min",
+    "trips_per_hour",
+]
+
+
+def departure_hours(departure_times) -> np.ndarray:
+    """
+    The hour of the service day of departure times in seconds since midnight, 24 and
+    above for departures after midnight. -1 for missing times.
+    """
+    hours = np.floor(np.asarray(departure_times, dtype=np.float64) / 3600)
+    return np.where(np.isnan(hours), -1, hours).astype(np.int16)
+
+
+def classify_time_period(departure_times=None, hours=None) -> pd.Categorical:
+    """
+    Map departure times in seconds since midnight, or their service-day `hours`, to
+    their TIME_PERIODS name.
+    """
+    if hours is None:
+        hours = departure_hours(departure_times)
+    hours = np.asarray(hours)
+    edges = np.array([start for _, start, _ in TIME_PERIODS])
+    codes = np.searchsorted(edges, hours, side="right") - 1
+    codes[hours < 0] = -1
+    return pd.Categorical.from_codes(codes, categories=PERIOD_NAMES)
+
+
+def _add_headways(table: pd.DataFrame, period_hours) -> pd.DataFrame:
+    # Headway is the mean gap between consecutive departures; a single trip has none
+    gaps = table["trips"].astype(np.float64) - 1
+    span = (table["last_departure"] - table["first_departure"]).astype(np.float64)
+    table["headway_min"] = (span / gaps.where(gaps > 0) / 60).round(1)
+    table["trips_per_hour"] = (table["trips"] / period_hours).round(2)
+    return table
+
+
+def build_route_headways(feed) -> Optional[pd.DataFrame]:
+    """
+    Count the trips of every route, direction and stop per service_id and hour of the
+    service day.
+
+    Returns:
+        pd.DataFrame: One row per route_id, direction_id, stop_id, service_id and `hour`
+                      with its `time_period`, the number of `trips`, the
+                      `first_departure` and `last_departure` in seconds since midnight,
+                      the mean `headway_min` between consecutive departures (NaN for a
+                      single trip) and the `trips_per_hour`. None if the feed has no
+                      timed stop_times.
+    """
+    departures = getattr(feed, "stop_departures", None)
+    if not isinstance(departures, pd.DataFrame):
+        stop_departures = build_stop_departures(feed)
+        if stop_departures is None:
+            return None
+        departures = stop_departures[0]
+    if departures.empty:
+        return None
+
+    keys = [key for key in HEADWAY_KEYS if key in departures.columns or key == "hour"]
+    departures = departures.assign(hour=departure_hours(departures["departure_time"]))
+    table = (
+        departures.groupby(keys, observed=True, dropna=False, sort=True)["departure_time"]
+        .agg(trips="size", first_departure="min", last_departure="max")
+        .reset_index()
+    )
+    time_periods = classify_time_period(hours=table["hour"])
+    table.insert(table.columns.get_loc("hour") + 1, "time_period", time_periods)
+    table["trips"] = table["trips"].astype(np.int32)
+    return _add_headways(table, 1)
+
+
+def get_route_headways(feed) -> pd.DataFrame:
+    """
+    The headway table of a feed. Feeds processed before headways were part of the
+    build have it computed once, on first use.
+    """
+    tables = derived_tables(feed, ["route_headways"], build_route_headways)
+    if tables is None:
+        return pd.DataFrame(columns=HEADWAY_COLUMNS)
+    return tables["route_headways"]
+
+
+def route_headways(
+    feed,
+    route_id,
+    date=None,
+    direction_id=None,
+    stop_id=None,
+    time_period=None,
+    by_hour: bool = False,
+) -> pd.DataFrame:
+    """
+    Look up the trips and the headway of a route per time period or hour.
+
+    Args:
+        feed: The GTFS feed.
+        route_id: The route_id.
+        date (optional): Only count trips running on this date, combining all of its
+                         active service_ids. Without a date, rows are per service_id.
+        direction_id (optional): Only this direction.
+        stop_id (optional): The stop to count departures at. Defaults to the stop with
+                            the most departures of each direction, a stop every trip
+                            of the route serves in most feeds.
+        time_period (str, optional): One of "early_morning", "am_peak", "midday",
+                                     "pm_peak", "night" or "after_midnight".
+        by_hour (bool): One row per hour of the service day instead of per time period.
+
+    Returns:
+        pd.DataFrame: Rows per direction_id, stop_id, (service_id) and time_period (and
+                      hour) with `trips`, `first_departure`, `last_departure`, the mean
+                      `headway_min` between consecutive departures and `trips_per_hour`.
+    """
+    table = get_route_headways(feed)
+    table = table[table["route_id"].astype(str) == str(route_id)]
+    if direction_id is not None and "direction_id" in table.columns:
+        table = table[table["direction_id"] == int(direction_id)]
+    if time_period is not None:
+        table = table[table["time_period"] == time_period]
+    if date is not None:
+        table = table[table["service_id"].astype(str).isin(active_service_ids(feed, date))]
+
+    directions = ["direction_id"] if "direction_id" in table.columns else []
+    if stop_id is not None:
+        table = table[table["stop_id"].astype(str) == str(stop_id)]
+    elif not table.empty:
+        stop_trips = table.groupby(directions + ["stop_id"], observed=True)["trips"].sum()
+        busiest = stop_trips.reset_index().sort_values("trips", ascending=False, kind="stable")
+        if directions:
+            busiest = busiest.drop_duplicates(directions, keep="first")
+        else:
+            busiest = busiest.head(1)
+        table = table.merge(busiest[directions + ["stop_id"]], on=directions + ["stop_id"])
+
+    # Roll the hours up into time periods, and the services of a date into one row
+    keys = ["route_id"] + directions + ["stop_id"]
+    if date is None and "service_id" in table.columns:
+        keys.append("service_id")
+    keys += ["hour", "time_period"] if by_hour else ["time_period"]
+    table = (
+        table.groupby(keys, observed=True, sort=True)
+        .agg(
+            trips=("trips", "sum"),
+            first_departure=("first_departure", "min"),
+            last_departure=("last_departure", "max"),
+        )
+        .reset_index()
+    )
+    period_hours = 1 if by_hour else table["time_period"].map(PERIOD_HOURS).astype(np.float64)
+    table = _add_headways(table, period_hours)
+    return table.reset_index(drop=True)
@@ -0,0 +1,156 @@
+import datetime
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+from gtfs_agent.feed_view import derived_tables
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+# exception_type values in calendar_dates.txt
+SERVICE_ADDED = 1
+SERVICE_REMOVED = 2
+
+
+def to_date(value) -> datetime.date:
+    """
+    Coerce a date given as a datetime.date, datetime, pandas Timestamp, numpy datetime64
+    or a "YYYYMMDD"/"YYYY-MM-DD" string or integer to a datetime.date.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, (int, np.integer)):
+        value = str(value)
+    return pd.Timestamp(value).date()
+
+
+def _table(feed, name: str) -> Optional[pd.DataFrame]:
+    df = getattr(feed, name, None)
+    if isinstance(df, pd.DataFrame) and not df.empty:
+        return df
+    return None
+
+
+def build_service_days(feed) -> Optional[pd.DataFrame]:
+    """
+    Expand calendar.txt and calendar_dates.txt into a date x service_id bitmap covering
+    the feed's full validity range.
+
+    Returns:
+        pd.DataFrame: Indexed by `date` (datetime.date) with one boolean column per
+                      service_id, True on the dates the service runs. None if the feed
+                      has no service calendar.
+    """
+    calendar = _table(feed, "calendar")
+    calendar_dates = _table(feed, "calendar_dates")
+    if calendar is None and calendar_dates is None:
+        return None
+
+    bounds = []
+    service_ids = []
+    if calendar is not None:
+        starts = pd.to_datetime(calendar["start_date"]).to_numpy()
+        ends = pd.to_datetime(calendar["end_date"]).to_numpy()
+        bounds += [starts.min(), ends.max()]
+        service_ids.append(calendar["service_id"])
+    if calendar_dates is not None:
+        exception_dates = pd.to_datetime(calendar_dates["date"])
+        bounds += [exception_dates.min(), exception_dates.max()]
+        service_ids.append(calendar_dates["service_id"])
+    bounds = pd.Series(bounds).dropna()
+    if bounds.empty:
+        return None
+
+    dates = pd.date_range(bounds.min(), bounds.max(), freq="D")
+    columns = pd.Index(pd.unique(pd.concat(service_ids, ignore_index=True).dropna()))
+    columns = columns.sort_values()
+    bitmap = np.zeros((len(dates), len(columns)), dtype=bool)
+
+    if calendar is not None:
+        weekdays = calendar[WEEKDAYS].apply(pd.to_numeric, errors="coerce").fillna(0)
+        weekdays = weekdays.to_numpy() > 0
+        day_values = dates.to_numpy()[:, None]
+        runs = weekdays[:, dates.weekday].T & (day_values >= starts) & (day_values <= ends)
+        # A service_id listed on several calendar rows runs on the union of their days
+        positions = columns.get_indexer(calendar["service_id"])
+        valid = positions >= 0
+        np.logical_or.at(bitmap, (slice(None), positions[valid]), runs[:, valid])
+
+    if calendar_dates is not None:
+        rows = dates.get_indexer(exception_dates)
+        positions = columns.get_indexer(calendar_dates["service_id"])
+        exception_types = pd.to_numeric(calendar_dates["exception_type"], errors="coerce")
+        exception_types = exception_types.to_numpy()
+        valid = (rows >= 0) & (positions >= 0)
+        added = valid & (exception_types == SERVICE_ADDED)
+        removed = valid & (exception_types == SERVICE_REMOVED)
+        bitmap[rows[added], positions[added]] = True
+        bitmap[rows[removed], positions[removed]] = False
+
+    return pd.DataFrame(
+        bitmap,
+        index=pd.Index(dates.date, name="date"),
+        columns=pd.Index(columns.astype(str), name="service_id"),
+    )
+
+
+def get_service_days(feed) -> pd.DataFrame:
+    """
+    The service-day bitmap of a feed. Feeds processed before the bitmap was part of
+    the build have it computed once, on first use.
+    """
+    tables = derived_tables(feed, ["service_days"], build_service_days)
+    if tables is None:
+        return pd.DataFrame(index=pd.Index([], name="date"), dtype=bool)
+    return tables["service_days"]
+
+
+def active_service_ids(feed, date) -> List[str]:
+    """
+    Find the service_ids running on a date, including calendar_dates exceptions.
+
+    Args:
+        feed: The GTFS feed.
+        date: The date, as a datetime.date, datetime, Timestamp or "YYYYMMDD" string.
+
+    Returns:
+        list: The active service_ids. Empty for dates outside the feed's validity range.
+    """
+    service_days = get_service_days(feed)
+    try:
+        row = service_days.index.get_loc(to_date(date))
+    except KeyError:
+        return []
+    return service_days.columns[service_days.iloc[row].to_numpy(dtype=bool)].tolist()
+
+
+def active_trips(feed, date) -> pd.DataFrame:
+    """
+    Find the trips running on a date.
+
+    Args:
+        feed: The GTFS feed.
+        date: The date, as a datetime.date, datetime, Timestamp or "YYYYMMDD" string.
+
+    Returns:
+        pd.DataFrame: The rows of feed.trips whose service runs on the date.
+    """
+    return feed.trips[feed.trips["service_id"].astype(str).isin(active_service_ids(feed, date))]
+
+
+def service_dates(feed, service_id) -> List[datetime.date]:
+    """
+    Find all dates on which a service_id runs.
+
+    Args:
+        feed: The GTFS feed.
+        service_id: The service_id to look up.
+
+    Returns:
+        list: The sorted datetime.date objects on which the service runs.
+    """
+    service_days = get_service_days(feed)
+    service_id = str(service_id)
+    if service_id not in service_days.columns:
+        return []
+    return service_days.index[service_days[service_id].to_numpy(dtype=bool)].tolist()
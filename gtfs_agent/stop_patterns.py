@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+from gtfs_agent.feed_view import derived_tables
+
+# Trip attributes that, together with the ordered stops, identify a stop pattern
+PATTERN_TRIP_COLUMNS = ["route_id", "direction_id", "shape_id"]
+# Separates the stop_ids of a pattern signature
+STOP_SEPARATOR = "\x1f"
+
+
+def _trip_signatures(stop_times: pd.DataFrame, trips: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per trip with its pattern attributes, ordered stops and pattern number.
+    `stop_times` must be sorted by trip and stop_sequence.
+    """
+    trip_columns = [column for column in PATTERN_TRIP_COLUMNS if column in trips.columns]
+    signatures = (
+        stop_times.groupby("trip_id", sort=False)["stop_id"]
+        .agg(lambda stop_ids: STOP_SEPARATOR.join(map(str, stop_ids)))
+        .rename("stop_ids")
+        .reset_index()
+        .merge(trips[["trip_id"] + trip_columns], on="trip_id", how="left")
+    )
+    key = signatures["stop_ids"]
+    for column in trip_columns:
+        key = key + "\x1e" + signatures[column].astype(str)
+    signatures["pattern"] = pd.factorize(key)[0]
+    return signatures
+
+
+def _number_patterns(signatures: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per pattern, with pattern_ids numbered per route by descending trip count.
+    """
+    columns = [column for column in PATTERN_TRIP_COLUMNS if column in signatures.columns]
+    patterns = signatures.groupby("pattern", sort=True).agg(
+        **{column: (column, "first") for column in columns + ["stop_ids"]},
+        trips=("trip_id", "size"),
+    )
+    routes = patterns["route_id"].astype(str) if "route_id" in patterns else ""
+    ranked = patterns.assign(route=routes).sort_values(
+        ["route", "trips"], ascending=[True, False], kind="stable"
+    )
+    rank = ranked.groupby("route", sort=False).cumcount() + 1
+    patterns["pattern_id"] = ranked["route"] + ":" + rank.astype(str)
+    patterns["num_stops"] = patterns["stop_ids"].str.count(STOP_SEPARATOR) + 1
+    return patterns
+
+
+def _segment_rows(stop_times: pd.DataFrame, trip_pattern: np.ndarray) -> pd.DataFrame:
+    """
+    One row per pair of consecutive stops of a trip. `trip_pattern` holds the pattern
+    number of each stop_times row.
+    """
+    trip_ids = stop_times["trip_id"].to_numpy()
+    starts = np.flatnonzero(trip_ids[1:] == trip_ids[:-1])
+    ends = starts + 1
+    stop_ids = stop_times["stop_id"].to_numpy()
+    arrivals = stop_times["arrival_time"].to_numpy(dtype=np.float64)
+    departures = stop_times["departure_time"].to_numpy(dtype=np.float64)
+    if "shape_dist_traveled" in stop_times.columns:
+        distances = stop_times["shape_dist_traveled"].to_numpy(dtype=np.float64)
+    else:
+        distances = np.full(len(stop_times), np.nan)
+    positions = stop_times.groupby("trip_id", sort=False).cumcount().to_numpy()
+    return pd.DataFrame(
+        {
+            "pattern": trip_pattern[starts],
+            "segment_index": positions[starts],
+            "from_stop_id": stop_ids[starts],
+            "to_stop_id": stop_ids[ends],
+            "distance": distances[ends] - distances[starts],
+            "run_time": arrivals[ends] - departures[starts],
+            "dwell_time": departures[ends] - arrivals[ends],
+        }
+    )
+
+
+def build_stop_patterns(feed) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Deduplicate the trips of a feed into stop patterns and summarize their segments.
+
+    Trips of the same route, direction and shape that serve the same stops in the same
+    order share a pattern. Patterns are numbered per route by descending trip count,
+    so `<route_id>:1` is the route's main pattern.
+
+    Returns:
+        dict: Tables keyed by feed attribute name, or None if the feed has no
+              stop_times or trips:
+              - stop_patterns: pattern_id, route_id, direction_id, shape_id,
+                num_stops and trips per pattern.
+              - pattern_stops: the ordered stops (stop_index, stop_id) of each pattern.
+              - trip_patterns: the pattern_id of each trip_id.
+              - segments: one row per pair of consecutive stops of a pattern with the
+                mean `distance` (from shape_dist_traveled, in feed distance units), the
+                mean, min and max scheduled `run_time` in seconds, the mean
+                `dwell_time` at the to-stop and the `trips` running it.
+    """
+    stop_times = getattr(feed, "stop_times", None)
+    trips = getattr(feed, "trips", None)
+    if not isinstance(stop_times, pd.DataFrame) or not isinstance(trips, pd.DataFrame):
+        return None
+    if stop_times.empty or trips.empty:
+        return None
+
+    columns = ["trip_id", "stop_sequence", "stop_id", "arrival_time", "departure_time"]
+    if "shape_dist_traveled" in stop_times.columns:
+        columns.append("shape_dist_traveled")
+    stop_times = stop_times[columns].sort_values(["trip_id", "stop_sequence"], kind="stable")
+    stop_times = stop_times.reset_index(drop=True)
+
+    signatures = _trip_signatures(stop_times, trips)
+    patterns = _number_patterns(signatures)
+    pattern_ids = patterns["pattern_id"].to_numpy()
+    trip_patterns = pd.DataFrame(
+        {
+            "trip_id": signatures["trip_id"],
+            "pattern_id": pattern_ids[signatures["pattern"].to_numpy()],
+        }
+    )
+
+    # The first trip of each pattern provides its ordered stops
+    first_trips = signatures.drop_duplicates("pattern")[["trip_id", "pattern"]]
+    pattern_stops = stop_times[["trip_id", "stop_id"]].merge(first_trips, on="trip_id")
+    pattern_stops["stop_index"] = pattern_stops.groupby("trip_id", sort=False).cumcount()
+    pattern_stops["pattern_id"] = pattern_ids[pattern_stops["pattern"].to_numpy()]
+    pattern_stops = pattern_stops.sort_values(["pattern_id", "stop_index"], kind="stable")
+    pattern_stops = pattern_stops[["pattern_id", "stop_index", "stop_id"]]
+
+    row_patterns = stop_times["trip_id"].map(
+        pd.Series(signatures["pattern"].to_numpy(), index=signatures["trip_id"])
+    )
+    segments = (
+        _segment_rows(stop_times, row_patterns.to_numpy())
+        .groupby(["pattern", "segment_index"], sort=True)
+        .agg(
+            from_stop_id=("from_stop_id", "first"),
+            to_stop_id=("to_stop_id", "first"),
+            distance=("distance", "mean"),
+            run_time=("run_time", "mean"),
+            min_run_time=("run_time", "min"),
+            max_run_time=("run_time", "max"),
+            dwell_time=("dwell_time", "mean"),
+            trips=("run_time", "size"),
+        )
+        .reset_index()
+    )
+    segments["trips"] = segments["trips"].astype(np.int32)
+    pattern_columns = [c for c in ["route_id", "direction_id"] if c in patterns.columns]
+    segments = patterns[["pattern_id"] + pattern_columns].join(segments.set_index("pattern"))
+    # Patterns serving a single stop have no segments
+    segments = segments.dropna(subset=["segment_index"]).astype({"segment_index": np.int64})
+    segments = segments.sort_values(["pattern_id", "segment_index"], kind="stable")
+
+    stop_patterns = patterns[
+        ["pattern_id"]
+        + [column for column in PATTERN_TRIP_COLUMNS if column in patterns.columns]
+        + ["num_stops", "trips"]
+    ]
+    return {
+        "stop_patterns": stop_patterns.sort_values("pattern_id").reset_index(drop=True),
+        "pattern_stops": pattern_stops.reset_index(drop=True),
+        "trip_patterns": trip_patterns,
+        "segments": segments.reset_index(drop=True),
+    }
+
+
+def get_stop_patterns(feed) -> Dict[str, pd.DataFrame]:
+    """
+    The pattern tables of a feed (see build_stop_patterns). Feeds processed before
+    patterns were part of the build have them computed once, on first use.
+    """
+    names = ["stop_patterns", "pattern_stops", "trip_patterns", "segments"]
+    return derived_tables(feed, names, build_stop_patterns)
+
+
+def route_stops(feed, route_id, direction_id=None, all_patterns: bool = False) -> pd.DataFrame:
+    """
+    Find the ordered stops of a route.
+
+    Args:
+        feed: The GTFS feed.
+        route_id: The route_id.
+        direction_id (optional): Only this direction.
+        all_patterns (bool, optional): Return the stops of every pattern of the route
+                                       instead of only the main pattern (most trips)
+                                       of each direction.
+
+    Returns:
+        pd.DataFrame: One row per pattern and stop with pattern_id, direction_id,
+                      stop_index (0-based position on the pattern), stop_id and the
+                      stop's name and coordinates.
+    """
+    tables = get_stop_patterns(feed)
+    patterns = tables["stop_patterns"]
+    patterns = patterns[patterns["route_id"].astype(str) == str(route_id)]
+    directions = ["direction_id"] if "direction_id" in patterns.columns else []
+    if direction_id is not None and directions:
+        patterns = patterns[patterns["direction_id"] == int(direction_id)]
+    if not all_patterns:
+        patterns = patterns.sort_values("trips", ascending=False, kind="stable")
+        patterns = patterns.drop_duplicates(directions) if directions else patterns.head(1)
+
+    stops = tables["pattern_stops"].merge(patterns[["pattern_id"] + directions], on="pattern_id")
+    stop_columns = [c for c in ["stop_id", "stop_name", "stop_lat", "stop_lon"] if c in feed.stops]
+    stops = stops.merge(feed.stops[stop_columns], on="stop_id", how="left")
+    stops = stops.sort_values(["pattern_id", "stop_index"], kind="stable")
+    return stops[["pattern_id"] + directions + ["stop_index"] + stop_columns].reset_index(drop=True)
+
+
+def scheduled_travel_time(feed, from_stop_id, to_stop_id, route_id=None) -> pd.DataFrame:
+    """
+    Find the scheduled travel time between two stops on every pattern serving them in
+    that order.
+
+    Args:
+        feed: The GTFS feed.
+        from_stop_id: The stop_id to depart from.
+        to_stop_id: The stop_id to arrive at.
+        route_id (optional): Only patterns of this route.
+
+    Returns:
+        pd.DataFrame: One row per pattern with pattern_id, route_id, direction_id, the
+                      number of `stops` travelled, the `travel_time` in seconds
+                      (including dwell at intermediate stops), the `distance` in feed
+                      distance units and the pattern's `trips`, sorted by trips.
+    """
+    tables = get_stop_patterns(feed)
+    pattern_stops = tables["pattern_stops"]
+    from_stops = pattern_stops[pattern_stops["stop_id"].astype(str) == str(from_stop_id)]
+    to_stops = pattern_stops[pattern_stops["stop_id"].astype(str) == str(to_stop_id)]
+    pairs = from_stops.merge(to_stops, on="pattern_id", suffixes=("_from", "_to"))
+    pairs = pairs[pairs["stop_index_to"] > pairs["stop_index_from"]]
+    # A stop visited twice (loops) pairs with its nearest following visit
+    pairs = pairs.sort_values("stop_index_to").drop_duplicates(["pattern_id", "stop_index_from"])
+
+    patterns = tables["stop_patterns"]
+    if route_id is not None:
+        patterns = patterns[patterns["route_id"].astype(str) == str(route_id)]
+    pairs = pairs.merge(patterns, on="pattern_id")
+    segments = tables["segments"].merge(
+        pairs[["pattern_id", "stop_index_from", "stop_index_to"]], on="pattern_id"
+    )
+    # Segment i runs from stop i to stop i + 1
+    segments = segments[
+        (segments["segment_index"] >= segments["stop_index_from"])
+        & (segments["segment_index"] < segments["stop_index_to"])
+    ]
+    intermediate = segments["segment_index"] < segments["stop_index_to"] - 1
+    segments = segments.assign(
+        time=segments["run_time"] + segments["dwell_time"].where(intermediate, 0)
+    )
+    totals = (
+        segments.groupby(["pattern_id", "stop_index_from"], sort=False)[["time", "distance"]]
+        .sum(min_count=1)
+        .rename(columns={"time": "travel_time"})
+        .reset_index()
+    )
+    pattern_columns = [c for c in ["route_id", "direction_id"] if c in pairs.columns]
+    result = pairs.merge(totals, on=["pattern_id", "stop_index_from"])
+    result["stops"] = result["stop_index_to"] - result["stop_index_from"]
+    result = result.sort_values("trips", ascending=False, kind="stable")
+    columns = ["pattern_id"] + pattern_columns + ["stops", "travel_time", "distance", "trips"]
+    return result[columns].reset_index(drop=True)
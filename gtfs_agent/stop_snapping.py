@@ -0,0 +1,266 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Optional
+from scipy.spatial import cKDTree
+from gtfs_agent.bounded_cache import BoundedLRUCache
+
+GEO_CONST = 6371000 * np.pi / 180
+
+# Sentinel distinguishing a cache miss from a cached snapping failure (None)
+_MISSING = object()
+
+
+def _digest(*parts) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+class SnapCache:
+    """
+    Bounded cache for stop snapping during one feed build.
+
+    KD-trees are cached per shape_id and snapped point indices per stop pattern, keyed
+    on the shape_id plus a compact digest of the stop_id sequence. Every trip is looked
+    up, so trips sharing a pattern are hits and only new patterns are snapped. Keys do
+    not cover coordinates, so a cache must not be reused across feeds; see for_feed.
+    """
+
+    def __init__(
+        self,
+        max_patterns: int = 200_000,
+        max_pattern_bytes: int = 128 * 1024**2,
+        max_trees: int = 5_000,
+        max_tree_bytes: int = 512 * 1024**2,
+    ):
+        self.patterns = BoundedLRUCache(max_patterns, max_pattern_bytes)
+        # A cKDTree keeps its data, an index array and the node structure
+        self.trees = BoundedLRUCache(
+            max_trees, max_tree_bytes, sizeof=lambda tree: tree.data.nbytes * 3
+        )
+
+    @classmethod
+    def for_feed(cls, stop_times: pd.DataFrame, trips: pd.DataFrame, shapes: pd.DataFrame):
+        """
+        A cache bounded by what one feed can fill: a pattern per trip and a tree per
+        shape, within the default byte limits.
+        """
+        return cls(
+            max_patterns=max(len(trips), 1),
+            max_pattern_bytes=min(128 * 1024**2, max(len(stop_times), 1) * 8),
+            max_trees=max(shapes["shape_id"].nunique(), 1),
+            max_tree_bytes=min(512 * 1024**2, max(len(shapes), 1) * 48),
+        )
+
+    @staticmethod
+    def pattern_key(shape_id: str, stop_digest: str, k_neighbors: int) -> tuple:
+        return (shape_id, stop_digest, k_neighbors)
+
+    def get_tree(self, shape_id: str, shape_coords: np.ndarray) -> cKDTree:
+        tree = self.trees.get(shape_id)
+        if tree is None:
+            tree = cKDTree(shape_coords)
+            self.trees.put(shape_id, tree)
+        return tree
+
+    def snap(self, shape_id: str, shape_coords: np.ndarray, stop_coords, k_neighbors: int = 3):
+        tree = self.get_tree(shape_id, shape_coords)
+        points = process_stop_sequence(stop_coords, tree, k_neighbors)
+        if points is not None:
+            points = np.asarray(points, dtype=np.int64)
+        return points
+
+    def reset_stats(self):
+        self.patterns.reset_stats()
+        self.trees.reset_stats()
+
+    def clear(self):
+        self.patterns.clear()
+        self.trees.clear()
+
+    def report(self) -> str:
+        pattern_stats = self.patterns.stats()
+        tree_stats = self.trees.stats()
+        return (
+            f"Snap cache patterns: {pattern_stats['hits']} hits, {pattern_stats['misses']} misses "
+            f"({pattern_stats['hit_rate']:.1%}), {pattern_stats['evictions']} evictions, "
+            f"{pattern_stats['items']} cached ({pattern_stats['bytes'] / 1024**2:.1f} MB) | "
+            f"KD-trees: {tree_stats['hits']} hits, {tree_stats['misses']} misses, "
+            f"{tree_stats['evictions']} evictions, {tree_stats['items']} cached "
+            f"({tree_stats['bytes'] / 1024**2:.1f} MB)"
+        )
+
+
+def process_stop_sequence(stops: np.ndarray, tree: cKDTree, k_neighbors: int = 3):
+    """
+    Snap an ordered sequence of stop coordinates onto a shape.
+
+    Returns the index of the snapped shape point for every stop, moving monotonically
+    along the shape, or None if no monotonic assignment could be found.
+    """
+    if len(stops) <= 1:
+        return None
+
+    neighbors = k_neighbors
+    while True:
+        np_dist, np_inds = tree.query(stops, workers=-1, k=neighbors)
+        np_dist = np_dist * GEO_CONST
+        prev_point = min(np_inds[0])
+        points = [prev_point]
+
+        for i, nps in enumerate(np_inds[1:]):
+            condition = (nps > prev_point) & (nps < max(np_inds[i + 1]))
+            points_valid = nps[condition]
+            if len(points_valid) > 0:
+                points_score = (np.power(points_valid - prev_point, 3)) * np.power(
+                    np_dist[i + 1, condition], 1
+                )
+                prev_point = nps[condition][np.argmin(points_score)]
+                points.append(prev_point)
+            else:
+                if neighbors < len(stops):
+                    neighbors = min(neighbors + 2, len(stops))
+                    break
+                else:
+                    return None
+
+        if len(points) == len(stops):
+            return points
+
+
+def build_trip_patterns(stop_times: pd.DataFrame, trips: pd.DataFrame) -> pd.DataFrame:
+    """
+    Group trips by their (shape_id, ordered stop_id sequence) signature.
+
+    Returns:
+        pd.DataFrame: One row per trip with `trip_id`, `shape_id`, `stop_ids`
+                      (tuple of stop ids in stop_sequence order), `stop_digest` (digest
+                      of the stop_ids) and `pattern_id`.
+    """
+    ordered = stop_times[["trip_id", "stop_sequence", "stop_id"]].sort_values(
+        ["trip_id", "stop_sequence"], kind="stable"
+    )
+    trip_patterns = (
+        ordered.groupby("trip_id", sort=False)["stop_id"].agg(tuple).rename("stop_ids").reset_index()
+    )
+    trip_shapes = trips.drop_duplicates("trip_id").set_index("trip_id")["shape_id"]
+    trip_patterns["shape_id"] = trip_patterns["trip_id"].map(trip_shapes)
+    trip_patterns["stop_digest"] = [
+        _digest("\x1e".join(map(str, stop_ids))) for stop_ids in trip_patterns["stop_ids"]
+    ]
+    signatures = pd.Series(
+        list(zip(trip_patterns["shape_id"], trip_patterns["stop_digest"])),
+        index=trip_patterns.index,
+    )
+    trip_patterns["pattern_id"] = pd.factorize(signatures)[0]
+    return trip_patterns[["trip_id", "shape_id", "stop_ids", "stop_digest", "pattern_id"]]
+
+
+def snap_stop_times(
+    stop_times: pd.DataFrame,
+    stops: pd.DataFrame,
+    trips: pd.DataFrame,
+    shapes: pd.DataFrame,
+    k_neighbors: int = 3,
+    cache: Optional[SnapCache] = None,
+) -> pd.Series:
+    """
+    Compute `shape_dist_traveled` for every stop time by snapping stops onto trip shapes.
+
+    Every trip is looked up in a bounded `SnapCache` by its shape_id and stop sequence
+    digest, so each unique stop pattern is snapped once, against a single KD-tree per
+    shape. The snapped distances are then written back to every trip of the pattern
+    with one vectorized merge.
+
+    Args:
+        stop_times (pd.DataFrame): GTFS stop_times table.
+        stops (pd.DataFrame): GTFS stops table with `stop_lat` and `stop_lon`.
+        trips (pd.DataFrame): GTFS trips table with `shape_id`.
+        shapes (pd.DataFrame): GTFS shapes table with `shape_dist_traveled`.
+        k_neighbors (int): Initial number of nearest shape points considered per stop.
+        cache (SnapCache, optional): Cache of this feed build. Defaults to a new cache
+                                     sized for the feed (see SnapCache.for_feed).
+
+    Returns:
+        pd.Series: `shape_dist_traveled` aligned to `stop_times.index`. Trips that
+                   could not be snapped are left as NaN.
+    """
+    if cache is None:
+        cache = SnapCache.for_feed(stop_times, trips, shapes)
+    trip_patterns = build_trip_patterns(stop_times, trips)
+
+    stop_coords = (
+        stops.drop_duplicates("stop_id").set_index("stop_id")[["stop_lon", "stop_lat"]]
+    )
+    shapes = shapes.sort_values(["shape_id", "shape_pt_sequence"], kind="stable")
+    shape_groups = {
+        str(shape_id).strip(): group
+        for shape_id, group in shapes.groupby("shape_id", sort=False)
+    }
+
+    snapped_patterns = []
+    snapped_positions = []
+    snapped_distances = []
+    seen_patterns = set()
+    failed_patterns = set()
+    for trip in trip_patterns.itertuples(index=False):
+        shape_id = None if pd.isna(trip.shape_id) else str(trip.shape_id).strip()
+        shape_points = shape_groups.get(shape_id)
+        key = cache.pattern_key(shape_id, trip.stop_digest, k_neighbors)
+        points = cache.patterns.get(key, _MISSING)
+        if points is _MISSING:
+            points = None
+            coords = stop_coords.reindex(trip.stop_ids).to_numpy(dtype=np.float64)
+            if shape_points is not None and not np.isnan(coords).any():
+                shape_coords = shape_points[["shape_pt_lon", "shape_pt_lat"]].to_numpy(
+                    dtype=np.float64
+                )
+                points = cache.snap(shape_id, shape_coords, coords, k_neighbors)
+            cache.patterns.put(key, points)
+
+        if trip.pattern_id in seen_patterns:
+            continue
+        seen_patterns.add(trip.pattern_id)
+        if points is None:
+            failed_patterns.add(trip.pattern_id)
+            continue
+
+        snapped_patterns.append(np.full(len(points), trip.pattern_id))
+        snapped_positions.append(np.arange(len(points)))
+        snapped_distances.append(
+            shape_points["shape_dist_traveled"].to_numpy()[points]
+        )
+
+    if failed_patterns:
+        defective_trips = trip_patterns["pattern_id"].isin(failed_patterns).sum()
+        percent_defective = (defective_trips / len(trip_patterns)) * 100
+        print(f"Total defective trips: {defective_trips}")
+        print(f"Percentage defective trips: {percent_defective:.2f}%")
+
+    pattern_distances = pd.DataFrame(
+        {
+            "pattern_id": np.concatenate(snapped_patterns) if snapped_patterns else [],
+            "position": np.concatenate(snapped_positions) if snapped_positions else [],
+            "shape_dist_traveled": (
+                np.concatenate(snapped_distances) if snapped_distances else []
+            ),
+        }
+    ).astype({"pattern_id": np.int64, "position": np.int64, "shape_dist_traveled": np.float64})
+
+    ordered = stop_times[["trip_id", "stop_sequence"]].sort_values(
+        ["trip_id", "stop_sequence"], kind="stable"
+    )
+    ordered["pattern_id"] = ordered["trip_id"].map(
+        trip_patterns.set_index("trip_id")["pattern_id"]
+    )
+    ordered["position"] = ordered.groupby("trip_id", sort=False).cumcount()
+    merged = ordered[["pattern_id", "position"]].merge(
+        pattern_distances, on=["pattern_id", "position"], how="left"
+    )
+    distances = pd.Series(
+        merged["shape_dist_traveled"].to_numpy(), index=ordered.index, name="shape_dist_traveled"
+    )
+    return distances.reindex(stop_times.index)
@@ -0,0 +1,69 @@
+import os
+import struct
+import zipfile
+import pyarrow as pa
+from typing import Dict, List
+
+# Fixed part of a zip local file header: signature, versions, flags, sizes and the
+# lengths of the file name and extra field that precede the member's data
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+LOCAL_HEADER_SIGNATURE = 0x04034B50
+
+
+class GTFSZip:
+    """
+    A GTFS zip archive opened once for the whole feed build.
+
+    The members are inventoried with their sizes up front. Stored (uncompressed)
+    members are read as zero-copy slices of a memory map of the archive; compressed
+    members are decompressed as they are read, once per table.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.archive = zipfile.ZipFile(path)
+        self.file_list: List[str] = self.archive.namelist()
+        # GTFS tables are the .txt files at the top level of the archive
+        self.tables: Dict[str, zipfile.ZipInfo] = {}
+        for info in self.archive.infolist():
+            table_name, extension = os.path.splitext(info.filename)
+            if extension == ".txt" and "/" not in table_name and not info.is_dir():
+                self.tables[table_name] = info
+        self._mmap = None
+
+    def table_size(self, table_name: str) -> int:
+        """
+        Uncompressed size of a table in bytes.
+        """
+        return self.tables[table_name].file_size
+
+    def is_memory_mapped(self, table_name: str) -> bool:
+        info = self.tables[table_name]
+        # Encrypted members cannot be read from their raw bytes
+        return info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1
+
+    def _data_offset(self, info: zipfile.ZipInfo) -> int:
+        # The local header's extra field may differ from the central directory's
+        header = LOCAL_HEADER.unpack(self._mmap.read_at(LOCAL_HEADER.size, info.header_offset))
+        if header[0] != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+        name_length, extra_length = header[-2:]
+        return info.header_offset + LOCAL_HEADER.size + name_length + extra_length
+
+    def open(self, table_name: str):
+        """
+        Open a table for reading as a binary file object.
+        """
+        info = self.tables[table_name]
+        if not self.is_memory_mapped(table_name):
+            return self.archive.open(info)
+        if self._mmap is None:
+            self._mmap = pa.memory_map(self.path, "r")
+        buffer = self._mmap.read_at(info.file_size, self._data_offset(info))
+        return pa.BufferReader(buffer)
+
+    def close(self):
+        self.archive.close()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
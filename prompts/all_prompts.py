@@ -146,6 +146,10 @@ Remember that the code will be executed with a timeout of {TIMEOUT_SECONDS} seco
 - All times are reported in the local time zone of the transit agency which is stored in `agency_timezone` field in `agency.txt`.
 - For obtaining current time, use `pytz.timezone()` to create timezone object and convert `datetime.now()` to feed timezone using `astimezone()` method.
 - The date fields are already converted to `datetime.date` objects in the feed.
+- In `feed.stop_times`, `feed.stop_departures` and `feed.route_headways` the id columns (`trip_id`, `stop_id`, ...) are pandas categoricals of the ids in that table; in all other tables ids are strings. They compare, filter and merge like strings, but on these tables:
+  - `value_counts()` also lists ids that are not in the filtered rows, with a count of 0; drop them with `.loc[lambda s: s > 0]` or count on `.astype(str)`.
+  - Assigning a new id (e.g. `df.loc[0, "stop_id"] = "new"`) or concatenating ids (e.g. `df["trip_id"] + "_x"`) raises a TypeError; convert the column with `.astype(str)` first.
+  - Pass `observed=True` to `groupby` on id columns so only the ids present in the rows are grouped.
 - Favor using pandas and numpy operations to arrive at the solution over complex geospatial operations.
 
 ### Name Pattern Matching
@@ -173,6 +177,20 @@ Input: find_route(feed, "Blue Line", threshold=85)
 Output: pandas Series with index ['route_id', 'route_short_name', 'route_long_name', 'route_type']
 </example>
 </function>
+<function>
+<function_name>resolve_routes</function_name>
+<function_description>Resolve many route mentions to route IDs in one call. Use this instead of calling find_route in a loop.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object containing route information
+- search_terms (list[str]): The terms to search for in route information
+- threshold (int, optional): The minimum similarity score for a match, default is 80
+</function_args>
+<return>A dict mapping each search term to its route_id, or None if no match is found</return>
+<example>
+Input: resolve_routes(feed, ["Blue Line", "Route 5", "22"])
+Output: {"Blue Line": "BLUE", "Route 5": "5", "22": "22"}
+</example>
+</function>
 
 
 #### Stop Matching
@@ -270,6 +288,23 @@ Output: DataFrame containing columns ['stop_id', 'stop_name', 'stop_lat', 'stop_
 </example>
 </function>
 
+<function>
+<function_name>find_nearby_stops_batch</function_name>
+<function_description>Find nearby stops for many coordinates at once. Use this instead of calling find_nearby_stops in a loop.</function_description>
+<function_args>
+- lats (array-like): Latitudes of the reference points
+- lons (array-like): Longitudes of the reference points
+- stops_df (pandas.DataFrame): DataFrame containing stop information
+- max_distance (float, optional): Maximum distance in meters to search for stops, default is 200
+- max_stops (int, optional): Number of nearest stops returned for a point with no stop within max_distance, default is 5
+</function_args>
+<return>pandas.DataFrame: Nearby stops of all points with a 'query_index' column (position of the point in lats/lons) and a 'distance' column in meters</return>
+<example>
+Input: find_nearby_stops_batch(rail_stops['stop_lat'], rail_stops['stop_lon'], feed.stops, max_distance=300)
+Output: DataFrame containing columns ['query_index', 'stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'distance']
+</example>
+</function>
+
 <function>
 <function_name>get_geo_location</function_name>
 <function_description>Convert an address to geographic coordinates using Google Maps API or Nominatim.</function_description>
@@ -285,12 +320,44 @@ Input: get_geo_location("1600 Pennsylvania Avenue NW, Washington, DC 20500")
 Output: ((38.8977, -77.0365), "1600 Pennsylvania Avenue NW, Washington, DC 20500, USA")
 </example>
 </function>
+
+<function>
+<function_name>geocode_batch</function_name>
+<function_description>Convert many addresses to geographic coordinates at once. Use this instead of calling get_geo_location in a loop.</function_description>
+<function_args>
+- geo_addresses (list[str]): The addresses of the geolocations of interest
+</function_args>
+<return>List with one (lat_lon, formatted_address) tuple per address, (None, None) for addresses that were not found</return>
+<example>
+Input: geocode_batch(["Union Station, Chicago, IL", "Navy Pier, Chicago, IL"])
+Output: [((41.8787, -87.6403), "Union Station, Chicago, IL, USA"), ((41.8917, -87.6086), "Navy Pier, Chicago, IL, USA")]
+</example>
+</function>
 </helper-functions>
 
 ### Headway/Frequency Calculations
 - The frequency is the number of vehicles or buses that run per hour. It is calculated by dividing 60 minutes by the headway.
 - The headway and frequency are important metrics to understand the service level of a transit system.
 - To calculate headway of a route, always choose a representative stop (stop_sequence=1) and a particular direction (direction_id=0) and find the time difference between consecutive trips in the same direction for a given time period.
+- `feed.route_headways` holds precomputed trip counts per `route_id`, `direction_id`, `stop_id`, `service_id` and `hour` of the service day, with its `time_period` (early_morning 0-6, am_peak 6-9, midday 9-15, pm_peak 15-19, night 19-24, after_midnight for departures at 24:00:00 and later), `trips`, `first_departure`, `last_departure`, `headway_min` (mean gap between consecutive departures, NaN for a single trip) and `trips_per_hour`. Prefer `route_headways` over computing headways from stop_times.txt:
+<function>
+<function_name>route_headways</function_name>
+<function_description>Look up the trips and the headway of a route per time period or hour.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- route_id (str): The route_id
+- date (datetime.date or str, optional): Only count trips running on this date, combining all of its active service_ids. Without a date, rows are per service_id
+- direction_id (int, optional): Only this direction
+- stop_id (str, optional): The stop to count departures at, default is the stop with the most departures of each direction
+- time_period (str, optional): One of "early_morning", "am_peak", "midday", "pm_peak", "night" or "after_midnight"
+- by_hour (bool, optional): One row per hour of the service day instead of per time period, default is False
+</function_args>
+<return>A pandas DataFrame with columns ['route_id', 'direction_id', 'stop_id', 'time_period', 'trips', 'first_departure', 'last_departure', 'headway_min', 'trips_per_hour'], plus 'service_id' when no date is given and 'hour' when by_hour is True</return>
+<example>
+Input: route_headways(feed, "SILVER", date=datetime.date(2024, 9, 16), time_period="am_peak")
+Output: DataFrame with one row per direction, e.g. trips=15, headway_min=12.0, trips_per_hour=5.0
+</example>
+</function>
 
 ### Distance Calculations
 For distance calculations:
@@ -315,6 +382,104 @@ For distance calculations:
 - The calendar.txt file defines service patterns, but a route's full schedule may be spread across multiple service patterns.
 - Always cross-reference trips.txt to get the full picture of a route's schedule across all its services.
 - Remember to check calendar_dates.txt for exceptions to the regular schedule defined in calendar.txt.
+- `feed.service_days` is a precomputed date x service_id boolean table (indexed by `date`) that already combines calendar.txt and calendar_dates.txt. Use the functions below instead of filtering the calendar tables yourself:
+<function>
+<function_name>active_service_ids</function_name>
+<function_description>Find the service_ids running on a date, including calendar_dates exceptions.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- date (datetime.date or str): The date, as a datetime.date or a "YYYYMMDD" string
+</function_args>
+<return>A list of the active service_ids, empty for dates outside the feed's validity range</return>
+<example>
+Input: active_service_ids(feed, datetime.date(2024, 9, 16))
+Output: ["WKDY", "WKDY_EXTRA"]
+</example>
+</function>
+<function>
+<function_name>active_trips</function_name>
+<function_description>Find the trips running on a date.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- date (datetime.date or str): The date, as a datetime.date or a "YYYYMMDD" string
+</function_args>
+<return>A pandas DataFrame with the rows of feed.trips whose service runs on the date</return>
+<example>
+Input: active_trips(feed, "20240916")
+Output: DataFrame containing the columns of feed.trips
+</example>
+</function>
+<function>
+<function_name>service_dates</function_name>
+<function_description>Find all dates on which a service_id runs.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- service_id (str): The service_id to look up
+</function_args>
+<return>A sorted list of datetime.date objects</return>
+<example>
+Input: service_dates(feed, "WKDY")
+Output: [datetime.date(2024, 9, 16), datetime.date(2024, 9, 17), ...]
+</example>
+</function>
+
+### Stop Patterns and Segments
+- Trips are deduplicated into stop patterns: trips of the same route, direction and shape serving the same stops in the same order. Pattern ids are `<route_id>:<n>`, numbered by descending trip count, so `<route_id>:1` is the route's main pattern.
+- `feed.stop_patterns` has one row per pattern: `pattern_id`, `route_id`, `direction_id`, `shape_id`, `num_stops` and `trips`.
+- `feed.pattern_stops` lists the ordered stops of each pattern: `pattern_id`, `stop_index` (0-based) and `stop_id`. `feed.trip_patterns` maps each `trip_id` to its `pattern_id`.
+- `feed.segments` has one row per pair of consecutive stops of a pattern: `pattern_id`, `route_id`, `direction_id`, `segment_index`, `from_stop_id`, `to_stop_id`, the mean `distance` (from `shape_dist_traveled`), the mean, min and max scheduled `run_time` in seconds (`run_time`, `min_run_time`, `max_run_time`), the mean `dwell_time` at the to-stop and `trips`.
+- Use these tables for segment speeds, stops on a route and travel times instead of recomputing consecutive stops from stop_times.txt:
+<function>
+<function_name>route_stops</function_name>
+<function_description>Find the ordered stops of a route.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- route_id (str): The route_id
+- direction_id (int, optional): Only this direction
+- all_patterns (bool, optional): Return the stops of every pattern of the route instead of only the main pattern of each direction, default is False
+</function_args>
+<return>A pandas DataFrame with columns ['pattern_id', 'direction_id', 'stop_index', 'stop_id', 'stop_name', 'stop_lat', 'stop_lon']</return>
+<example>
+Input: route_stops(feed, "GREEN", direction_id=0)
+Output: DataFrame with the stops of the main pattern of route GREEN in direction 0, in order
+</example>
+</function>
+<function>
+<function_name>scheduled_travel_time</function_name>
+<function_description>Find the scheduled travel time between two stops on every pattern serving them in that order.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- from_stop_id (str): The stop_id to depart from
+- to_stop_id (str): The stop_id to arrive at
+- route_id (str, optional): Only patterns of this route
+</function_args>
+<return>A pandas DataFrame with columns ['pattern_id', 'route_id', 'direction_id', 'stops', 'travel_time', 'distance', 'trips'], with `travel_time` in seconds, sorted by trips</return>
+<example>
+Input: scheduled_travel_time(feed, "IT", "UNIONAV", route_id="GREEN")
+Output: DataFrame with one row per pattern of route GREEN serving IT before UNIONAV
+</example>
+</function>
+
+### Next Departures
+- `feed.stop_departures` holds every departure of stop_times.txt sorted by `stop_id` and `departure_time`, together with the trip's `route_id`, `service_id`, `direction_id` and `trip_headsign`.
+- For departures from a stop on a date, use `next_departures` instead of filtering stop_times.txt:
+<function>
+<function_name>next_departures</function_name>
+<function_description>Find the next departures from one or more stops on a date, including trips of the previous service day running past midnight.</function_description>
+<function_args>
+- feed (GTFSFeed): The GTFS feed object
+- stop_ids (str or list[str]): The stop_id, or all stop_ids of a station
+- date (datetime.date or str): The date, as a datetime.date or a "YYYYMMDD" string
+- start_time (int or str, optional): Earliest departure in seconds since midnight or "HH:MM:SS", default is 0
+- end_time (int or str, optional): Latest departure in seconds since midnight or "HH:MM:SS", default is None (no limit)
+- n (int, optional): Maximum number of departures to return, default is 5. None returns all departures
+</function_args>
+<return>A pandas DataFrame sorted by `departure_time` (seconds since midnight of `date`) with columns ['stop_id', 'departure_time', 'trip_id', 'stop_sequence', 'route_id', 'service_id', 'direction_id', 'trip_headsign', 'service_date']</return>
+<example>
+Input: next_departures(feed, ["IT", "ITS"], datetime.date(2024, 9, 16), "08:00:00", n=3)
+Output: DataFrame with the 3 earliest departures from stops IT and ITS at or after 8:00 AM
+</example>
+</function>
 
 ### Navigation and Directions
 - While finding directions, try to find more than one nearest neighbor to comprehensively arrive at the solution.
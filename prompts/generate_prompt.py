@@ -12,6 +12,7 @@ from prompts.all_prompts import (
 )
 from prompts.gtfs_file_field_type import GTFS_FILE_FIELD_TYPE_MAPPING
 from gtfs_agent.gtfs_loader import GTFSLoader
+from gtfs_agent.feed_store import LazyFeed
 from functools import lru_cache
 from utils.constants import (
     FEW_SHOT_EXAMPLES_FILE,
@@ -138,7 +139,11 @@ def generate_fileinfo_dtypes(feed: GTFSLoader, file_list, distance_unit: str):
     for file_name in file_list:
         try:
             file = file_name.split(".txt")[0]
-            df = getattr(feed, file)
+            # Only the first rows are needed, so avoid materializing lazy tables
+            if isinstance(feed, LazyFeed):
+                df = feed.table_preview(file, 3)
+            else:
+                df = getattr(feed, file)
             df_string = df.head(3).to_markdown(index=False)
 
             FILE_INFO += f"### {file_name} (feed.{file})\n<feed-sample>\n"
@@ -0,0 +1,32 @@
+import datetime
+import pandas as pd
+import pytest
+
+
+class CalendarFeed:
+    """
+    Two weeks of service from Monday 2024-09-16 to Sunday 2024-09-29: WKDY runs on
+    weekdays and WKND on weekends. Tests add their own calendar_dates, trips and
+    stop_times.
+    """
+
+    def __init__(self):
+        self.calendar = pd.DataFrame(
+            {
+                "service_id": ["WKDY", "WKND"],
+                "monday": [1, 0],
+                "tuesday": [1, 0],
+                "wednesday": [1, 0],
+                "thursday": [1, 0],
+                "friday": [1, 0],
+                "saturday": [0, 1],
+                "sunday": [0, 1],
+                "start_date": [datetime.date(2024, 9, 16)] * 2,
+                "end_date": [datetime.date(2024, 9, 29)] * 2,
+            }
+        )
+
+
+@pytest.fixture
+def calendar_feed():
+    return CalendarFeed()
@@ -0,0 +1,41 @@
+import sys
+import os
+import json
+import numpy as np
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.build_profiler import BuildProfiler
+
+
+def test_nested_stages():
+    profiler = BuildProfiler()
+    with profiler.stage("build") as record:
+        with profiler.stage("allocate") as inner:
+            data = np.ones(20 * 2**20 // 8)
+            inner["rows"] = len(data)
+            del data
+        record["rows"] = 3
+    build, allocate = profiler.stages
+    assert [build["name"], allocate["name"]] == ["build", "allocate"]
+    assert [build["depth"], allocate["depth"]] == [0, 1]
+    assert allocate["rows"] == 20 * 2**20 // 8
+    assert build["rows"] == 3
+    assert build["wall_s"] >= allocate["wall_s"] >= 0
+    assert build["peak_rss_mb"] >= allocate["peak_rss_mb"]
+    assert "_peak" not in build
+
+
+def test_stage_records_errors(tmp_path):
+    profiler = BuildProfiler()
+    with pytest.raises(ValueError):
+        with profiler.stage("parse"):
+            raise ValueError("bad time")
+    path = profiler.save(str(tmp_path / "profiles" / "agency.json"), agency="agency")
+    with open(path) as f:
+        report = json.load(f)
+    assert report["agency"] == "agency"
+    assert report["stages"][0]["name"] == "parse"
+    assert "bad time" in report["stages"][0]["error"]
@@ -0,0 +1,92 @@
+import sys
+import os
+import datetime
+import pandas as pd
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.feed_view import copy_on_write_view
+from gtfs_agent.service_calendar import build_service_days
+from gtfs_agent.departure_index import to_seconds, build_stop_departures, next_departures
+
+
+def add_trips(feed):
+    feed.trips = pd.DataFrame(
+        {
+            "trip_id": ["t1", "t2", "t3", "t4"],
+            "route_id": ["A", "A", "B", "A"],
+            "service_id": ["WKDY", "WKDY", "WKND", "WKDY"],
+            "direction_id": [0, 0, 0, 1],
+        }
+    )
+    feed.stop_times = pd.DataFrame(
+        {
+            "trip_id": ["t1", "t1", "t2", "t2", "t3", "t3", "t4"],
+            "stop_id": ["S1", "S2", "S1", "S2", "S1", "S2", "S1"],
+            "stop_sequence": [1, 2, 1, 2, 1, 2, 1],
+            "departure_time": [
+                8 * 3600.0,
+                8 * 3600.0 + 600,
+                7 * 3600.0,
+                7 * 3600.0 + 600,
+                9 * 3600.0,
+                9 * 3600.0 + 600,
+                24 * 3600.0 + 1800,
+            ],
+        }
+    )
+    return feed
+
+
+@pytest.fixture
+def feed(calendar_feed):
+    feed = add_trips(calendar_feed)
+    feed.service_days = build_service_days(feed)
+    feed.stop_departures, feed.stop_departure_offsets = build_stop_departures(feed)
+    return feed
+
+
+def test_to_seconds():
+    assert to_seconds(3600) == 3600
+    assert to_seconds("08:30:15") == 8 * 3600 + 30 * 60 + 15
+    assert to_seconds("25:00") == 25 * 3600
+    assert to_seconds(datetime.time(8, 30)) == 8 * 3600 + 30 * 60
+
+
+def test_build_stop_departures_is_stop_sorted(feed):
+    departures, offsets = build_stop_departures(feed)
+    assert departures["stop_id"].tolist() == ["S1"] * 4 + ["S2"] * 3
+    assert departures["departure_time"].is_monotonic_increasing is False
+    assert departures["departure_time"].iloc[:4].is_monotonic_increasing
+    assert offsets[["start", "end"]].values.tolist() == [[0, 4], [4, 7]]
+    assert set(departures.columns) >= {"route_id", "service_id", "direction_id"}
+
+
+def test_next_departures_filters_by_service_and_time(feed):
+    result = next_departures(feed, "S1", "20240917", start_time="07:30:00")
+    # t3 only runs on weekends; t4 departs at 24:30:00 of the same service day
+    assert result["trip_id"].tolist() == ["t1", "t4"]
+    result = next_departures(feed, ["S1", "S2"], datetime.date(2024, 9, 17), n=None)
+    assert result["trip_id"].tolist() == ["t4", "t2", "t2", "t1", "t1", "t4"]
+    assert result["departure_time"].tolist()[0] == 1800
+    assert result["service_date"].tolist()[0] == datetime.date(2024, 9, 16)
+
+
+def test_next_departures_respects_window_and_limit(feed):
+    # Saturday: Friday's t4 still departs at 00:30
+    result = next_departures(feed, "S1", "20240921", 0, "10:00:00")
+    assert result["trip_id"].tolist() == ["t4", "t3"]
+    result = next_departures(feed, ["S1", "S2"], "20240918", "07:00", "08:00", n=2)
+    assert result["departure_time"].tolist() == [7 * 3600, 7 * 3600 + 600]
+    assert next_departures(feed, "MISSING", "20240918").empty
+
+
+def test_next_departures_builds_missing_index_once(calendar_feed):
+    feed = add_trips(calendar_feed)
+    view = copy_on_write_view(feed)
+    assert next_departures(view, "S1", "20240917", "07:30")["trip_id"].tolist() == ["t1", "t4"]
+    departures = feed.stop_departures
+    next_departures(copy_on_write_view(feed), "S2", "20240917")
+    assert feed.stop_departures is departures
@@ -0,0 +1,90 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.feed_compaction import compact_feed, format_memory_report
+
+
+class MockFeed:
+    def __init__(self):
+        self.stops = pd.DataFrame(
+            {
+                "stop_id": ["S2", "S1", "S3"],
+                "stop_lat": [40.1, 40.2, 40.3],
+                "stop_lon": [-88.1, -88.2, -88.3],
+                "parent_station": [np.nan] * 3,
+            }
+        )
+        self.trips = pd.DataFrame(
+            {"trip_id": ["t1", "t2"], "route_id": ["R", "R"], "direction_id": [0, 1]}
+        )
+        self.stop_times = pd.DataFrame(
+            {
+                "trip_id": ["t1", "t1", "t2", "t2"],
+                "stop_id": ["S1", "S2", "S2", "S1"],
+                "stop_sequence": [1, 2, 1, 2],
+                "arrival_time": [3600.0, 3700.0, 90000.0, 90100.0],
+                "departure_time": [3600.0, np.nan, 90000.0, 90100.0],
+            }
+        )
+        self.transfers = pd.DataFrame({"from_stop_id": ["S1"], "to_stop_id": ["S4"]})
+        self.shapes = pd.DataFrame(
+            {
+                "shape_id": ["sh"] * 2,
+                "shape_pt_lat": [40.1, 40.2],
+                "shape_pt_lon": [-88.1, -88.2],
+                "shape_pt_sequence": [1, 70000],
+            }
+        )
+
+
+def test_compact_feed_dtypes():
+    feed = MockFeed()
+    report = compact_feed(feed)
+    assert feed.stop_times["arrival_time"].dtype == np.int32
+    # Blank departure times stay NaN
+    assert feed.stop_times["departure_time"].dtype == np.float32
+    assert feed.stop_times["stop_sequence"].dtype == np.int16
+    assert feed.shapes["shape_pt_sequence"].dtype == np.int32
+    assert feed.shapes["shape_pt_lat"].dtype == np.float32
+    assert feed.stops["stop_lat"].dtype == np.float64
+    assert feed.trips["direction_id"].dtype == np.int32
+    assert feed.stops["parent_station"].isna().all()
+    # Only tables that got smaller are reported
+    assert {"trips", "shapes"} <= set(report)
+    assert "stops" not in report and "transfers" not in report
+    assert all(after < before for before, after in report.values())
+    assert "total:" in format_memory_report(report)
+
+
+def test_compact_feed_categorizes_only_large_tables():
+    feed = MockFeed()
+    # Streamed tables arrive with categorical ids
+    feed.trips["route_id"] = feed.trips["route_id"].astype("category")
+    compact_feed(feed)
+    # stop_times uses its own ids as categories
+    assert feed.stop_times["stop_id"].cat.categories.tolist() == ["S1", "S2"]
+    assert feed.stop_times["trip_id"].cat.categories.tolist() == ["t1", "t2"]
+    assert feed.stop_times["stop_id"].value_counts().to_dict() == {"S1": 2, "S2": 2}
+    # Ids of the other tables are strings
+    string_ids = [(feed.stops, "stop_id"), (feed.trips, "route_id"), (feed.transfers, "to_stop_id")]
+    for df, column in string_ids:
+        assert not isinstance(df[column].dtype, pd.CategoricalDtype)
+    feed.trips.loc[0, "route_id"] = "NEW"
+    assert (feed.trips["route_id"] + "_x").tolist() == ["NEW_x", "R_x"]
+    # Categorical and string ids still compare and merge
+    assert (feed.stop_times["stop_id"] == "S1").tolist() == [True, False, False, True]
+    merged = feed.stop_times.merge(feed.stops, on="stop_id")
+    assert len(merged) == 4
+
+
+def test_compact_feed_is_idempotent():
+    feed = MockFeed()
+    compact_feed(feed)
+    stop_times = feed.stop_times
+    assert compact_feed(feed) == {}
+    assert feed.stop_times is stop_times
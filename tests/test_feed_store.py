@@ -0,0 +1,71 @@
+import sys
+import os
+import gzip
+import _pickle as cPickle
+import pandas as pd
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.feed_store import save_feed_store, load_feed_store, feed_tables
+
+TEST_PICKLE = "tests/test_pickle_feed/CUMTD_gtfs_loader.pkl"
+
+
+@pytest.fixture(scope="module")
+def loader():
+    with gzip.open(TEST_PICKLE, "rb") as f:
+        return cPickle.load(f)
+
+
+def test_feed_store_roundtrip(loader, tmp_path):
+    store = save_feed_store(loader, str(tmp_path / "CUMTD"))
+    assert os.path.exists(os.path.join(store, "feed_meta.json"))
+
+    restored = load_feed_store(store)
+    assert restored.gtfs == loader.gtfs
+    assert restored.distance_unit == loader.distance_unit
+    assert restored.feed.dist_units == loader.feed.dist_units
+
+    original_tables = feed_tables(loader.feed)
+    restored_tables = feed_tables(restored.feed)
+    assert original_tables.keys() == restored_tables.keys()
+    for name, df in original_tables.items():
+        pd.testing.assert_frame_equal(
+            df, restored_tables[name], check_dtype=False, check_column_type=False
+        )
+    # Derived indexes of the gtfs_kit Feed are rebuilt on load
+    assert restored.feed._trips_i is not None
+
+
+def test_lazy_feed_store(loader, tmp_path):
+    store = save_feed_store(loader, str(tmp_path / "CUMTD"))
+    feed = load_feed_store(store, lazy=True).feed
+    assert feed.materialized_tables() == []
+
+    preview = feed.table_preview("stop_times", 3)
+    assert len(preview) == 3
+    assert feed.materialized_tables() == []
+
+    pd.testing.assert_frame_equal(
+        feed.trips, loader.feed.trips, check_dtype=False, check_column_type=False
+    )
+    assert feed._trips_i is not None
+    assert feed.materialized_tables() == ["trips"]
+    assert not hasattr(feed, "frequencies")
+
+
+def test_mixed_type_column_roundtrip(loader, tmp_path):
+    loader.feed.mixed_table = pd.DataFrame(
+        {"stop_id": ["a", "b", "c", "d"], "value": [1, "two", 3.5, None]}
+    )
+    try:
+        store = save_feed_store(loader, str(tmp_path / "CUMTD"))
+    finally:
+        del loader.feed.mixed_table
+    for restored in [load_feed_store(store), load_feed_store(store, lazy=True)]:
+        values = restored.feed.mixed_table["value"]
+        assert values.dtype == object
+        assert values.iloc[:3].tolist() == [1, "two", 3.5]
+        assert pd.isna(values.iloc[3])
@@ -0,0 +1,53 @@
+import sys
+import os
+import gzip
+import _pickle as cPickle
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.feed_view import copy_on_write_view
+from gtfs_agent.feed_store import save_feed_store, load_feed_store
+
+TEST_PICKLE = "tests/test_pickle_feed/CUMTD_gtfs_loader.pkl"
+
+
+@pytest.fixture(scope="module")
+def loader():
+    with gzip.open(TEST_PICKLE, "rb") as f:
+        return cPickle.load(f)
+
+
+def test_view_protects_feed(loader):
+    feed = loader.feed
+    original_arrival = feed.stop_times["arrival_time"].iloc[0]
+    original_columns = list(feed.stop_times.columns)
+
+    view = copy_on_write_view(feed)
+    assert type(view) is type(feed)
+
+    view.stop_times.loc[0, "arrival_time"] = -1
+    view.stop_times["new_column"] = 1
+    view.stop_times.drop(columns=["stop_headsign"], inplace=True)
+    view.routes = view.routes.head(1)
+    del view.shapes
+
+    assert view.stop_times.loc[0, "arrival_time"] == -1
+    assert feed.stop_times["arrival_time"].iloc[0] == original_arrival
+    assert list(feed.stop_times.columns) == original_columns
+    assert len(feed.routes) > 1
+    assert hasattr(feed, "shapes")
+
+
+def test_view_of_lazy_feed_shares_materialized_tables(loader, tmp_path):
+    store = save_feed_store(loader, str(tmp_path / "CUMTD"))
+    feed = load_feed_store(store, lazy=True).feed
+
+    view = copy_on_write_view(feed)
+    view.stop_times.loc[0, "stop_id"] = "changed"
+    assert feed.materialized_tables() == ["stop_times"]
+    assert feed.stop_times.loc[0, "stop_id"] != "changed"
+
+    second_view = copy_on_write_view(feed)
+    assert second_view.stop_times.loc[0, "stop_id"] != "changed"
@@ -13,8 +13,10 @@ from utils.find_stops import (
     find_stops_by_street,
     find_stops_by_intersection,
     find_nearby_stops,
+    find_nearby_stops_batch,
     find_stops_by_address,
     find_route,
+    resolve_routes,
 )
 
 
@@ -98,6 +100,24 @@ def test_find_nearby_stops():
     assert len(result) > 0
 
 
+def test_find_nearby_stops_batch():
+    mock_stops_df = pd.DataFrame(
+        {
+            "stop_lat": [40.7128, 40.7130, 40.7135],
+            "stop_lon": [-74.0060, -74.0059, -74.0058],
+            "stop_name": ["Stop A", "Stop B", "Stop C"],
+        }
+    )
+    lats, lons = [40.7129, 41.0], [-74.0061, -75.0]
+    result = find_nearby_stops_batch(lats, lons, mock_stops_df, max_distance=200, max_stops=2)
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        expected = find_nearby_stops(lat, lon, mock_stops_df, max_distance=200, max_stops=2)
+        batch = result[result["query_index"] == i].drop(columns="query_index")
+        pd.testing.assert_frame_equal(batch, expected)
+    # The far away point falls back to its 2 nearest stops
+    assert (result["query_index"] == 1).sum() == 2
+
+
 def test_find_stops_by_address():
     mock_feed = type(
         "MockFeed",
@@ -156,4 +176,28 @@ def test_find_route():
     assert result["route_id"] == "1"
 
 
+def test_resolve_routes():
+    mock_feed = type(
+        "MockFeed",
+        (),
+        {
+            "routes": pd.DataFrame(
+                {
+                    "route_id": ["10", "20", "30"],
+                    "route_short_name": ["5", "Red", "22X"],
+                    "route_long_name": ["Main Street", "Red Line", "Airport Express"],
+                }
+            )
+        },
+    )()
+    resolved = resolve_routes(mock_feed, ["Route 5", "red line", "Airport Expres", "Nowhere"])
+    assert resolved == {
+        "Route 5": "10",
+        "red line": "20",
+        "Airport Expres": "30",
+        "Nowhere": None,
+    }
+    assert find_route(mock_feed, "RED")["route_id"] == "20"
+
+
 # Add more tests as needed
@@ -0,0 +1,31 @@
+import sys
+import os
+import json
+import zipfile
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.generate_feed_pickles import pickle_gtfs_loaders, MANIFEST_FILENAME
+
+
+def test_failed_feed_is_not_recorded_as_built(tmp_path):
+    # A readable zip whose tables cannot be parsed into a feed
+    zip_path = tmp_path / "gtfs.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("stops.txt", "stop_id,stop_name\ns1,Stop 1\n")
+        archive.writestr("stop_times.txt", b"\x00\xff corrupt \x00")
+    output_directory = tmp_path / "pickles"
+    output_directory.mkdir()
+    # A previous successful build of the agency
+    manifest_path = output_directory / MANIFEST_FILENAME
+    manifest_path.write_text(json.dumps({"Broken": {"artifact": "Broken_gtfs_loader.pkl"}}))
+    mapping_path = tmp_path / "file_mapping.json"
+    file_mapping = {"Broken": {"file_loc": str(zip_path), "distance_unit": "m"}}
+
+    pickle_gtfs_loaders(file_mapping, str(output_directory), str(mapping_path))
+
+    assert "error" in file_mapping["Broken"]
+    assert "pickle_loc" not in file_mapping["Broken"]
+    assert "Broken" not in json.loads(manifest_path.read_text())
+    assert not (output_directory / "Broken_gtfs_loader.pkl").exists()
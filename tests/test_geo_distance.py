@@ -0,0 +1,57 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.geo_distance import (
+    convert_meters,
+    haversine_distance,
+    vincenty_distance,
+    cumulative_shape_distances,
+)
+
+POINTS = [
+    ((40.1164, -88.2434), (40.1106, -88.2073)),
+    ((37.7749, -122.4194), (37.8044, -122.2712)),
+    ((42.3601, -71.0589), (42.3736, -71.1097)),
+    ((0.0, 0.0), (0.0, 1.0)),
+]
+
+
+def test_convert_meters():
+    assert convert_meters(1000, "km") == 1
+    assert convert_meters(1000, "m") == 1000
+    assert np.isclose(convert_meters(1609.344, "mi"), 1.0, rtol=1e-5)
+    assert np.isclose(convert_meters(0.3048, "ft"), 1.0, rtol=1e-5)
+
+
+def test_distances_against_geodesic():
+    lat1, lon1 = np.array([p[0] for p in POINTS]).T
+    lat2, lon2 = np.array([p[1] for p in POINTS]).T
+    expected = np.array([geodesic(a, b).meters for a, b in POINTS])
+
+    assert np.allclose(vincenty_distance(lat1, lon1, lat2, lon2), expected, atol=1e-3)
+    assert np.allclose(haversine_distance(lat1, lon1, lat2, lon2), expected, rtol=5e-3)
+
+
+def test_cumulative_shape_distances():
+    shapes = pd.DataFrame(
+        {
+            "shape_id": ["b", "a", "a", "a", "b"],
+            "shape_pt_sequence": [2, 3, 1, 2, 1],
+            "shape_pt_lat": [40.12, 40.02, 40.00, 40.01, 40.10],
+            "shape_pt_lon": [-88.20, -88.20, -88.20, -88.20, -88.20],
+        }
+    )
+    result = cumulative_shape_distances(shapes, "km", "vincenty")
+
+    assert list(result["shape_id"]) == ["a", "a", "a", "b", "b"]
+    a = result[result.shape_id == "a"]["shape_dist_traveled"].to_numpy()
+    b = result[result.shape_id == "b"]["shape_dist_traveled"].to_numpy()
+    assert a[0] == 0 and b[0] == 0
+    assert np.isclose(a[-1], geodesic((40.00, -88.20), (40.02, -88.20)).km, atol=1e-6)
+    assert np.isclose(b[-1], geodesic((40.10, -88.20), (40.12, -88.20)).km, atol=1e-6)
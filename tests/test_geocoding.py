@@ -0,0 +1,78 @@
+import sys
+import os
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.geocoding import (
+    CachedGeocoder,
+    GazetteerGeocoder,
+    GeocodeCache,
+    normalize_address,
+)
+
+
+class CountingGazetteer(GazetteerGeocoder):
+    def __init__(self, entries, fail=False):
+        super().__init__(entries)
+        self.calls = 0
+        self.fail = fail
+
+    def geocode(self, address):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("service unavailable")
+        return super().geocode(address)
+
+
+ENTRIES = {"1004 Main St, Urbana, IL": ((40.11, -88.21), "1004 Main St, Urbana, IL 61801, USA")}
+
+
+def test_normalize_address():
+    assert normalize_address("1004 Main St., Urbana,IL ") == normalize_address("1004 main st, urbana, il")
+
+
+def test_cached_geocoder_persists_results(tmp_path):
+    path = str(tmp_path / "geocode.sqlite")
+    backend = CountingGazetteer(ENTRIES)
+    geocoder = CachedGeocoder(backend, GeocodeCache(path, 3600, 60))
+    assert geocoder.geocode("1004 Main St, Urbana, IL") == ENTRIES["1004 Main St, Urbana, IL"]
+    assert geocoder.geocode("1004 main st., urbana, il") == ENTRIES["1004 Main St, Urbana, IL"]
+    assert backend.calls == 1
+
+    # A new process reuses the persisted entry
+    other_backend = CountingGazetteer({})
+    other = CachedGeocoder(other_backend, GeocodeCache(path, 3600, 60))
+    assert other.geocode("1004 Main St, Urbana, IL") == ENTRIES["1004 Main St, Urbana, IL"]
+    assert other_backend.calls == 0
+
+
+def test_cached_geocoder_negative_caching_and_ttl(tmp_path):
+    path = str(tmp_path / "geocode.sqlite")
+    backend = CountingGazetteer(ENTRIES)
+    geocoder = CachedGeocoder(backend, GeocodeCache(path, 3600, 3600))
+    assert geocoder.geocode("Nowhere") == (None, None)
+    assert geocoder.geocode("Nowhere") == (None, None)
+    assert backend.calls == 1
+
+    # Expired entries are looked up again
+    expired = CachedGeocoder(backend, GeocodeCache(path, -1, -1))
+    expired.geocode("Nowhere")
+    assert backend.calls == 2
+
+
+def test_cached_geocoder_does_not_cache_errors(tmp_path):
+    path = str(tmp_path / "geocode.sqlite")
+    failing = CachedGeocoder(CountingGazetteer(ENTRIES, fail=True), GeocodeCache(path, 3600, 3600))
+    assert failing.geocode("1004 Main St, Urbana, IL") == (None, None)
+    geocoder = CachedGeocoder(CountingGazetteer(ENTRIES), GeocodeCache(path, 3600, 3600))
+    assert geocoder.geocode("1004 Main St, Urbana, IL") == ENTRIES["1004 Main St, Urbana, IL"]
+
+
+def test_geocode_batch_looks_up_each_address_once(tmp_path):
+    backend = CountingGazetteer(ENTRIES)
+    geocoder = CachedGeocoder(backend, GeocodeCache(str(tmp_path / "geocode.sqlite"), 3600, 60))
+    addresses = ["1004 Main St, Urbana, IL", "Nowhere", "1004 MAIN ST, URBANA, IL", "nowhere"]
+    results = geocoder.geocode_batch(addresses)
+    assert results == [ENTRIES["1004 Main St, Urbana, IL"], (None, None)] * 2
+    assert backend.calls == 2
@@ -1,12 +1,24 @@
 import sys
 import os
+import io
+import zipfile
 import pytest
 import numpy as np
+import pandas as pd
 import datetime
 
 # Add the parent directory to the sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from gtfs_agent.gtfs_loader import GTFSLoader
+from gtfs_agent.gtfs_loader import (
+    GTFSLoader,
+    parse_times,
+    parse_dates,
+    stream_table,
+    read_feed,
+)
+from gtfs_agent import gtfs_loader
+from gtfs_agent.zip_reader import GTFSZip
+from gtfs_agent.feed_view import feed_tables
 
 
 @pytest.fixture
@@ -31,4 +43,102 @@ def test_parse_date(mock_gtfs_loader):
     assert mock_gtfs_loader.parse_date("2023-01-01") == datetime.date(2023, 1, 1)
 
 
+def test_parse_times_vectorized():
+    times = parse_times(["12:34:56", "7:05:00", " 25:10:00 ", "", None, "45296", "bad"])
+    expected = [45296, 25500, 90600, np.nan, np.nan, 45296, np.nan]
+    np.testing.assert_array_equal(times, np.array(expected, dtype=np.float32))
+    assert times.dtype == np.float32
+
+
+def test_parse_dates_vectorized():
+    dates = parse_dates(["20230101", "2023-02-01", None])
+    assert list(dates) == [datetime.date(2023, 1, 1), datetime.date(2023, 2, 1), None]
+    with pytest.raises(ValueError):
+        parse_dates(["20230101", "not a date"])
+
+
+STOP_TIMES_CSV = "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n" + "".join(
+    f"t{i % 7},{8 + i // 60}:{i % 60:02d}:00,,s{i % 5},{i}\n" for i in range(200)
+)
+
+
+def test_stream_table_matches_whole_read():
+    streamed = stream_table(io.BytesIO(STOP_TIMES_CSV.encode()), "stop_times", chunk_bytes=1024)
+    whole = pd.read_csv(io.StringIO(STOP_TIMES_CSV), dtype=str)
+    assert len(streamed) == 200
+    assert streamed["trip_id"].astype(str).tolist() == whole["trip_id"].tolist()
+    assert streamed["trip_id"].cat.categories.tolist() == sorted(whole["trip_id"].unique())
+    np.testing.assert_array_equal(streamed["arrival_time"], parse_times(whole["arrival_time"]))
+    assert streamed["departure_time"].isna().all()
+    assert streamed["stop_sequence"].tolist() == list(range(200))
+
+
+def test_stream_table_cleans_like_whole_read():
+    csv_text = "\ufefftrip_id, stop_id,stop_headsign\n a b ,01,None\na b,02,x y\n,01,\n"
+    streamed = stream_table(io.BytesIO(csv_text.encode()), "stop_times")
+    assert streamed.columns.tolist() == ["trip_id", "stop_id", "stop_headsign"]
+    assert streamed["trip_id"].tolist()[:2] == ["a_b", "a_b"]
+    assert pd.isna(streamed["trip_id"].iloc[2])
+    assert streamed["trip_id"].cat.categories.tolist() == ["a_b"]
+    # Padded column names still get their reference (string) types
+    assert streamed["stop_id"].tolist() == ["01", "02", "01"]
+    assert pd.isna(streamed["stop_headsign"].iloc[0]) and pd.isna(streamed["stop_headsign"].iloc[2])
+    assert streamed["stop_headsign"].iloc[1] == "x y"
+
+
+def test_read_feed_streams_large_members(tmp_path):
+    path = tmp_path / "gtfs.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("stop_times.txt", STOP_TIMES_CSV)
+        archive.writestr("stops.txt", "stop_id,stop_name,stop_lat,stop_lon\ns0,A,40.0,-88.0\n")
+    feed, streamed_tables = read_feed(GTFSZip(str(path)), "km", stream_threshold=1024)
+    assert streamed_tables == ["stop_times"]
+    assert isinstance(feed.stop_times["stop_id"].dtype, pd.CategoricalDtype)
+    assert feed.stops["stop_name"].tolist() == ["A"]
+    feed, streamed_tables = read_feed(GTFSZip(str(path)), "km")
+    assert streamed_tables == []
+    assert feed.stop_times["arrival_time"].iloc[0] == "8:00:00"
+
+
+MESSY_FEED = {
+    "agency.txt": "agency_id,agency_name,agency_url,agency_timezone\n"
+    "A,Agency,http://a.example,America/Chicago\n",
+    "routes.txt": "route_id,agency_id,route_short_name,route_type\n R 1 ,A,1,3\n",
+    "calendar.txt": "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,"
+    "start_date,end_date\nWK,1,1,1,1,1,0,0,20240101,20241231\n",
+    "stops.txt": "stop_id,stop_name,stop_lat,stop_lon\n"
+    + "".join(f"0{i},Stop {i},40.{i}0,-88.{i}0\n" for i in range(5)),
+    "shapes.txt": "shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n"
+    + "".join(f"sh 1,40.{i}0,-88.{i}0,{i}\n" for i in range(5)),
+    "trips.txt": "route_id,service_id,trip_id,direction_id,trip_headsign,shape_id\n"
+    + "".join(f"R 1,WK,t {i},{i % 2},Town,sh 1\n" for i in range(7)),
+    # Byte order mark, padded names and ids, short times and "None" headsigns
+    "stop_times.txt": "\ufefftrip_id, arrival_time,departure_time,stop_id, stop_sequence,"
+    "stop_headsign\n"
+    + "".join(
+        f" t  {i % 7} ,{6 + i // 5}:{i % 5}0:00,{6 + i // 5}:{i % 5}0:30,0{i % 5},{i},"
+        f"{'x y' if i % 3 == 0 else 'None'}\n"
+        for i in range(70)
+    ),
+}
+
+
+def test_streamed_feed_matches_whole_read(tmp_path, monkeypatch):
+    path = tmp_path / "gtfs.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, text in MESSY_FEED.items():
+            archive.writestr(name, text)
+    feeds = []
+    for threshold in [0, 2**30]:
+        monkeypatch.setattr(gtfs_loader, "STREAM_THRESHOLD_BYTES", threshold)
+        loader = GTFSLoader("messy", str(path))
+        assert loader.load_feed()
+        feeds.append(feed_tables(loader.feed))
+    streamed, whole = feeds
+    assert sorted(streamed) == sorted(whole)
+    for name in whole:
+        pd.testing.assert_frame_equal(streamed[name], whole[name], obj=name)
+    assert whole["stop_times"]["trip_id"].iloc[0] == "t_0"
+
+
 # Add more tests for other methods in GTFSLoader
@@ -0,0 +1,106 @@
+import sys
+import os
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.service_calendar import build_service_days
+from gtfs_agent.headways import classify_time_period, build_route_headways, route_headways
+
+
+def add_trips(feed):
+    # EXTRA only runs on Tuesday 2024-09-17
+    feed.calendar_dates = pd.DataFrame(
+        {"service_id": ["EXTRA"], "date": [datetime.date(2024, 9, 17)], "exception_type": [1]}
+    )
+    # Route A, direction 0: two early trips 101 s apart, departures every 30 minutes
+    # from 6:00 to 8:30 and one trip after midnight; x1 only serves S2
+    trip_ids = ["e1", "e2"] + [f"a{i}" for i in range(6)] + ["n1", "x1"]
+    feed.trips = pd.DataFrame(
+        {
+            "trip_id": trip_ids,
+            "route_id": ["A"] * 10,
+            "service_id": ["WKDY"] * 9 + ["EXTRA"],
+            "direction_id": [0] * 10,
+        }
+    )
+    starts = [5 * 3600 + 1800, 5 * 3600 + 1901]
+    starts += [6 * 3600 + i * 1800 for i in range(6)] + [24 * 3600 + 1800]
+    feed.stop_times = pd.DataFrame(
+        {
+            "trip_id": trip_ids[:9] * 2 + ["x1"],
+            "stop_id": ["S1"] * 9 + ["S2"] * 10,
+            "stop_sequence": [1] * 9 + [2] * 9 + [1],
+            "departure_time": [float(t) for t in starts]
+            + [float(t + 300) for t in starts]
+            + [10 * 3600.0],
+        }
+    )
+    return feed
+
+
+@pytest.fixture
+def feed(calendar_feed):
+    feed = add_trips(calendar_feed)
+    feed.service_days = build_service_days(feed)
+    return feed
+
+
+def test_classify_time_period():
+    periods = classify_time_period([3600, 7 * 3600, 12 * 3600, 16 * 3600, 20 * 3600, 25 * 3600])
+    assert list(periods) == [
+        "early_morning",
+        "am_peak",
+        "midday",
+        "pm_peak",
+        "night",
+        "after_midnight",
+    ]
+
+
+def test_build_route_headways_counts_trips_per_hour(feed):
+    table = build_route_headways(feed)
+    s1 = table[table["stop_id"] == "S1"].set_index("hour")
+    assert s1["trips"].to_dict() == {5: 2, 6: 2, 7: 2, 8: 2, 24: 1}
+    assert s1.loc[6, "time_period"] == "am_peak"
+    assert s1.loc[24, "time_period"] == "after_midnight"
+    # Mean gap between consecutive departures, not the hour divided by the trips
+    assert s1.loc[5, "headway_min"] == 1.7
+    assert s1.loc[6, "headway_min"] == 30.0
+    assert s1.loc[6, "trips_per_hour"] == 2.0
+    assert np.isnan(s1.loc[24, "headway_min"])
+
+
+def test_route_headways_combines_services_of_a_date(feed):
+    feed.route_headways = build_route_headways(feed)
+    result = route_headways(feed, "A", date="20240917")
+    assert "service_id" not in result.columns
+    # x1 makes S2 the stop with the most departures
+    assert set(result["stop_id"]) == {"S2"}
+    result = result.set_index("time_period")
+    assert result["trips"].to_dict() == {
+        "early_morning": 2,
+        "am_peak": 6,
+        "midday": 1,
+        "after_midnight": 1,
+    }
+    assert result.loc["am_peak", "headway_min"] == 30.0
+    assert result.loc["am_peak", "trips_per_hour"] == 2.0
+    assert result.loc["am_peak", "first_departure"] == 6 * 3600 + 300
+    assert result.loc["am_peak", "last_departure"] == 8 * 3600 + 2100
+    assert np.isnan(result.loc["midday", "headway_min"])
+    # No service on weekends
+    assert route_headways(feed, "A", date="20240921").empty
+
+
+def test_route_headways_filters(feed):
+    result = route_headways(feed, "A", stop_id="S2", time_period="midday")
+    assert result[["service_id", "trips"]].values.tolist() == [["EXTRA", 1]]
+    result = route_headways(feed, "A", stop_id="S1", time_period="am_peak", by_hour=True)
+    assert result[["hour", "trips"]].values.tolist() == [[6, 2], [7, 2], [8, 2]]
+    assert route_headways(feed, "A", direction_id=1).empty
+    assert route_headways(feed, "MISSING").empty
@@ -0,0 +1,82 @@
+import sys
+import os
+import time
+import pandas as pd
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluator.result_cache import (
+    ResultCache,
+    artifact_content_hash,
+    depends_on_current_time,
+    result_cache_key,
+)
+
+
+def test_result_cache_key_normalizes_code():
+    code = "result = feed.stops['stop_id'].nunique()"
+    reformatted = "# count stops\nresult = feed.stops[\"stop_id\"].nunique()  \n\n"
+    assert result_cache_key("feed", code) == result_cache_key("feed", reformatted)
+    assert result_cache_key("feed", code) != result_cache_key("other_feed", code)
+    assert result_cache_key("feed", code) != result_cache_key("feed", "result = 1")
+
+
+def test_depends_on_current_time():
+    assert depends_on_current_time("now = datetime.now()")
+    assert depends_on_current_time("today = get_current_time().date()")
+    assert depends_on_current_time("today = pd.Timestamp.today()")
+    assert not depends_on_current_time("result = feed.calendar['start_date'].min()")
+
+
+def test_result_cache_roundtrip_and_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=1024**2)
+    output = {"code_output": pd.DataFrame({"a": [1, 2]}), "eval_success": True}
+    assert cache.get("key") is None
+    assert cache.put("key", output)
+    pd.testing.assert_frame_equal(cache.get("key")["code_output"], output["code_output"])
+
+    cache.put("expiring", output, ttl=0.01)
+    time.sleep(0.05)
+    assert cache.get("expiring") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=2500)
+    for key in ["a", "b"]:
+        cache.put(key, {"code_output": "x" * 1000})
+        time.sleep(0.01)
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    time.sleep(0.01)
+    cache.put("c", {"code_output": "x" * 1000})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] <= 2500
+
+
+def test_result_cache_overwrite_keeps_byte_count(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=2500)
+    cache.put("a", {"code_output": "x" * 1000})
+    size = cache.stats()["bytes"]
+    for _ in range(5):
+        cache.put("b", {"code_output": "y" * 1000})
+    assert cache.stats()["bytes"] == 2 * size
+    # Overwriting "b" must not evict "a"
+    assert cache.get("a") is not None
+
+    cache.put("expiring", {"code_output": "z"}, ttl=0.01)
+    time.sleep(0.05)
+    assert cache.get("expiring") is None
+    assert cache.stats()["bytes"] == 2 * size
+
+
+def test_artifact_content_hash_tracks_changes(tmp_path):
+    artifact = tmp_path / "feed.pkl"
+    artifact.write_bytes(b"feed v1")
+    first = artifact_content_hash(str(artifact))
+    assert first == artifact_content_hash(str(artifact))
+    artifact.write_bytes(b"feed v2 with more data")
+    assert artifact_content_hash(str(artifact)) != first
+    assert artifact_content_hash(str(tmp_path / "missing.pkl")) is None
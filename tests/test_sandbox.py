@@ -0,0 +1,113 @@
+import sys
+import os
+import time
+import threading
+import pandas as pd
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluator import sandbox
+from evaluator.sandbox import SandboxPool, ResourceLimitError, fork_available, get_sandbox_pool
+
+pytestmark = pytest.mark.skipif(not fork_available(), reason="requires fork")
+
+
+class MockFeed:
+    def __init__(self):
+        self.stops = pd.DataFrame({"stop_id": ["1", "2", "3"]})
+
+
+@pytest.fixture
+def pool():
+    feed = MockFeed()
+    pool = SandboxPool(feed, {"pd": pd}, workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_sandbox_returns_result(pool):
+    response = pool.run("result = len(feed.stops)", timeout_seconds=10)
+    assert response["status"] == "ok"
+    assert response["result"] == 3
+    assert set(response["usage"]) == {"wall_time_s", "cpu_time_s", "peak_memory_mb"}
+
+
+def test_sandbox_reports_errors(pool):
+    response = pool.run("result = feed.stops['missing']", timeout_seconds=10)
+    assert response["status"] == "error"
+    assert "KeyError" in response["error_message"]
+
+
+def test_sandbox_kills_timed_out_worker(pool):
+    worker = pool._idle.queue[0]
+    with pytest.raises(TimeoutError):
+        pool.run("while True:\n    pass", timeout_seconds=1)
+    assert not worker.process.is_alive()
+    # A fresh worker replaces the killed one
+    assert pool.run("result = 1", timeout_seconds=10)["result"] == 1
+
+
+def test_sandbox_enforces_memory_limit(pool):
+    code = "import time\nblock = bytearray(400 * 1024**2)\ntime.sleep(5)\nresult = 1"
+    with pytest.raises(ResourceLimitError) as excinfo:
+        pool.run(code, timeout_seconds=30, max_memory_mb=200)
+    assert excinfo.value.usage["peak_memory_mb"] > 200
+    assert pool.run("result = 1", timeout_seconds=10)["result"] == 1
+
+
+def test_sandbox_enforces_cpu_limit(pool):
+    with pytest.raises(ResourceLimitError) as excinfo:
+        pool.run("while True:\n    pass", timeout_seconds=30, max_cpu_seconds=0.5)
+    assert excinfo.value.usage["cpu_time_s"] >= 0.5
+    assert excinfo.value.usage["wall_time_s"] < 30
+
+
+def run_in_background(pool, code):
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(pool.run(code, 30)))
+    thread.start()
+    return thread, responses
+
+
+def test_shutdown_lets_running_code_finish(pool):
+    worker = pool._idle.queue[0]
+    thread, responses = run_in_background(pool, "import time\ntime.sleep(1)\nresult = 1")
+    while not pool._idle.empty():
+        time.sleep(0.01)
+    pool.shutdown()
+    thread.join()
+    assert responses[0]["status"] == "ok"
+    assert not worker.process.is_alive()
+    with pytest.raises(RuntimeError):
+        pool.run("result = 1", timeout_seconds=10)
+
+
+def test_reloaded_feeds_get_their_own_pools():
+    first, second = MockFeed(), MockFeed()
+    try:
+        pool = get_sandbox_pool("agency", first, {}, workers=1)
+        thread, responses = run_in_background(pool, "import time\ntime.sleep(1)\nresult = 1")
+        # Sessions holding the old and the new feed alternate while the run is in flight
+        other = get_sandbox_pool("agency", second, {}, workers=1)
+        assert other is not pool
+        assert get_sandbox_pool("agency", first, {}, workers=1) is pool
+        assert get_sandbox_pool("agency", second, {}, workers=1) is other
+        thread.join()
+        assert responses[0]["status"] == "ok"
+        assert other.run("result = len(feed.stops)", timeout_seconds=10)["result"] == 3
+    finally:
+        for pool_key in [("agency", id(first)), ("agency", id(second))]:
+            sandbox._POOLS.pop(pool_key).shutdown()
+
+
+def test_idle_pools_are_shut_down(monkeypatch):
+    feed = MockFeed()
+    pool = get_sandbox_pool("idle", feed, {}, workers=1)
+    worker = pool._idle.queue[0]
+    monkeypatch.setattr(sandbox, "POOL_IDLE_SECONDS", 0)
+    other = get_sandbox_pool("other", MockFeed(), {}, workers=1)
+    assert ("idle", id(feed)) not in sandbox._POOLS
+    assert not worker.process.is_alive()
+    sandbox._POOLS.pop(("other", id(other.feed))).shutdown()
@@ -0,0 +1,128 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+from thefuzz import fuzz
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.search_index import (
+    get_route_index,
+    get_stop_name_index,
+    get_stop_spatial_index,
+    get_street_index,
+    remove_text_in_braces,
+    split_streets,
+)
+
+
+def make_stops(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "stop_id": [str(i) for i in range(n)],
+            "stop_lat": 40.1 + rng.uniform(-0.05, 0.05, n),
+            "stop_lon": -88.2 + rng.uniform(-0.05, 0.05, n),
+        }
+    )
+
+
+def geodesic_distances(stops, lat, lon):
+    return np.array(
+        [geodesic((lat, lon), point).meters for point in zip(stops["stop_lat"], stops["stop_lon"])]
+    )
+
+
+def test_spatial_index_matches_geodesic():
+    stops = make_stops()
+    index = get_stop_spatial_index(stops)
+    lat, lon = 40.1, -88.2
+    exact = geodesic_distances(stops, lat, lon)
+
+    positions, distances = index.query_radius(lat, lon, 1000)
+    assert set(positions) == set(np.flatnonzero(exact <= 1000))
+    np.testing.assert_allclose(distances, exact[positions], atol=1e-3)
+    assert np.all(np.diff(distances) >= 0)
+
+    positions, distances = index.query_nearest(lat, lon, 7)
+    np.testing.assert_array_equal(positions, np.argsort(exact, kind="stable")[:7])
+
+
+def test_spatial_index_is_shared_by_views_and_rebuilt_on_change():
+    stops = make_stops()
+    index = get_stop_spatial_index(stops)
+    assert get_stop_spatial_index(stops.copy(deep=False)) is index
+
+    moved = stops.copy()
+    moved.loc[0, "stop_lat"] = 0.0
+    assert get_stop_spatial_index(moved) is not index
+
+
+def test_route_index_is_cached_for_categorical_ids():
+    routes = pd.DataFrame({"route_id": ["1", "2"], "route_short_name": ["Red", "Blue"]})
+    routes["route_id"] = routes["route_id"].astype("category")
+    index = get_route_index(routes)
+    assert get_route_index(routes.copy(deep=False)) is index
+
+    renamed = routes.assign(route_id=routes["route_id"].cat.rename_categories(["1", "3"]))
+    assert get_route_index(renamed) is not index
+
+
+def test_spatial_index_skips_missing_coordinates():
+    stops = make_stops(10)
+    stops.loc[3, "stop_lat"] = np.nan
+    positions, _ = get_stop_spatial_index(stops).query_nearest(40.1, -88.2, 20)
+    assert len(positions) == 9
+    assert 3 not in positions
+
+
+def test_stop_name_scores_match_thefuzz():
+    names = [
+        "Illinois Terminal (Platform B)",
+        "Green & Wright (NE Corner)",
+        "Green St & Fourth St",
+        "Lincoln Square",
+        "",
+        "GREEN",
+    ]
+    stops = pd.DataFrame({"stop_name": names})
+    for query in ["green", "Illinois Terminal", "Platform", "xyz", "Green & 4th"]:
+        expected = [
+            max(
+                fuzz.partial_ratio(name.lower(), query.lower()),
+                fuzz.partial_ratio(remove_text_in_braces(name).lower(), query.lower()),
+            )
+            for name in names
+        ]
+        scores = get_stop_name_index(stops).match_scores(query, threshold=0)
+        assert list(scores) == expected
+        # With a threshold, every name reaching it keeps its exact score
+        scores = get_stop_name_index(stops).match_scores(query, threshold=80)
+        for score, exact in zip(scores, expected):
+            assert score == exact or (exact < 80 and score < 80)
+
+
+def test_split_streets_normalizes_abbreviations():
+    assert split_streets("N 27th St & Superior St., NW") == ["north 27th street", "superior street"]
+    assert split_streets("Green/Wright (Platform A)") == ["green", "wright"]
+    assert split_streets("S Street at Main Ave") == ["s street", "main avenue"]
+
+
+def test_street_index_matches_streets_not_shared_words():
+    stops = pd.DataFrame(
+        {
+            "stop_name": [
+                "N 27th St & Superior St, SW",
+                "North 40th Street & Superior Street, SE",
+                "Main Street & Elm St",
+                "S Street & 10th St",
+            ]
+        }
+    )
+    index = get_street_index(stops)
+    assert list(index.stops_on_street("27th St", 80)) == [0]
+    assert list(index.stops_on_street("Superior", 80)) == [0, 1]
+    assert list(index.stops_on_street("Main St", 80)) == [2]
+    assert list(index.stops_on_street("S", 80)) == [3]
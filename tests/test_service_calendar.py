@@ -0,0 +1,89 @@
+import sys
+import os
+import datetime
+import pandas as pd
+import pytest
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.feed_view import copy_on_write_view
+from gtfs_agent.service_calendar import (
+    to_date,
+    build_service_days,
+    active_service_ids,
+    active_trips,
+    service_dates,
+)
+
+
+@pytest.fixture
+def feed(calendar_feed):
+    # Holiday on Monday 2024-09-23: weekday service removed, weekend service added
+    calendar_feed.calendar_dates = pd.DataFrame(
+        {
+            "service_id": ["WKDY", "WKND", "EXTRA"],
+            "date": [
+                datetime.date(2024, 9, 23),
+                datetime.date(2024, 9, 23),
+                datetime.date(2024, 10, 1),
+            ],
+            "exception_type": [2, 1, 1],
+        }
+    )
+    calendar_feed.trips = pd.DataFrame(
+        {"trip_id": ["t1", "t2", "t3"], "service_id": ["WKDY", "WKND", "EXTRA"]}
+    )
+    return calendar_feed
+
+
+def test_to_date():
+    expected = datetime.date(2024, 9, 16)
+    assert to_date(expected) == expected
+    assert to_date(datetime.datetime(2024, 9, 16, 8, 30)) == expected
+    assert to_date(pd.Timestamp("2024-09-16")) == expected
+    assert to_date("20240916") == expected
+    assert to_date("2024-09-16") == expected
+    assert to_date(20240916) == expected
+
+
+def test_build_service_days_covers_validity_range(feed):
+    service_days = build_service_days(feed)
+    assert service_days.index[0] == datetime.date(2024, 9, 16)
+    # calendar_dates extends the range beyond calendar.txt
+    assert service_days.index[-1] == datetime.date(2024, 10, 1)
+    assert sorted(service_days.columns) == ["EXTRA", "WKDY", "WKND"]
+    assert service_days.dtypes.eq(bool).all()
+
+
+def test_active_service_ids_applies_exceptions(feed):
+    feed.service_days = build_service_days(feed)
+    assert active_service_ids(feed, "20240917") == ["WKDY"]
+    assert active_service_ids(feed, datetime.date(2024, 9, 21)) == ["WKND"]
+    # Holiday: weekday service removed, weekend service added
+    assert active_service_ids(feed, datetime.date(2024, 9, 23)) == ["WKND"]
+    assert active_service_ids(feed, datetime.date(2024, 9, 30)) == []
+    assert active_service_ids(feed, datetime.date(2024, 10, 1)) == ["EXTRA"]
+    assert active_service_ids(feed, datetime.date(2025, 1, 1)) == []
+
+
+def test_helpers_without_precomputed_bitmap(feed):
+    assert active_trips(feed, "2024-10-01")["trip_id"].tolist() == ["t3"]
+    assert service_dates(feed, "WKND") == [
+        datetime.date(2024, 9, 21),
+        datetime.date(2024, 9, 22),
+        datetime.date(2024, 9, 23),
+        datetime.date(2024, 9, 28),
+        datetime.date(2024, 9, 29),
+    ]
+    assert service_dates(feed, "MISSING") == []
+    # The bitmap built on the fly is kept on the feed
+    assert isinstance(feed.service_days, pd.DataFrame)
+
+
+def test_bitmap_built_once_for_views(feed):
+    view = copy_on_write_view(feed)
+    assert active_service_ids(view, "20240917") == ["WKDY"]
+    # Kept on the viewed feed, so later views reuse it
+    assert isinstance(feed.service_days, pd.DataFrame)
+    assert copy_on_write_view(feed).service_days.equals(view.service_days)
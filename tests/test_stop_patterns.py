@@ -0,0 +1,92 @@
+import sys
+import os
+import pandas as pd
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.feed_view import copy_on_write_view
+from gtfs_agent.stop_patterns import build_stop_patterns, route_stops, scheduled_travel_time
+
+
+class MockFeed:
+    def __init__(self):
+        # t1 and t2 share a pattern; t3 skips stop B
+        self.trips = pd.DataFrame(
+            {
+                "trip_id": ["t1", "t2", "t3"],
+                "route_id": ["R", "R", "R"],
+                "direction_id": [0, 0, 0],
+                "shape_id": ["sh1", "sh1", "sh1"],
+            }
+        )
+        self.stop_times = pd.DataFrame(
+            {
+                "trip_id": ["t1"] * 3 + ["t2"] * 3 + ["t3"] * 2,
+                "stop_sequence": [1, 2, 3, 1, 2, 3, 1, 3],
+                "stop_id": ["A", "B", "C", "A", "B", "C", "A", "C"],
+                "arrival_time": [0.0, 100.0, 300.0, 1000.0, 1120.0, 1320.0, 2000.0, 2250.0],
+                "departure_time": [0.0, 130.0, 300.0, 1000.0, 1150.0, 1320.0, 2000.0, 2250.0],
+                "shape_dist_traveled": [0.0, 1.0, 3.0, 0.0, 1.0, 3.0, 0.0, 3.0],
+            }
+        )
+        self.stops = pd.DataFrame(
+            {
+                "stop_id": ["A", "B", "C"],
+                "stop_name": ["Alpha", "Beta", "Gamma"],
+                "stop_lat": [40.0, 40.1, 40.2],
+                "stop_lon": [-88.0, -88.1, -88.2],
+            }
+        )
+
+
+def test_build_stop_patterns_deduplicates_trips():
+    tables = build_stop_patterns(MockFeed())
+    patterns = tables["stop_patterns"]
+    assert patterns[["pattern_id", "num_stops", "trips"]].values.tolist() == [
+        ["R:1", 3, 2],
+        ["R:2", 2, 1],
+    ]
+    trip_patterns = tables["trip_patterns"].set_index("trip_id")["pattern_id"].to_dict()
+    assert trip_patterns == {"t1": "R:1", "t2": "R:1", "t3": "R:2"}
+    stops = tables["pattern_stops"]
+    assert stops[stops["pattern_id"] == "R:1"]["stop_id"].tolist() == ["A", "B", "C"]
+
+
+def test_build_stop_patterns_segments():
+    segments = build_stop_patterns(MockFeed())["segments"]
+    main = segments[segments["pattern_id"] == "R:1"]
+    assert main[["from_stop_id", "to_stop_id"]].values.tolist() == [["A", "B"], ["B", "C"]]
+    assert main["run_time"].tolist() == [110.0, 170.0]
+    assert main["min_run_time"].tolist() == [100.0, 170.0]
+    assert main["dwell_time"].tolist() == [30.0, 0.0]
+    assert main["distance"].tolist() == [1.0, 2.0]
+    assert main["trips"].tolist() == [2, 2]
+
+
+def test_route_stops():
+    feed = MockFeed()
+    feed.__dict__.update(build_stop_patterns(feed))
+    stops = route_stops(feed, "R")
+    assert stops["stop_name"].tolist() == ["Alpha", "Beta", "Gamma"]
+    assert set(route_stops(feed, "R", all_patterns=True)["pattern_id"]) == {"R:1", "R:2"}
+    assert route_stops(feed, "R", direction_id=1).empty
+
+
+def test_scheduled_travel_time_includes_dwell():
+    # Works without the precomputed tables too
+    result = scheduled_travel_time(MockFeed(), "A", "C")
+    assert result["pattern_id"].tolist() == ["R:1", "R:2"]
+    # 110s to B, 30s dwell, 170s to C
+    assert result["travel_time"].tolist() == [310.0, 250.0]
+    assert result["distance"].tolist() == [3.0, 3.0]
+    assert result["stops"].tolist() == [2, 1]
+    assert scheduled_travel_time(MockFeed(), "C", "A").empty
+
+
+def test_missing_pattern_tables_built_once():
+    feed = MockFeed()
+    assert route_stops(copy_on_write_view(feed), "R")["stop_id"].tolist() == ["A", "B", "C"]
+    segments = feed.segments
+    scheduled_travel_time(copy_on_write_view(feed), "A", "C")
+    assert feed.segments is segments
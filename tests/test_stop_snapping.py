@@ -0,0 +1,93 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.stop_snapping import build_trip_patterns, snap_stop_times, SnapCache
+from gtfs_agent.bounded_cache import BoundedLRUCache
+
+
+def make_feed_tables():
+    shapes = pd.DataFrame(
+        {
+            "shape_id": ["s1"] * 5,
+            "shape_pt_sequence": [1, 2, 3, 4, 5],
+            "shape_pt_lat": [40.0, 40.001, 40.002, 40.003, 40.004],
+            "shape_pt_lon": [-88.0] * 5,
+            "shape_dist_traveled": [0.0, 111.0, 222.0, 333.0, 444.0],
+        }
+    )
+    stops = pd.DataFrame(
+        {
+            "stop_id": ["A", "B", "C"],
+            "stop_lat": [40.0, 40.002, 40.004],
+            "stop_lon": [-88.0001, -88.0001, -88.0001],
+        }
+    )
+    trips = pd.DataFrame(
+        {"trip_id": ["t1", "t2", "t3"], "shape_id": ["s1", "s1", "missing"]}
+    )
+    stop_times = pd.DataFrame(
+        {
+            "trip_id": ["t2", "t1", "t1", "t1", "t2", "t2", "t3", "t3"],
+            "stop_sequence": [1, 3, 1, 2, 2, 3, 1, 2],
+            "stop_id": ["A", "C", "A", "B", "B", "C", "A", "B"],
+        }
+    )
+    return stop_times, stops, trips, shapes
+
+
+def test_build_trip_patterns():
+    stop_times, _, trips, _ = make_feed_tables()
+    patterns = build_trip_patterns(stop_times, trips).set_index("trip_id")
+    assert patterns.loc["t1", "pattern_id"] == patterns.loc["t2", "pattern_id"]
+    assert patterns.loc["t1", "stop_ids"] == ("A", "B", "C")
+    assert patterns.loc["t3", "pattern_id"] != patterns.loc["t1", "pattern_id"]
+
+
+def test_snap_stop_times():
+    stop_times, stops, trips, shapes = make_feed_tables()
+    result = snap_stop_times(stop_times, stops, trips, shapes)
+    assert result.index.equals(stop_times.index)
+    snapped = stop_times.assign(shape_dist_traveled=result).sort_values(
+        ["trip_id", "stop_sequence"]
+    )
+    t1 = snapped[snapped.trip_id == "t1"]["shape_dist_traveled"].to_numpy()
+    t2 = snapped[snapped.trip_id == "t2"]["shape_dist_traveled"].to_numpy()
+    # Trips sharing a stop pattern get identical, monotonic distances
+    assert np.array_equal(t1, t2)
+    assert t1[0] == 0.0 and np.all(np.diff(t1) > 0)
+    # Trips whose shape cannot be found are left unsnapped
+    assert np.isnan(result[6:]).all()
+
+
+def test_snap_cache_reuses_patterns():
+    stop_times, stops, trips, shapes = make_feed_tables()
+    cache = SnapCache.for_feed(stop_times, trips, shapes)
+    first = snap_stop_times(stop_times, stops, trips, shapes, cache=cache)
+    # t2 shares the pattern of t1; t3 misses and is cached as a failure
+    assert cache.patterns.stats()["hits"] == 1
+    assert cache.patterns.stats()["misses"] == 2
+    assert cache.trees.stats()["misses"] == 1
+
+    cache.reset_stats()
+    second = snap_stop_times(stop_times, stops, trips, shapes, cache=cache)
+    assert cache.patterns.stats()["hits"] == 3
+    assert cache.patterns.stats()["misses"] == 0
+    assert first.equals(second)
+
+
+def test_bounded_lru_cache_eviction():
+    cache = BoundedLRUCache(max_items=2, max_bytes=1024)
+    cache.put("a", np.zeros(10))
+    cache.put("b", np.zeros(10))
+    cache.get("a")
+    cache.put("c", np.zeros(10))
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.stats()["evictions"] == 1
+
+    cache.put("d", np.zeros(200))  # 1600 bytes, larger than the byte bound
+    assert "d" not in cache
@@ -0,0 +1,51 @@
+import sys
+import os
+import zipfile
+import pandas as pd
+
+# Add the parent directory to the sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gtfs_agent.zip_reader import GTFSZip
+from gtfs_agent.gtfs_loader import GTFSLoader
+
+STOPS_CSV = "stop_id,stop_name\n" + "".join(f"s{i},Stop {i}\n" for i in range(100))
+
+
+def make_zip(path):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("stops.txt", STOPS_CSV, compress_type=zipfile.ZIP_STORED)
+        archive.writestr("routes.txt", "route_id\nR\n", compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr("nested/trips.txt", "trip_id\nt\n")
+        archive.writestr("README.md", "not a table")
+    return str(path)
+
+
+def test_inventory(tmp_path):
+    archive = GTFSZip(make_zip(tmp_path / "gtfs.zip"))
+    assert set(archive.tables) == {"stops", "routes"}
+    assert archive.table_size("stops") == len(STOPS_CSV)
+    assert "README.md" in archive.file_list
+    assert archive.is_memory_mapped("stops")
+    assert not archive.is_memory_mapped("routes")
+
+
+def test_open_reads_stored_and_compressed_members(tmp_path):
+    archive = GTFSZip(make_zip(tmp_path / "gtfs.zip"))
+    with archive.open("stops") as f:
+        assert f.read() == STOPS_CSV.encode()
+    with archive.open("stops") as f:
+        assert pd.read_csv(f)["stop_name"].iloc[-1] == "Stop 99"
+    with archive.open("routes") as f:
+        assert f.read() == b"route_id\nR\n"
+    archive.close()
+    assert archive.archive.fp is None
+
+
+def test_loader_closes_archive_when_loading_fails(tmp_path):
+    # No stop_times, trips or shapes: processing the feed fails
+    loader = GTFSLoader("test", make_zip(tmp_path / "gtfs.zip"))
+    archive = loader.archive
+    assert not loader.load_feed()
+    assert "archive" not in vars(loader)
+    assert archive.archive.fp is None
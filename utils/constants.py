@@ -4,6 +4,30 @@ import streamlit as st
 # Set timeout to 5 minutes
 TIMEOUT_SECONDS = 5 * 60
 
+# Code execution backend: "process" runs generated code in pre-forked worker processes
+# holding the feed (falls back to "thread" where fork is unavailable)
+SANDBOX_BACKEND = "process"
+SANDBOX_WORKERS = 2
+# Per-execution resource limits for generated code (None disables a limit)
+MAX_EXECUTION_MEMORY_MB = 4096
+MAX_EXECUTION_CPU_SECONDS = 4 * 60
+
+# On-disk cache of evaluation results, keyed on feed content and normalized code
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_DIR = "gtfs_data/result_cache"
+RESULT_CACHE_MAX_BYTES = 512 * 1024**2
+# Results of code that reads the current date/time are only reused this long
+RESULT_CACHE_CURRENT_TIME_TTL_SECONDS = 60
+
+# Geocoding: backend is "google", "nominatim", "gazetteer" (offline, answers from
+# GEOCODE_GAZETTEER_FILE) or None to use Google Maps when a GMAP_API key is set
+GEOCODER_BACKEND = None
+GEOCODE_GAZETTEER_FILE = "data/gazetteer.csv"
+# Persistent geocode cache (None disables it); places rarely move, misses may be fixed
+GEOCODE_CACHE_PATH = "gtfs_data/geocode_cache.sqlite"
+GEOCODE_CACHE_TTL_SECONDS = 30 * 24 * 3600
+GEOCODE_NEGATIVE_TTL_SECONDS = 24 * 3600
+
 # File to store sample questions
 QUESTIONS_FILE = "data/sample_questions.json"
 QUESTION_LIMIT = 3
@@ -1,15 +1,14 @@
-import re
+import numpy as np
 import pandas as pd
 from thefuzz import fuzz, process
-from geopy.distance import geodesic
-from geopy.geocoders import Nominatim
-import streamlit as st
-import googlemaps
-
-
-def remove_text_in_braces(text):
-    # Remove text in braces and any extra spaces left behind
-    return re.sub(r"\s*\(.*?\)\s*", " ", text).strip()
+from utils.geocoding import get_geocoder
+from utils.search_index import (
+    get_route_index,
+    get_stop_name_index,
+    get_stop_spatial_index,
+    get_street_index,
+    remove_text_in_braces,
+)
 
 
 def get_geo_location(geo_address):
@@ -19,7 +18,8 @@ def get_geo_location(geo_address):
     This function attempts to obtain the latitude and longitude of a specified location
     using either the Google Maps API or the Nominatim geocoding service. If the Google Maps
     API key is available in the Streamlit secrets, it will use that service; otherwise, it
-    will fall back to Nominatim.
+    will fall back to Nominatim. Results, including addresses that were not found, are
+    kept in a persistent geocode cache (see utils.geocoding).
 
     Args:
         geo_address (str): The address of the geolocation of interest. Eg: "1004 Main St, Urbana, IL"
@@ -29,22 +29,24 @@ def get_geo_location(geo_address):
             - (float, float): The latitude and longitude of the location.
             - str: The formatted address of the location, or None if not found.
     """
-    if "GMAP_API" in st.secrets:
-        try:
-            gmaps = googlemaps.Client(key=st.secrets["GMAP_API"])
-            location = gmaps.geocode(geo_address)
-            geometry = location[0]["geometry"]["location"]
-            formatted_address = location[0]["formatted_address"]
-            return (geometry["lat"], geometry["lng"]), formatted_address
-        except Exception:
-            return None, None
-    else:
-        geolocator = Nominatim(user_agent="gtfs2code")
-        location = geolocator.geocode(geo_address)
-        if location:
-            return (location.latitude, location.longitude), location.address
-        else:
-            return None, None
+    return get_geocoder().geocode(geo_address)
+
+
+def geocode_batch(geo_addresses):
+    """
+    Retrieve geographical coordinates and formatted addresses for many locations at once.
+
+    Equivalent to calling get_geo_location for every address, but cached addresses are
+    answered together and each distinct new address is only geocoded once.
+
+    Args:
+        geo_addresses (list[str]): Addresses of the geolocations of interest.
+
+    Returns:
+        list: One ((lat, lon), formatted_address) tuple per address, or (None, None)
+              for addresses that were not found.
+    """
+    return get_geocoder().geocode_batch(list(geo_addresses))
 
 
 def fuzzy_match(string: str, pattern: str, threshold: int = 80) -> bool:
@@ -88,27 +90,13 @@ def find_stops_by_full_name(feed, name: str, threshold: int = 80) -> pd.DataFram
         pd.DataFrame: A DataFrame containing all stops whose names fuzzy
                       match the provided name, with the best match score.
     """
-    stops_df = feed.stops.copy()
-    stops_df["stop_name_cleaned"] = stops_df["stop_name"].apply(remove_text_in_braces)
-
-    stops_df["match_score_original"] = stops_df["stop_name"].apply(
-        lambda x: fuzz.partial_ratio(x.lower(), name.lower())
-    )
-    stops_df["match_score_cleaned"] = stops_df["stop_name_cleaned"].apply(
-        lambda x: fuzz.partial_ratio(x.lower(), name.lower())
-    )
-
-    stops_df["match_score"] = stops_df[
-        ["match_score_original", "match_score_cleaned"]
-    ].max(axis=1)
-
-    matching_stops = stops_df[stops_df["match_score"] >= threshold]
+    scores = get_stop_name_index(feed.stops).match_scores(name, threshold)
+    matching = np.flatnonzero(scores >= threshold)
+    matching_stops = feed.stops.iloc[matching].copy()
+    matching_stops["match_score"] = scores[matching]
     matching_stops = matching_stops.sort_values("match_score", ascending=False)
     best_match = matching_stops["match_score"].max() if not matching_stops.empty else 0
     best_matches = matching_stops[matching_stops["match_score"] == best_match]
-    best_matches = best_matches.drop(
-        columns=["stop_name_cleaned", "match_score_original", "match_score_cleaned"]
-    )
 
     return best_matches
 
@@ -118,8 +106,9 @@ def find_stops_by_street(feed, street_root: str, threshold: int = 80) -> pd.Data
     Find stops by fuzzy matching a street name.
 
     This function searches for stops in the provided feed whose names
-    contain a fuzzy match to the given street_root. It normalizes the
-    input street name to lowercase before performing the comparison.
+    contain a fuzzy match to the given street_root. Stop names are split into
+    their streets (on "&", "/", "and", "at", ...) and street names are
+    normalized before the comparison, so "Main St" also matches "Main Street".
 
     Args:
         feed: An object containing stop information. Must have a 'stops'
@@ -132,21 +121,15 @@ def find_stops_by_street(feed, street_root: str, threshold: int = 80) -> pd.Data
         pd.DataFrame: A DataFrame containing all stops whose names contain
                       a fuzzy match to the provided street name.
     """
-
-    street_root = street_root.lower()
-    stops_df = feed.stops.copy()
-    stops_df["stop_name_cleaned"] = stops_df["stop_name"].apply(remove_text_in_braces)
-    stops_df["match_score"] = stops_df["stop_name_cleaned"].apply(
-        lambda x: fuzz.token_set_ratio(x, street_root)
-    )
-
-    matching_stops = stops_df[stops_df["match_score"] >= threshold]
+    scores = get_street_index(feed.stops).stop_scores(street_root)
+    matching = np.flatnonzero(scores >= threshold)
+    matching_stops = feed.stops.iloc[matching].copy()
+    matching_stops["match_score"] = scores[matching]
     matching_stops = matching_stops.sort_values("match_score", ascending=False)
     highest_score = (
         matching_stops["match_score"].max() if not matching_stops.empty else 0
     )
     best_matches = matching_stops[matching_stops["match_score"] == highest_score]
-    best_matches.drop(columns=["stop_name_cleaned"], inplace=True)
     return best_matches
 
 
@@ -158,7 +141,8 @@ def find_stops_by_intersection(
 
     This function searches for stops in the provided feed whose names
     contain fuzzy matches to both of the given street names. It's designed
-    to find stops at or near intersections.
+    to find stops at or near intersections: the stops on each street are looked
+    up in the feed's street index and intersected.
 
     Args:
         feed: An object containing stop information. Must have a 'stops'
@@ -172,12 +156,12 @@ def find_stops_by_intersection(
         pd.DataFrame: A DataFrame containing all stops whose names contain
                       fuzzy matches to both provided street names.
     """
-    return feed.stops[
-        feed.stops["stop_name"].apply(lambda x: fuzzy_match(x, street1_root, threshold))
-        & feed.stops["stop_name"].apply(
-            lambda x: fuzzy_match(x, street2_root, threshold)
-        )
-    ]
+    index = get_street_index(feed.stops)
+    on_both = np.intersect1d(
+        index.stops_on_street(street1_root, threshold),
+        index.stops_on_street(street2_root, threshold),
+    )
+    return feed.stops.iloc[on_both]
 
 
 def find_nearby_stops(
@@ -210,19 +194,63 @@ def find_nearby_stops(
         This function adds a 'distance' column to the returned DataFrame, representing
         the distance in meters from the given location to each stop.
     """
-    stops_df = stops_df.copy()
-    stops_df["distance"] = stops_df.apply(
-        lambda row: geodesic((lat, lon), (row["stop_lat"], row["stop_lon"])).meters,
-        axis=1,
-    )
-    stops_within_threshold = stops_df[stops_df["distance"] <= max_distance].sort_values(
-        "distance"
-    )
-    if not stops_within_threshold.empty:
-        return stops_within_threshold
-    else:
+    index = get_stop_spatial_index(stops_df)
+    positions, distances = index.query_radius(lat, lon, max_distance)
+    if len(positions) == 0:
         # If no stops within the max_distance, return the 5 nearest stops
-        return stops_df.nsmallest(max_stops, "distance")
+        positions, distances = index.query_nearest(lat, lon, max_stops)
+    nearby_stops = stops_df.iloc[positions].copy()
+    nearby_stops["distance"] = distances
+    return nearby_stops
+
+
+def find_nearby_stops_batch(
+    lats,
+    lons,
+    stops_df: pd.DataFrame,
+    max_distance: float = 200,
+    max_stops: int = 5,
+) -> pd.DataFrame:
+    """
+    Find stops near many locations at once.
+
+    Equivalent to calling find_nearby_stops for every (lat, lon) pair, but all points
+    are answered with a single pass over the stops' spatial index. Use this instead of
+    calling find_nearby_stops in a loop.
+
+    Args:
+        lats (array-like): Latitudes of the locations to search from.
+        lons (array-like): Longitudes of the locations to search from.
+        stops_df (pd.DataFrame): DataFrame containing stop information. Must include
+                                 'stop_lat' and 'stop_lon' columns.
+        max_distance (float): Maximum distance in `meters` to search for stops.
+        max_stops (int): Number of nearest stops returned for a location that has no
+                         stop within max_distance.
+
+    Returns:
+        pd.DataFrame: The nearby stops of all locations, with a 'query_index' column
+                      giving the position of the location in `lats`/`lons` and a
+                      'distance' column in meters. Sorted by query_index, then distance.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    index = get_stop_spatial_index(stops_df)
+    results = index.query_radius_batch(lats, lons, max_distance)
+    empty = [i for i, (positions, _) in enumerate(results) if len(positions) == 0]
+    if empty:
+        nearest = index.query_nearest_batch(lats[empty], lons[empty], max_stops)
+        for i, result in zip(empty, nearest):
+            results[i] = result
+
+    positions = np.concatenate([positions for positions, _ in results]).astype(np.int64)
+    nearby_stops = stops_df.iloc[positions].copy()
+    nearby_stops.insert(
+        0,
+        "query_index",
+        np.repeat(np.arange(len(results)), [len(positions) for positions, _ in results]),
+    )
+    nearby_stops["distance"] = np.concatenate([distances for _, distances in results])
+    return nearby_stops
 
 
 def find_stops_by_address(
@@ -269,19 +297,51 @@ def find_stops_by_address(
 
 
 def find_route(feed, search_term, threshold=80):
-    route_fields = ["route_id", "route_short_name", "route_long_name"]
+    """
+    Find the route best matching a route id, short name or long name.
 
-    # Create a long Series with all fields
-    long_series = pd.concat([feed.routes[field].astype(str) for field in route_fields])
+    Exact names (ignoring case and punctuation) and names without filler words such
+    as "Route 5" or "Red Line" are answered from the feed's route index; other terms
+    are fuzzy matched against all route ids and names.
 
-    # Perform the fuzzy matching on the long series
-    match = process.extractOne(search_term, long_series, scorer=fuzz.ratio)
+    Args:
+        feed: An object containing route information. Must have a 'routes' attribute
+              that is a DataFrame with 'route_id', 'route_short_name' and
+              'route_long_name' columns.
+        search_term (str): The route id or name to search for.
+        threshold (int, optional): The minimum fuzzy match score. Defaults to 80.
 
-    if match[1] >= threshold:
-        route_row = feed.routes.iloc[match[2]]
-        return route_row
-    else:
+    Returns:
+        pd.Series: The matching row of feed.routes, or None if no route matches.
+    """
+    position = get_route_index(feed.routes).resolve([search_term], threshold)[0]
+    if position is None:
         return None  # No match found above the threshold
+    return feed.routes.iloc[position]
+
+
+def resolve_routes(feed, search_terms, threshold=80) -> dict:
+    """
+    Resolve many route mentions to route ids in one call.
+
+    Equivalent to calling find_route for every term, but all terms that need fuzzy
+    matching are scored together. Use this instead of calling find_route in a loop.
+
+    Args:
+        feed: An object containing route information (see find_route).
+        search_terms (list[str]): Route ids or names to search for.
+        threshold (int, optional): The minimum fuzzy match score. Defaults to 80.
+
+    Returns:
+        dict: Maps each search term to its route_id, or None if no route matches.
+    """
+    search_terms = list(search_terms)
+    positions = get_route_index(feed.routes).resolve(search_terms, threshold)
+    route_ids = feed.routes["route_id"].to_numpy()
+    return {
+        term: None if position is None else route_ids[position]
+        for term, position in zip(search_terms, positions)
+    }
 
 
 ## TODO: Attempt to combine all the search functions for stop matching into one function
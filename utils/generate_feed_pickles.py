@@ -1,9 +1,16 @@
 import os
 import sys
 import warnings
+import argparse
+import zipfile
 import _pickle as cPickle
 import gzip
 import json
+import hashlib
+import datetime
+import psutil
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
 warnings.filterwarnings("ignore")
@@ -15,83 +22,431 @@ current_dir = Path(__file__).parent.resolve()
 parent_dir = current_dir.parent
 sys.path.append(str(parent_dir))
 from utils.constants import file_mapping
-from gtfs_agent.gtfs_loader import GTFSLoader
+from gtfs_agent.gtfs_loader import GTFSLoader, LOADER_VERSION, feed_rows
+from gtfs_agent.feed_store import save_feed_store
+from gtfs_agent.build_profiler import BuildProfiler
 
+# Rough ratio of peak build memory to the uncompressed size of a GTFS zip
+FEED_MEMORY_FACTOR = 8
+# Fraction of available memory the parallel build may plan to use
+MEMORY_BUDGET_FRACTION = 0.8
+# Build manifest stored next to the pickles, used for incremental rebuilds
+MANIFEST_FILENAME = "build_manifest.json"
+# Per-agency build profiles (stage timings and memory), next to the pickles
+PROFILE_DIRECTORY = "build_profiles"
 
-def process_single_feed(agency_name, agency_data, output_directory, parent_dir):
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 hex digest of a file's content, or None if it cannot be read.
+    """
+    hasher = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+
+def normalize_distance_unit(agency_data):
+    # if distance_unit is not ["m", "km", "ft", "mi"] set it to `m`
+    if agency_data.get("distance_unit") not in ["m", "km", "ft", "mi"]:
+        agency_data["distance_unit"] = "m"
+    return agency_data
+
+
+def build_fingerprint(agency_data):
+    """
+    Describe everything a feed's pickle depends on: the GTFS zip content, the loader
+    processing version and the distance settings.
+    """
+    return {
+        "source_hash": file_content_hash(agency_data["file_loc"]),
+        "loader_version": LOADER_VERSION,
+        "distance_unit": agency_data["distance_unit"],
+        "distance_method": agency_data.get("distance_method", "haversine"),
+    }
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Ignoring unreadable build manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_manifest(manifest, manifest_path):
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def needs_rebuild(agency_name, fingerprint, manifest, parent_dir):
+    """
+    Check whether an agency must be rebuilt: it has no manifest entry, its source zip
+    or processing settings changed, or its recorded artifact is missing.
+    """
+    entry = manifest.get(agency_name)
+    if entry is None or fingerprint["source_hash"] is None:
+        return True
+    if any(entry.get(key) != value for key, value in fingerprint.items()):
+        return True
+    artifacts = [entry.get("artifact")]
+    if "store_artifact" in entry:
+        artifacts.append(entry["store_artifact"])
+    return any(
+        not artifact or not os.path.exists(os.path.join(parent_dir, artifact))
+        for artifact in artifacts
+    )
+
+
+def save_build_profile(profiler, agency_name, agency_data, output_directory):
+    """
+    Write the stage timings of one agency's build as JSON to
+    <output_directory>/build_profiles/<agency_name>.json.
+    """
+    path = os.path.join(output_directory, PROFILE_DIRECTORY, f"{agency_name}.json")
+    try:
+        source_bytes = os.path.getsize(agency_data["file_loc"])
+    except OSError:
+        source_bytes = None
+    try:
+        profiler.save(
+            path,
+            agency=agency_name,
+            loader_version=LOADER_VERSION,
+            source_bytes=source_bytes,
+            error=agency_data.get("error"),
+        )
+    except OSError as e:
+        print(f"Could not save build profile for {agency_name}: {e}")
+    return path
+
+
+def process_single_feed(
+    agency_name, agency_data, output_directory, parent_dir, store_directory=None
+):
     """
     Process a single GTFS feed: create GTFSLoader, pickle it, and update agency data.
+    If store_directory is given, the feed is also written as a columnar feed store.
+    The wall time, CPU time, peak RSS and rows of every build stage are saved as JSON
+    in <output_directory>/build_profiles/<agency_name>.json, also for failed builds.
     
     Args:
         agency_name (str): Name of the transit agency
         agency_data (dict): Dictionary containing agency's GTFS data information
         output_directory (str): Directory to store the pickled GTFSLoader
         parent_dir (Path): Parent directory path for relative path calculations
+        store_directory (str, optional): Directory to store the columnar feed stores
     
     Returns:
         dict: Updated agency_data dictionary
     """
+    profiler = BuildProfiler()
     try:
-        # if distance_unit is not ["m", "km", "ft", "mi"] set it to `m`
-        if agency_data["distance_unit"] not in ["m", "km", "ft", "mi"]:
-            agency_data["distance_unit"] = "m"
-        
-        # Create GTFSLoader object
-        loader = GTFSLoader(
-            gtfs=agency_name,
-            gtfs_path=agency_data["file_loc"],
-            distance_unit=agency_data["distance_unit"] or "km",  # Default to 'km' if None
-        )
+        with profiler.stage("process_single_feed") as record:
+            agency_data = normalize_distance_unit(agency_data)
+            # Clear errors and stores recorded by a previous build
+            agency_data.pop("error", None)
+            agency_data.pop("store_loc", None)
+
+            # Create GTFSLoader object
+            loader = GTFSLoader(
+                gtfs=agency_name,
+                gtfs_path=agency_data["file_loc"],
+                distance_unit=agency_data["distance_unit"] or "km",  # Default to 'km' if None
+                distance_method=agency_data.get("distance_method", "haversine"),
+                profiler=profiler,
+            )
+
+            # Load all tables; load errors are printed by the loader and leave no feed
+            loader.load_all_tables()
+            if loader.feed is None:
+                raise ValueError(f"Could not load the GTFS feed from {agency_data['file_loc']}")
+            record["rows"] = feed_rows(loader.feed)
 
-        # Load all tables
-        loader.load_all_tables()
+            # Create a filename based on the agency name
+            filename = f"{agency_name}_gtfs_loader.pkl"
+            filepath = os.path.join(output_directory, filename)
 
-        # Create a filename based on the agency name
-        filename = f"{agency_name}_gtfs_loader.pkl"
-        filepath = os.path.join(output_directory, filename)
+            # Pickle and save the loader
+            with profiler.stage("pickle"):
+                with gzip.open(filepath, "wb") as f:
+                    cPickle.dump(loader, f)
 
-        # Pickle and save the loader
-        with gzip.open(filepath, "wb") as f:
-            cPickle.dump(loader, f)
+            print(f"Pickled and stored {agency_name} at {filepath}")
 
-        print(f"Pickled and stored {agency_name} at {filepath}")
+            # Add relative pickle location to agency_data
+            agency_data["pickle_loc"] = os.path.relpath(filepath, start=parent_dir).replace("\\", "/")
+
+            if store_directory is not None:
+                with profiler.stage("save_feed_store"):
+                    store_path = save_feed_store(loader, os.path.join(store_directory, agency_name))
+                print(f"Stored columnar feed for {agency_name} at {store_path}")
+                agency_data["store_loc"] = os.path.relpath(store_path, start=parent_dir).replace("\\", "/")
 
-        # Add relative pickle location to agency_data
-        agency_data["pickle_loc"] = os.path.relpath(filepath, start=parent_dir).replace("\\", "/")
-        
     except Exception as e:
         print(f"Error processing {agency_name}: {str(e)}")
         # Add error information to agency_data
         agency_data["error"] = str(e)
-    
+
+    save_build_profile(profiler, agency_name, agency_data, output_directory)
     return agency_data
 
-def pickle_gtfs_loaders(file_mapping, output_directory, mapping_file_path):
+def estimate_feed_memory(file_loc):
+    """
+    Estimate the peak memory (in bytes) needed to build a feed from its GTFS zip.
+
+    Uses the total uncompressed size of the zip members scaled by FEED_MEMORY_FACTOR.
+    Returns 0 if the zip cannot be read, so unreadable feeds fail fast in a worker.
+    """
+    try:
+        with zipfile.ZipFile(file_loc) as zf:
+            uncompressed = sum(info.file_size for info in zf.infolist())
+    except (OSError, zipfile.BadZipFile):
+        return 0
+    return uncompressed * FEED_MEMORY_FACTOR
+
+
+def _next_schedulable(pending, estimates, reserved_bytes, memory_budget, running):
+    """
+    Pick the next agency to start: the largest pending feed that fits the remaining
+    memory budget. If nothing is running, the largest feed starts regardless of budget.
+    """
+    for agency_name in pending:
+        if reserved_bytes + estimates[agency_name] <= memory_budget:
+            return agency_name
+    if not running and pending:
+        return pending[0]
+    return None
+
+
+def build_feeds_parallel(
+    file_mapping, output_directory, workers, max_memory_gb=None, store_directory=None
+):
+    """
+    Build feeds in a process pool, largest feeds first, within a memory budget.
+
+    Each agency runs in its own worker via process_single_feed, so an error in one
+    feed is recorded in that agency's data without affecting the others. If a worker
+    dies (e.g. killed for running out of memory) the pool is recreated and the
+    affected agencies are retried once.
+
+    Args:
+        file_mapping (dict): Agency name to agency data mapping.
+        output_directory (str): Directory to store the pickled GTFSLoaders.
+        workers (int): Maximum number of concurrent worker processes.
+        max_memory_gb (float, optional): Memory budget for concurrently running
+            builds. Defaults to MEMORY_BUDGET_FRACTION of available memory.
+        store_directory (str, optional): Directory to store the columnar feed stores.
+
+    Returns:
+        dict: Agency name to updated agency data, for every agency in file_mapping.
+    """
+    if max_memory_gb is not None:
+        memory_budget = max_memory_gb * 1024**3
+    else:
+        memory_budget = psutil.virtual_memory().available * MEMORY_BUDGET_FRACTION
+
+    estimates = {
+        agency_name: estimate_feed_memory(agency_data["file_loc"])
+        for agency_name, agency_data in file_mapping.items()
+    }
+    # Largest feeds first so the longest builds are never left for last
+    pending = sorted(file_mapping, key=lambda name: estimates[name], reverse=True)
+    attempts = {agency_name: 0 for agency_name in file_mapping}
+    results = {}
+    running = {}
+    reserved_bytes = 0
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while pending or running:
+            while len(running) < workers:
+                agency_name = _next_schedulable(
+                    pending, estimates, reserved_bytes, memory_budget, running
+                )
+                if agency_name is None:
+                    break
+                pending.remove(agency_name)
+                attempts[agency_name] += 1
+                print("<====Processing", agency_name, "====>")
+                future = executor.submit(
+                    process_single_feed,
+                    agency_name,
+                    dict(file_mapping[agency_name]),
+                    output_directory,
+                    parent_dir,
+                    store_directory,
+                )
+                running[future] = agency_name
+                reserved_bytes += estimates[agency_name]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            pool_broken = False
+            for future in done:
+                agency_name = running.pop(future)
+                reserved_bytes -= estimates[agency_name]
+                try:
+                    results[agency_name] = future.result()
+                except BrokenProcessPool as e:
+                    pool_broken = True
+                    if attempts[agency_name] < 2:
+                        pending.append(agency_name)
+                    else:
+                        print(f"Error processing {agency_name}: worker process died")
+                        results[agency_name] = {
+                            **file_mapping[agency_name],
+                            "error": f"Worker process died: {e}",
+                        }
+                except Exception as e:
+                    print(f"Error processing {agency_name}: {str(e)}")
+                    results[agency_name] = {**file_mapping[agency_name], "error": str(e)}
+
+            if pool_broken:
+                print("Worker pool broke, restarting it and retrying affected agencies")
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+                for future, agency_name in running.items():
+                    reserved_bytes -= estimates[agency_name]
+                    pending.append(agency_name)
+                running = {}
+                pending.sort(key=lambda name: estimates[name], reverse=True)
+    finally:
+        executor.shutdown(wait=True)
+
+    return results
+
+
+def pickle_gtfs_loaders(
+    file_mapping,
+    output_directory,
+    mapping_file_path,
+    workers=1,
+    max_memory_gb=None,
+    force=False,
+    store_directory=None,
+):
     """
     Create, pickle, and store GTFSLoader objects based on the provided file mapping.
     Update the file_mapping with pickle locations and save it to a specified path.
+
+    Builds are incremental: a manifest in output_directory records each agency's
+    source zip hash, loader version, distance settings and pickle. Agencies whose
+    fingerprint is unchanged and whose pickle still exists are skipped unless
+    force is True.
+
+    If store_directory is given, every feed is also written as a columnar feed store
+    (see gtfs_agent.feed_store) and its location recorded as `store_loc`.
+
+    With workers > 1, feeds are built in parallel worker processes (see
+    build_feeds_parallel). Results are merged back in file_mapping order, so the
+    saved mapping is identical regardless of which feed finished first.
     """
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
 
+    manifest_path = os.path.join(output_directory, MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_path)
+
+    fingerprints = {}
+    to_build = {}
     for agency_name, agency_data in file_mapping.items():
-        print("<====Processing", agency_name, "====>")
-        file_mapping[agency_name] = process_single_feed(
-            agency_name, 
-            agency_data, 
-            output_directory, 
-            parent_dir
+        agency_data = normalize_distance_unit(agency_data)
+        fingerprints[agency_name] = build_fingerprint(agency_data)
+        stale_store = store_directory is not None and "store_artifact" not in manifest.get(
+            agency_name, {}
         )
+        if force or stale_store or needs_rebuild(
+            agency_name, fingerprints[agency_name], manifest, parent_dir
+        ):
+            to_build[agency_name] = agency_data
+        else:
+            agency_data["pickle_loc"] = manifest[agency_name]["artifact"]
+            if "store_artifact" in manifest[agency_name]:
+                agency_data["store_loc"] = manifest[agency_name]["store_artifact"]
+            agency_data.pop("error", None)
+            print(f"Skipping {agency_name}: unchanged since last build")
+
+    print(f"Rebuilding {len(to_build)} of {len(file_mapping)} feeds")
+
+    if workers > 1 and len(to_build) > 1:
+        results = build_feeds_parallel(
+            to_build, output_directory, workers, max_memory_gb, store_directory
+        )
+    else:
+        results = {}
+        for agency_name, agency_data in to_build.items():
+            print("<====Processing", agency_name, "====>")
+            results[agency_name] = process_single_feed(
+                agency_name,
+                agency_data,
+                output_directory,
+                parent_dir,
+                store_directory,
+            )
+
+    for agency_name in file_mapping:
+        if agency_name not in results:
+            continue
+        file_mapping[agency_name] = results[agency_name]
+        if "error" in results[agency_name]:
+            manifest.pop(agency_name, None)
+        else:
+            manifest[agency_name] = {
+                **fingerprints[agency_name],
+                "artifact": results[agency_name]["pickle_loc"],
+                **(
+                    {"store_artifact": results[agency_name]["store_loc"]}
+                    if "store_loc" in results[agency_name]
+                    else {}
+                ),
+                "built_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            }
 
     # Save updated file_mapping
     with open(mapping_file_path, "w") as f:
         json.dump(file_mapping, f, indent=2)
+    save_manifest(manifest, manifest_path)
 
     print(f"Updated file mapping saved to {mapping_file_path}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build pickled GTFSLoaders for all agencies")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of feeds to build in parallel"
+    )
+    parser.add_argument(
+        "--max-memory-gb",
+        type=float,
+        default=None,
+        help="Memory budget for concurrent builds (defaults to 80%% of available memory)",
+    )
+    parser.add_argument(
+        "--no-store",
+        action="store_true",
+        help="Only write pickles, skip the columnar feed stores",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every feed even if its source and loader version are unchanged",
+    )
+    args = parser.parse_args()
+
     pickle_gtfs_loaders(
         file_mapping,
         os.path.join(parent_dir, "gtfs_data", "feed_pickles"),
         os.path.join(parent_dir, "gtfs_data", "file_mapping.json"),
+        workers=args.workers,
+        max_memory_gb=args.max_memory_gb,
+        force=args.force,
+        store_directory=(
+            None if args.no_store else os.path.join(parent_dir, "gtfs_data", "feed_stores")
+        ),
     )
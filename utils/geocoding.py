@@ -0,0 +1,272 @@
+import os
+import re
+import csv
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# (lat, lon), formatted address -- or (None, None) if the address was not found
+GeocodeResult = Tuple[Optional[Tuple[float, float]], Optional[str]]
+NOT_FOUND: GeocodeResult = (None, None)
+
+
+def normalize_address(address: str) -> str:
+    """
+    Normalize an address for use as a cache key, so that spelling variants of the same
+    query ("1004 Main St., Urbana,IL" and "1004 main st, urbana, il") share an entry.
+    """
+    address = address.lower().replace(".", " ")
+    address = re.sub(r"\s*,\s*", ", ", address)
+    return re.sub(r"\s+", " ", address).strip(" ,")
+
+
+class GoogleMapsGeocoder:
+    name = "google"
+
+    def __init__(self, api_key: str):
+        import googlemaps
+
+        self.client = googlemaps.Client(key=api_key)
+
+    def geocode(self, address: str) -> GeocodeResult:
+        location = self.client.geocode(address)
+        if not location:
+            return NOT_FOUND
+        geometry = location[0]["geometry"]["location"]
+        return (geometry["lat"], geometry["lng"]), location[0]["formatted_address"]
+
+
+class NominatimGeocoder:
+    name = "nominatim"
+
+    def __init__(self, user_agent: str = "gtfs2code"):
+        from geopy.geocoders import Nominatim
+
+        self.client = Nominatim(user_agent=user_agent)
+
+    def geocode(self, address: str) -> GeocodeResult:
+        location = self.client.geocode(address)
+        if not location:
+            return NOT_FOUND
+        return (location.latitude, location.longitude), location.address
+
+
+class GazetteerGeocoder:
+    """
+    Offline geocoder answering from a fixed table of known places.
+
+    Stands in for the online services in tests and in deployments without network
+    access. Entries are looked up by normalized address.
+    """
+
+    name = "gazetteer"
+
+    def __init__(self, entries: Dict[str, GeocodeResult]):
+        self.entries = {normalize_address(address): result for address, result in entries.items()}
+
+    @classmethod
+    def from_file(cls, path: str) -> "GazetteerGeocoder":
+        """
+        Load a gazetteer from a CSV file with `address`, `lat`, `lon` and optional
+        `formatted_address` columns, or a JSON object mapping addresses to
+        {"lat", "lon", "formatted_address"}.
+        """
+        if path.endswith(".json"):
+            with open(path, "r") as f:
+                rows = [{"address": address, **entry} for address, entry in json.load(f).items()]
+        else:
+            with open(path, "r", newline="") as f:
+                rows = list(csv.DictReader(f))
+        return cls(
+            {
+                row["address"]: (
+                    (float(row["lat"]), float(row["lon"])),
+                    row.get("formatted_address") or row["address"],
+                )
+                for row in rows
+            }
+        )
+
+    def geocode(self, address: str) -> GeocodeResult:
+        return self.entries.get(normalize_address(address), NOT_FOUND)
+
+
+class GeocodeCache:
+    """
+    Persistent SQLite cache of geocoding results.
+
+    Found addresses are kept for `ttl_seconds`; addresses the service could not find
+    are cached too (negative caching) but only for `negative_ttl_seconds`, so a query
+    that keeps failing does not hit the service every time. Entries are keyed by backend
+    and normalized address. A connection is opened per operation, so the cache can be
+    shared by threads and forked sandbox workers.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, negative_ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geocode (
+                    backend TEXT NOT NULL,
+                    address_key TEXT NOT NULL,
+                    lat REAL,
+                    lon REAL,
+                    formatted_address TEXT,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (backend, address_key)
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, backend: str, address_keys: List[str]) -> Dict[str, GeocodeResult]:
+        """
+        Fresh cached results for the given normalized addresses; missing or expired
+        entries are left out.
+        """
+        results = {}
+        now = time.time()
+        keys = list(dict.fromkeys(address_keys))
+        with self._connect() as conn:
+            # Stay below SQLite's limit on query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                rows = conn.execute(
+                    f"SELECT address_key, lat, lon, formatted_address, created FROM geocode "
+                    f"WHERE backend = ? AND address_key IN ({','.join('?' * len(chunk))})",
+                    [backend, *chunk],
+                ).fetchall()
+                for address_key, lat, lon, formatted_address, created in rows:
+                    found = lat is not None
+                    ttl = self.ttl_seconds if found else self.negative_ttl_seconds
+                    if now - created > ttl:
+                        continue
+                    results[address_key] = ((lat, lon), formatted_address) if found else NOT_FOUND
+        return results
+
+    def put_many(self, backend: str, results: Dict[str, GeocodeResult]):
+        rows = []
+        now = time.time()
+        for address_key, (location, formatted_address) in results.items():
+            lat, lon = location if location else (None, None)
+            rows.append((backend, address_key, lat, lon, formatted_address, now))
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM geocode")
+
+
+class CachedGeocoder:
+    """
+    A geocoding backend behind a GeocodeCache. One instance (and so one client) is
+    reused for all lookups.
+    """
+
+    def __init__(self, backend, cache: Optional[GeocodeCache] = None):
+        self.backend = backend
+        self.cache = cache
+
+    def _lookup(self, address: str) -> Tuple[GeocodeResult, bool]:
+        try:
+            return self.backend.geocode(address), True
+        except Exception as e:
+            # Service errors are transient, so they are reported but never cached
+            print(f"Geocoding '{address}' with {self.backend.name} failed: {e}")
+            return NOT_FOUND, False
+
+    def geocode(self, address: str) -> GeocodeResult:
+        return self.geocode_batch([address])[0]
+
+    def geocode_batch(self, addresses: List[str]) -> List[GeocodeResult]:
+        """
+        Geocode many addresses at once. Cached addresses are answered with a single
+        cache query, and each distinct uncached address is sent to the service once.
+        """
+        keys = [normalize_address(address) for address in addresses]
+        results = self.cache.get_many(self.backend.name, keys) if self.cache else {}
+        fetched = {}
+        for address, key in zip(addresses, keys):
+            if key in results:
+                continue
+            result, cacheable = self._lookup(address)
+            results[key] = result
+            if cacheable:
+                fetched[key] = result
+        if self.cache and fetched:
+            self.cache.put_many(self.backend.name, fetched)
+        return [results[key] for key in keys]
+
+
+_GEOCODER: Optional[CachedGeocoder] = None
+_GEOCODER_LOCK = threading.Lock()
+
+
+def create_backend(backend_name: Optional[str] = None):
+    """
+    Create a geocoding backend: "google", "nominatim" or "gazetteer". Without a name,
+    Google Maps is used if a `GMAP_API` key is configured in the Streamlit secrets,
+    and Nominatim otherwise.
+    """
+    import streamlit as st
+    from utils.constants import GEOCODE_GAZETTEER_FILE
+
+    if backend_name is None:
+        try:
+            backend_name = "google" if "GMAP_API" in st.secrets else "nominatim"
+        except Exception:
+            backend_name = "nominatim"
+    if backend_name == "google":
+        return GoogleMapsGeocoder(st.secrets["GMAP_API"])
+    if backend_name == "nominatim":
+        return NominatimGeocoder()
+    if backend_name == "gazetteer":
+        return GazetteerGeocoder.from_file(GEOCODE_GAZETTEER_FILE)
+    raise ValueError(f"Unknown geocoding backend: {backend_name}")
+
+
+def get_geocoder() -> CachedGeocoder:
+    """
+    The process-wide cached geocoder, created on first use from utils.constants.
+    """
+    global _GEOCODER
+    with _GEOCODER_LOCK:
+        if _GEOCODER is None:
+            from utils.constants import (
+                GEOCODER_BACKEND,
+                GEOCODE_CACHE_PATH,
+                GEOCODE_CACHE_TTL_SECONDS,
+                GEOCODE_NEGATIVE_TTL_SECONDS,
+            )
+
+            cache = None
+            if GEOCODE_CACHE_PATH:
+                cache = GeocodeCache(
+                    GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL_SECONDS, GEOCODE_NEGATIVE_TTL_SECONDS
+                )
+            _GEOCODER = CachedGeocoder(create_backend(GEOCODER_BACKEND), cache)
+        return _GEOCODER
+
+
+def set_geocoder(geocoder: Optional[CachedGeocoder]):
+    """
+    Replace the process-wide geocoder, e.g. with a gazetteer-backed one in tests.
+    Passing None makes the next lookup recreate it from the settings.
+    """
+    global _GEOCODER
+    with _GEOCODER_LOCK:
+        _GEOCODER = geocoder
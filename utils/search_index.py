@@ -0,0 +1,527 @@
+import re
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz as rfuzz, process as rprocess, utils as rutils
+from scipy.spatial import cKDTree
+from gtfs_agent.bounded_cache import BoundedLRUCache
+from gtfs_agent.geo_distance import EARTH_RADIUS_M, vincenty_distance
+
+# Sphere and WGS-84 ellipsoid distances differ by well under this fraction; candidate
+# searches on the sphere are widened by it so no ellipsoidal match is missed
+SPHERE_ERROR_MARGIN = 0.01
+
+# Separators between the streets of an intersection stop name ("Main St & Elm St",
+# "Green/Wright", "Oak Ave at 5th St", "Vine St & 30th St, NW")
+STREET_SEPARATOR_PATTERN = re.compile(r"\s*(?:&|/|@|\+|,|\band\b|\bat\b)\s*", re.IGNORECASE)
+STREET_ABBREVIATIONS = {
+    "st": "street",
+    "str": "street",
+    "ave": "avenue",
+    "av": "avenue",
+    "rd": "road",
+    "blvd": "boulevard",
+    "dr": "drive",
+    "ln": "lane",
+    "ct": "court",
+    "pl": "place",
+    "pkwy": "parkway",
+    "hwy": "highway",
+    "sq": "square",
+    "ter": "terrace",
+    "cir": "circle",
+    "hts": "heights",
+    "expy": "expressway",
+    "fwy": "freeway",
+    "ctr": "center",
+    "sta": "station",
+    "mt": "mount",
+}
+# Direction prefixes are only expanded in front of a street name, since letters are
+# also street names ("N 27th St" but "S Street")
+DIRECTION_ABBREVIATIONS = {
+    "n": "north",
+    "s": "south",
+    "e": "east",
+    "w": "west",
+    "ne": "northeast",
+    "nw": "northwest",
+    "se": "southeast",
+    "sw": "southwest",
+}
+# Street types and directions, which do not identify a street on their own
+GENERIC_STREET_WORDS = {
+    "street", "avenue", "road", "boulevard", "drive", "lane", "court", "place", "parkway",
+    "highway", "square", "terrace", "circle", "expressway", "freeway", "north", "south",
+    "east", "west", "northeast", "northwest", "southeast", "southwest",
+}
+
+# Route fields searched by find_route, in order of precedence
+ROUTE_FIELDS = ["route_id", "route_short_name", "route_long_name"]
+# Words around a route name that do not identify it ("Route 5", "Red Line")
+ROUTE_FILLER_WORDS = {"route", "line", "bus", "rt", "the", "no", "number"}
+
+# Indexes built per table, keyed on the identity of the table's column buffers
+_INDEXES = BoundedLRUCache(max_items=32, sizeof=lambda value: 64)
+
+
+def _column_fingerprint(series: pd.Series):
+    """
+    Identify a column by the memory holding its data.
+
+    Shallow copies of a table (e.g. the copy-on-write feed views handed to generated
+    code) share their column buffers, so they map to the same fingerprint. Returns the
+    fingerprint, the buffer owner (kept alive by the cache so the address cannot be
+    reused) and, for mutable NumPy buffers, a snapshot used to detect in-place writes.
+    """
+    pa_array = getattr(series.array, "_pa_array", None)
+    if pa_array is not None:
+        buffers = tuple(
+            (buffer.address, buffer.size)
+            for chunk in pa_array.chunks
+            for buffer in chunk.buffers()
+            if buffer is not None
+        )
+        return ("arrow", len(series), buffers), pa_array, None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Compacted id columns: the codes buffer plus the identity of the categories
+        codes = series.array.codes
+        fingerprint = (
+            "categorical",
+            codes.__array_interface__["data"][0],
+            codes.shape,
+            codes.dtype.str,
+            id(series.cat.categories),
+        )
+        return fingerprint, codes, codes.copy()
+    values = series.to_numpy()
+    fingerprint = ("numpy", values.__array_interface__["data"][0], values.shape, values.dtype.str)
+    return fingerprint, values, values.copy()
+
+
+def _unchanged(snapshot: np.ndarray, values: np.ndarray) -> bool:
+    if snapshot is None:
+        return True
+    if snapshot.dtype != object:
+        return np.array_equal(snapshot, values, equal_nan=True)
+    # Object arrays cannot compare NaN as equal; fall back to pandas for those
+    return np.array_equal(snapshot, values) or pd.Index(snapshot).equals(pd.Index(values))
+
+
+def cached_index(kind: str, df: pd.DataFrame, columns, builder):
+    """
+    Return the index of type `kind` for `columns` of `df`, building it with
+    `builder(*series)` only the first time these columns are seen.
+    """
+    fingerprints, owners, snapshots = zip(*(_column_fingerprint(df[column]) for column in columns))
+    key = (kind, tuple(columns), fingerprints)
+    entry = _INDEXES.get(key)
+    if entry is not None:
+        index, _, cached_snapshots = entry
+        if all(_unchanged(snapshot, owner) for snapshot, owner in zip(cached_snapshots, owners)):
+            return index
+    index = builder(*(df[column] for column in columns))
+    _INDEXES.put(key, (index, owners, snapshots))
+    return index
+
+
+def remove_text_in_braces(text):
+    # Remove text in braces and any extra spaces left behind
+    return re.sub(r"\s*\(.*?\)\s*", " ", text).strip()
+
+
+def normalize_street(text: str) -> str:
+    """
+    Lowercase a street name, drop punctuation and expand abbreviations, so that
+    "N Main St." and "north main street" normalize to the same string.
+    """
+    words = [
+        STREET_ABBREVIATIONS.get(word, word)
+        for word in re.sub(r"[^0-9a-z]+", " ", text.lower()).split()
+    ]
+    for i, word in enumerate(words[:-1]):
+        if word in DIRECTION_ABBREVIATIONS and words[i + 1] not in GENERIC_STREET_WORDS:
+            words[i] = DIRECTION_ABBREVIATIONS[word]
+    return " ".join(words)
+
+
+def street_root(street: str) -> str:
+    """
+    The identifying words of a normalized street name: "north 27th street" -> "27th".
+    Streets consisting only of generic words ("south street") are kept whole.
+    """
+    root = " ".join(word for word in street.split() if word not in GENERIC_STREET_WORDS)
+    return root or street
+
+
+def split_streets(stop_name: str):
+    """
+    Split a stop name into its normalized street names, e.g.
+    "Main St & Elm St (NE Corner)" -> ["main street", "elm street"].
+    """
+    streets = STREET_SEPARATOR_PATTERN.split(remove_text_in_braces(stop_name))
+    # Corner or bay suffixes such as ", NW" are not streets
+    return [
+        street
+        for street in map(normalize_street, streets)
+        if street and street not in DIRECTION_ABBREVIATIONS
+    ]
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _chord_length(meters) -> np.ndarray:
+    angle = np.minimum(np.asarray(meters, dtype=np.float64) / EARTH_RADIUS_M, np.pi)
+    return 2 * np.sin(angle / 2)
+
+
+def _arc_length(chord) -> np.ndarray:
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+class StopSpatialIndex:
+    """
+    KD-tree over stop locations as 3D unit vectors, for radius and nearest-stop queries.
+
+    The tree shortlists candidates by great-circle distance; candidates are then ranked
+    by their WGS-84 (Vincenty) distance, so results and distances match
+    `geopy.distance.geodesic`. Query results are row positions into the indexed table
+    (for `iloc`) and distances in meters, sorted from nearest to farthest. Stops without
+    coordinates are never returned.
+    """
+
+    def __init__(self, stop_lat, stop_lon):
+        stop_lat = np.asarray(stop_lat, dtype=np.float64)
+        stop_lon = np.asarray(stop_lon, dtype=np.float64)
+        self.positions = np.flatnonzero(np.isfinite(stop_lat) & np.isfinite(stop_lon))
+        self.lat = stop_lat[self.positions]
+        self.lon = stop_lon[self.positions]
+        self.tree = cKDTree(_unit_vectors(self.lat, self.lon))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _rank(self, lat, lon, candidates, max_distance=None, k=None):
+        candidates = np.sort(np.asarray(candidates, dtype=np.int64))
+        distances = vincenty_distance(lat, lon, self.lat[candidates], self.lon[candidates])
+        order = np.argsort(distances, kind="stable")
+        if max_distance is not None:
+            order = order[distances[order] <= max_distance]
+        if k is not None:
+            order = order[:k]
+        return self.positions[candidates[order]], distances[order]
+
+    def query_radius_batch(self, lats, lons, radius_m: float):
+        """
+        Stops within `radius_m` meters of each point.
+
+        Returns:
+            list: One (positions, distances) tuple per point.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        if len(self) == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0)) for _ in lats]
+        search_radius = _chord_length(radius_m * (1 + SPHERE_ERROR_MARGIN) + 1)
+        candidates = self.tree.query_ball_point(_unit_vectors(lats, lons), search_radius)
+        return [
+            self._rank(lat, lon, point_candidates, max_distance=radius_m)
+            for lat, lon, point_candidates in zip(lats, lons, candidates)
+        ]
+
+    def query_nearest_batch(self, lats, lons, k: int):
+        """
+        The `k` nearest stops to each point (fewer if the index holds fewer stops).
+
+        Returns:
+            list: One (positions, distances) tuple per point.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        k = min(k, len(self))
+        if k <= 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0)) for _ in lats]
+        points = _unit_vectors(lats, lons)
+        chords, _ = self.tree.query(points, k=k)
+        kth_chord = np.asarray(chords).reshape(len(lats), -1)[:, -1]
+        # Every stop among the k nearest on the ellipsoid lies within this sphere radius
+        search_radius = _chord_length(
+            _arc_length(kth_chord) * (1 + SPHERE_ERROR_MARGIN) ** 2 + 1
+        )
+        candidates = self.tree.query_ball_point(points, search_radius)
+        return [
+            self._rank(lat, lon, point_candidates, k=k)
+            for lat, lon, point_candidates in zip(lats, lons, candidates)
+        ]
+
+    def query_radius(self, lat: float, lon: float, radius_m: float):
+        return self.query_radius_batch([lat], [lon], radius_m)[0]
+
+    def query_nearest(self, lat: float, lon: float, k: int):
+        return self.query_nearest_batch([lat], [lon], k)[0]
+
+
+class _CharacterCounts:
+    """
+    Per-string character counts of a list of strings, used to bound fuzzy scores.
+    """
+
+    def __init__(self, strings):
+        self.strings = list(strings)
+        self.lengths = np.array([len(string) for string in self.strings], dtype=np.int64)
+        alphabet = sorted(set("".join(self.strings)))
+        self.columns = {char: i for i, char in enumerate(alphabet)}
+        self.counts = np.zeros((len(self.strings), len(alphabet)), dtype=np.uint16)
+        for row, string in enumerate(self.strings):
+            for char in string:
+                self.counts[row, self.columns[char]] += 1
+
+    def partial_ratio_bound(self, query: str) -> np.ndarray:
+        """
+        Upper bound of `fuzz.partial_ratio(string, query)` for every string.
+
+        partial_ratio aligns the shorter string (length L) with a window of the longer
+        one. The matching characters of the alignment (m) cannot exceed the characters
+        both strings share, and the score is at most 200 * m / (L + m).
+        """
+        query_counts = np.zeros(len(self.columns), dtype=np.uint16)
+        for char in query:
+            if char in self.columns:
+                query_counts[self.columns[char]] += 1
+        shared = np.minimum(self.counts, query_counts).sum(axis=1)
+        total = np.minimum(self.lengths, len(query)) + shared
+        # Two empty strings are a perfect match
+        return np.divide(200.0 * shared, total, out=np.full(len(total), 100.0), where=total > 0)
+
+
+class StopNameIndex:
+    """
+    Lowercased stop names, with and without text in braces, for fuzzy name search.
+
+    Every distinct name is stored once. A search first discards names whose character
+    counts rule out reaching the threshold, then scores the shortlist in one vectorized
+    rapidfuzz call. The prefilter only drops names that cannot match, so scores are
+    exactly those of `thefuzz.fuzz.partial_ratio`.
+    """
+
+    def __init__(self, stop_names):
+        names = ["" if pd.isna(name) else str(name) for name in stop_names]
+        self.original_codes, original = pd.factorize(
+            pd.Series([name.lower() for name in names], dtype=object)
+        )
+        self.cleaned_codes, cleaned = pd.factorize(
+            pd.Series([remove_text_in_braces(name).lower() for name in names], dtype=object)
+        )
+        self.original = _CharacterCounts(original)
+        self.cleaned = _CharacterCounts(cleaned)
+
+    @staticmethod
+    def _scores(names: _CharacterCounts, query: str, threshold: float) -> np.ndarray:
+        scores = np.zeros(len(names.strings), dtype=np.int64)
+        # Scores are rounded, so anything from threshold - 0.5 up may reach the threshold
+        cutoff = max(threshold - 1, 0)
+        shortlist = np.flatnonzero(names.partial_ratio_bound(query) >= cutoff)
+        if len(shortlist):
+            raw = rprocess.cdist(
+                [query],
+                [names.strings[i] for i in shortlist],
+                scorer=rfuzz.partial_ratio,
+                dtype=np.float64,
+                score_cutoff=cutoff,
+            )[0]
+            # np.rint rounds half to even like thefuzz's round()
+            scores[shortlist] = np.rint(raw)
+        return scores
+
+    def match_scores(self, name: str, threshold: float = 0) -> np.ndarray:
+        """
+        Best partial_ratio score of every stop name (original or without braces)
+        against `name`, in table order. Scores below `threshold` may be reported as 0.
+        """
+        query = name.lower()
+        original = self._scores(self.original, query, threshold)[self.original_codes]
+        cleaned = self._scores(self.cleaned, query, threshold)[self.cleaned_codes]
+        return np.maximum(original, cleaned)
+
+
+class StreetIndex:
+    """
+    Streets of every stop name, for street and intersection search.
+
+    Stop names are split into streets on intersection separators, and every distinct
+    normalized street is stored once with the stops on it. A search scores the roots of
+    the distinct streets (far fewer than the stops) against the root of the query in
+    one vectorized call, and a stop scores as its best matching street. Comparing roots
+    keeps shared words such as "North" or "Street" from making different streets look
+    alike.
+    """
+
+    def __init__(self, stop_names):
+        street_ids = {}
+        pair_streets, pair_stops = [], []
+        for position, name in enumerate(stop_names):
+            if pd.isna(name):
+                continue
+            for street in dict.fromkeys(split_streets(str(name))):
+                pair_streets.append(street_ids.setdefault(street, len(street_ids)))
+                pair_stops.append(position)
+        self.streets = list(street_ids)
+        self.roots = [street_root(street) for street in self.streets]
+        self.pair_streets = np.array(pair_streets, dtype=np.int64)
+        self.pair_stops = np.array(pair_stops, dtype=np.int64)
+        self.n_stops = len(stop_names)
+
+    def street_scores(self, street: str) -> np.ndarray:
+        """
+        token_set_ratio of the root of every distinct street against the query's root.
+        """
+        query = normalize_street(street)
+        if not self.streets or not query:
+            return np.zeros(len(self.streets), dtype=np.int64)
+        raw = rprocess.cdist(
+            [street_root(query)], self.roots, scorer=rfuzz.token_set_ratio, dtype=np.float64
+        )[0]
+        return np.rint(raw).astype(np.int64)
+
+    def stop_scores(self, street: str) -> np.ndarray:
+        """
+        Best street score of every stop, in table order (0 for stops without streets).
+        """
+        scores = np.zeros(self.n_stops, dtype=np.int64)
+        np.maximum.at(scores, self.pair_stops, self.street_scores(street)[self.pair_streets])
+        return scores
+
+    def stops_on_street(self, street: str, threshold: float) -> np.ndarray:
+        """
+        Positions of the stops having a street that matches `street` with at least
+        `threshold`.
+        """
+        matched = self.street_scores(street) >= threshold
+        return np.unique(self.pair_stops[matched[self.pair_streets]])
+
+
+def strip_route_filler(alias: str) -> str:
+    """
+    Remove filler words at either end of a processed route alias: "route 5" -> "5".
+    """
+    words = alias.split()
+    while words and words[0] in ROUTE_FILLER_WORDS:
+        words.pop(0)
+    while words and words[-1] in ROUTE_FILLER_WORDS:
+        words.pop()
+    return " ".join(words)
+
+
+class RouteIndex:
+    """
+    Aliases of every route (id, short name, long name) for route search.
+
+    Aliases are processed like thefuzz does (lowercased, punctuation removed) once, at
+    build time. Exact aliases, then aliases without filler words such as "Route" or
+    "Line", are answered with a dictionary lookup; anything else falls back to the
+    same fuzzy `ratio` search over all aliases that `thefuzz.process.extractOne` runs.
+    """
+
+    def __init__(self, *fields):
+        self.n_routes = len(fields[0]) if fields else 0
+        # All ids first, then all short names, then all long names
+        self.aliases = [
+            None if pd.isna(value) else rutils.default_process(str(value))
+            for field in fields
+            for value in field
+        ]
+        self.exact = {}
+        self.variants = {}
+        for i, alias in enumerate(self.aliases):
+            if not alias:
+                continue
+            self.exact.setdefault(alias, i % self.n_routes)
+            stripped = strip_route_filler(alias)
+            if stripped and stripped != alias:
+                self.variants.setdefault(stripped, i % self.n_routes)
+
+    def _lookup(self, query: str):
+        if query in self.exact:
+            return self.exact[query]
+        stripped = strip_route_filler(query)
+        for table, key in ((self.exact, stripped), (self.variants, query), (self.variants, stripped)):
+            if key and key in table:
+                return table[key]
+        return None
+
+    def resolve(self, search_terms, threshold: float = 80):
+        """
+        Route position (for `iloc`) of every search term, or None if no alias matches
+        with a `ratio` of at least `threshold`.
+        """
+        queries = [rutils.default_process(str(term)) for term in search_terms]
+        positions = [self._lookup(query) if query else None for query in queries]
+        misses = [i for i, position in enumerate(positions) if position is None]
+        if misses and self.aliases:
+            scores = rprocess.cdist(
+                [queries[i] for i in misses],
+                self.aliases,
+                scorer=rfuzz.ratio,
+                dtype=np.float64,
+            )
+            # argmax keeps the first alias among equal scores, like extractOne
+            best = scores.argmax(axis=1)
+            for i, alias, score in zip(misses, best, scores[np.arange(len(misses)), best]):
+                if int(round(score)) >= threshold:
+                    positions[i] = alias % self.n_routes
+        return positions
+
+
+def get_stop_spatial_index(stops_df: pd.DataFrame) -> StopSpatialIndex:
+    """
+    Spatial index of a stops table, built on first use and shared by every copy-on-write
+    view of the same table.
+    """
+    return cached_index("stop_spatial", stops_df, ["stop_lat", "stop_lon"], StopSpatialIndex)
+
+
+def get_stop_name_index(stops_df: pd.DataFrame) -> StopNameIndex:
+    """
+    Fuzzy name index of a stops table, built on first use and shared like
+    get_stop_spatial_index.
+    """
+    return cached_index("stop_name", stops_df, ["stop_name"], StopNameIndex)
+
+
+def get_street_index(stops_df: pd.DataFrame) -> StreetIndex:
+    """
+    Street index of a stops table, built on first use and shared like
+    get_stop_spatial_index.
+    """
+    return cached_index("street", stops_df, ["stop_name"], StreetIndex)
+
+
+def get_route_index(routes_df: pd.DataFrame) -> RouteIndex:
+    """
+    Route search index of a routes table, built on first use and shared like
+    get_stop_spatial_index.
+    """
+    fields = [field for field in ROUTE_FIELDS if field in routes_df.columns]
+    return cached_index("route", routes_df, fields, RouteIndex)
+
+
+def warm_search_indexes(feed):
+    """
+    Build the search indexes of a feed up front, e.g. right after it is loaded, so the
+    first lookup from generated code does not pay for it. Sandbox workers forked
+    afterwards inherit the built indexes.
+    """
+    routes = getattr(feed, "routes", None)
+    if isinstance(routes, pd.DataFrame):
+        get_route_index(routes)
+    stops = getattr(feed, "stops", None)
+    if not isinstance(stops, pd.DataFrame):
+        return
+    if {"stop_lat", "stop_lon"} <= set(stops.columns):
+        get_stop_spatial_index(stops)
+    if "stop_name" in stops.columns:
+        get_stop_name_index(stops)
+        get_street_index(stops)